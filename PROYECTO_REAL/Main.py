@@ -11,6 +11,13 @@ import time
 from datetime import datetime
 import json
 
+# Modulos del proyecto (scripts/) disponibles desde cualquier directorio
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
+from conexion_db import obtener_conexion, ruta_db
+from migraciones import migrar
+from tiempo_utc import epoch_hace
+from contadores_db import estado_contadores
+
 def mostrar_banner():
     """Muestra el banner del sistema"""
     print("\n" + "="*70)
@@ -25,6 +32,12 @@ def mostrar_banner():
     print(f"Fecha: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}")
     print("="*70 + "\n")
 
+def contadores_bd(db_path):
+    """Contadores de filas (stats_counters) de la BD; aplica antes las migraciones pendientes"""
+    conn = obtener_conexion(db_path)
+    migrar(conn)
+    return estado_contadores(conn)
+
 def verificar_estructura():
     """Verifica que la estructura del proyecto sea correcta"""
     print("="*50)
@@ -37,6 +50,7 @@ def verificar_estructura():
         'data/processed',
         'data/database',
         'data/archive',
+        'data/rejected',
         'data/alertas',
         'scripts',
         'models',
@@ -195,32 +209,24 @@ def ejecutar_procesador():
             print(f"  Archivos movidos a archive: {len(archivos_archivados)}")
         
         # 2. Verificar base de datos
-        db_path = 'data/database/calidad_aire.db'
+        db_path = ruta_db()
         if os.path.exists(db_path):
-            import sqlite3
             try:
-                conn = sqlite3.connect(db_path)
-                cursor = conn.cursor()
+                # Contadores mantenidos por triggers (sin COUNT(*) sobre las tablas)
+                contadores = contadores_bd(db_path)
                 
                 # Verificar registros en sensor_requests
-                cursor.execute("SELECT COUNT(*) FROM sensor_requests WHERE processed_at IS NOT NULL")
-                procesados = cursor.fetchone()[0]
-                print(f"  Requests procesados en BD: {procesados}")
+                print(f"  Requests procesados en BD: {contadores['requests_procesados']}")
                 
                 # Verificar sensor_responses
-                cursor.execute("SELECT COUNT(*) FROM sensor_responses")
-                responses = cursor.fetchone()[0]
-                print(f"  Responses guardados: {responses}")
+                print(f"  Responses guardados: {contadores['filas']['sensor_responses']}")
                 
                 # Verificar calidad del aire procesada
-                cursor.execute("SELECT calidad_aire_pred, COUNT(*) FROM sensor_responses GROUP BY calidad_aire_pred")
-                distribucion = cursor.fetchall()
-                if distribucion:
+                if contadores['calidad']:
                     print(f"  Distribución calidad del aire:")
-                    for calidad, cantidad in distribucion:
+                    for calidad, cantidad in contadores['calidad'].items():
                         print(f"    * {calidad}: {cantidad}")
                 
-                conn.close()
             except Exception as e:
                 print(f"  Error consultando BD: {e}")
         
@@ -240,19 +246,14 @@ def ejecutar_dashboard():
     
     try:
         # Primero verificar si hay datos
-        db_path = 'data/database/calidad_aire.db'
+        db_path = ruta_db()
         if not os.path.exists(db_path):
             print("ERROR: Base de datos no encontrada")
             print("  Ejecute primero el procesador (opcion 2)")
             return False
         
         # Verificar si hay datos en sensor_responses
-        import sqlite3
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM sensor_responses")
-        count = cursor.fetchone()[0]
-        conn.close()
+        count = contadores_bd(db_path)['filas']['sensor_responses']
         
         if count == 0:
             print("ADVERTENCIA: No hay datos procesados en la base de datos")
@@ -278,29 +279,29 @@ def ejecutar_consulta():
     
     try:
         # Verificar si existe la base de datos
-        db_path = 'data/database/calidad_aire.db'
+        db_path = ruta_db()
         if not os.path.exists(db_path):
             print("ERROR: Base de datos no encontrada")
             print("  Ejecute primero el procesador (opcion 2)")
             return False
         
         # Verificar si hay datos
-        import sqlite3
-        conn = sqlite3.connect(db_path)
+        conn = obtener_conexion(db_path)
         cursor = conn.cursor()
+        filas = contadores_bd(db_path)['filas']
         
-        # Listar tablas disponibles
+        # Listar tablas disponibles (conteo solo de las tablas con contador)
         cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
         tablas = cursor.fetchall()
         
         print(f"\nTablas disponibles en la base de datos:")
         for tabla in tablas:
             tabla_nombre = tabla[0]
-            cursor.execute(f"SELECT COUNT(*) FROM {tabla_nombre}")
-            count = cursor.fetchone()[0]
-            print(f"  * {tabla_nombre}: {count} registros")
+            if tabla_nombre in filas:
+                print(f"  * {tabla_nombre}: {filas[tabla_nombre]} registros")
+            else:
+                print(f"  * {tabla_nombre}")
         
-        conn.close()
         
         # Importar y ejecutar
         sys.path.append('scripts')
@@ -321,10 +322,9 @@ def ejecutar_dashboard_alertas():
         sys.path.append('scripts')
         
         # Primero verificar si hay alertas en la base de datos
-        db_path = 'data/database/calidad_aire.db'
+        db_path = ruta_db()
         if os.path.exists(db_path):
-            import sqlite3
-            conn = sqlite3.connect(db_path)
+            conn = obtener_conexion(db_path)
             cursor = conn.cursor()
             
             # Verificar si existe la tabla alertas_sistema
@@ -332,10 +332,9 @@ def ejecutar_dashboard_alertas():
             tabla_existe = cursor.fetchone()
             
             if tabla_existe:
-                cursor.execute("SELECT COUNT(*) FROM alertas_sistema")
-                total_alertas = cursor.fetchone()[0]
-                cursor.execute("SELECT COUNT(*) FROM alertas_sistema WHERE procesada = 0")
-                alertas_pendientes = cursor.fetchone()[0]
+                contadores = contadores_bd(db_path)
+                total_alertas = contadores['filas']['alertas_sistema']
+                alertas_pendientes = contadores['alertas_pendientes']
                 
                 print(f"\nAlertas en base de datos:")
                 print(f"  * Total alertas: {total_alertas}")
@@ -357,7 +356,6 @@ def ejecutar_dashboard_alertas():
                         nivel, tipo, ubicacion, mensaje, timestamp = alerta
                         print(f"  * [{nivel}] {tipo} - {ubicacion}: {mensaje[:50]}... ({timestamp})")
             
-            conn.close()
         
         # Intentar importar dashboard_alertas si existe
         try:
@@ -381,28 +379,25 @@ def generar_reporte_alertas():
     
     try:
         # Primero verificar base de datos
-        db_path = 'data/database/calidad_aire.db'
+        db_path = ruta_db()
         if not os.path.exists(db_path):
             print("ERROR: Base de datos no encontrada")
             print("  Ejecute primero el procesador (opcion 2)")
             return False
         
-        import sqlite3
-        from datetime import datetime, timedelta
+        from datetime import datetime
         
-        conn = sqlite3.connect(db_path)
+        conn = obtener_conexion(db_path)
+        migrar(conn)
         cursor = conn.cursor()
         
-        # Calcular fecha de hace 24 horas
-        fecha_limite = (datetime.now() - timedelta(hours=24)).isoformat()
-        
-        # Consultar alertas de las últimas 24 horas
+        # Consultar alertas de las últimas 24 horas (epoch UTC, usa el indice)
         cursor.execute("""
             SELECT nivel, tipo, ubicacion, mensaje, timestamp, procesada
             FROM alertas_sistema 
-            WHERE timestamp >= ?
-            ORDER BY timestamp DESC
-        """, (fecha_limite,))
+            WHERE timestamp_epoch >= ?
+            ORDER BY timestamp_epoch DESC
+        """, (epoch_hace(24),))
         
         alertas = cursor.fetchall()
         
@@ -478,7 +473,6 @@ def generar_reporte_alertas():
         else:
             print("No hay alertas en las últimas 24 horas")
         
-        conn.close()
         return True
         
     except Exception as e:
@@ -493,19 +487,14 @@ def entrenar_modelo():
     
     try:
         # Verificar si hay datos en la base de datos
-        db_path = 'data/database/calidad_aire.db'
+        db_path = ruta_db()
         if not os.path.exists(db_path):
             print("ERROR: Base de datos no encontrada")
             print("  Ejecute primero el procesador (opcion 2)")
             return False
         
         # Verificar si hay suficientes datos en sensor_responses
-        import sqlite3
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM sensor_responses")
-        count = cursor.fetchone()[0]
-        conn.close()
+        count = contadores_bd(db_path)['filas']['sensor_responses']
         
         if count < 10:
             print(f"ADVERTENCIA: Solo hay {count} registros en la base de datos")
@@ -557,11 +546,10 @@ def mostrar_estado_sistema():
     print("\n2. BASE DE DATOS (calidad_aire.db):")
     print("-"*40)
     
-    db_path = 'data/database/calidad_aire.db'
+    db_path = ruta_db()
     if os.path.exists(db_path):
-        import sqlite3
         try:
-            conn = sqlite3.connect(db_path)
+            conn = obtener_conexion(db_path)
             cursor = conn.cursor()
             
             # Verificar tablas específicas del sistema corregido
@@ -572,43 +560,28 @@ def mostrar_estado_sistema():
             print(f"  Ubicacion: {db_path}")
             print(f"  Tablas encontradas: {len(tablas_db)}")
             
+            # Contadores mantenidos por triggers (stats_counters): sin COUNT(*)
+            contadores = contadores_bd(db_path)
+            
             # Contar registros en cada tabla IMPORTANTE
             for tabla in tablas_esperadas:
                 if tabla in tablas_db:
-                    try:
-                        cursor.execute(f"SELECT COUNT(*) FROM {tabla}")
-                        count = cursor.fetchone()[0]
-                        print(f"    * {tabla}: {count} registros")
-                    except:
-                        print(f"    * {tabla}: Error al contar")
+                    print(f"    * {tabla}: {contadores['filas'][tabla]} registros")
                 else:
                     print(f"    * {tabla}: NO EXISTE")
             
             # Información específica de cada tabla
             try:
                 # sensor_requests - estado de procesamiento
-                cursor.execute("SELECT COUNT(*) FROM sensor_requests WHERE processed_at IS NULL")
-                pendientes = cursor.fetchone()[0]
-                cursor.execute("SELECT COUNT(*) FROM sensor_requests WHERE processed_at IS NOT NULL")
-                procesados = cursor.fetchone()[0]
-                print(f"\n    sensor_requests: {pendientes} pendientes, {procesados} procesados")
+                print(f"\n    sensor_requests: {contadores['requests_sin_procesar']} pendientes, "
+                      f"{contadores['requests_procesados']} procesados")
                 
                 # alertas_sistema - estado de alertas
-                cursor.execute("SELECT COUNT(*) FROM alertas_sistema WHERE procesada = 0")
-                alertas_pendientes = cursor.fetchone()[0]
-                cursor.execute("SELECT COUNT(*) FROM alertas_sistema WHERE procesada = 1")
-                alertas_procesadas = cursor.fetchone()[0]
-                print(f"    alertas_sistema: {alertas_pendientes} pendientes, {alertas_procesadas} procesadas")
+                print(f"    alertas_sistema: {contadores['alertas_pendientes']} pendientes, "
+                      f"{contadores['alertas_procesadas']} procesadas")
                 
                 # Calidad del aire actual
-                cursor.execute("""
-                    SELECT calidad_aire_pred, COUNT(*) 
-                    FROM sensor_responses 
-                    GROUP BY calidad_aire_pred 
-                    ORDER BY COUNT(*) DESC
-                    LIMIT 3
-                """)
-                top_calidad = cursor.fetchall()
+                top_calidad = list(contadores['calidad'].items())[:3]
                 if top_calidad:
                     print(f"\n    Calidad del aire más frecuente:")
                     for calidad, cantidad in top_calidad:
@@ -617,7 +590,6 @@ def mostrar_estado_sistema():
             except Exception as e:
                 print(f"    Error obteniendo detalles: {e}")
             
-            conn.close()
             
         except Exception as e:
             print(f"  Error consultando BD: {e}")
@@ -679,17 +651,14 @@ def mostrar_estado_sistema():
     print("-"*40)
     
     if os.path.exists(db_path):
-        import sqlite3
         try:
-            conn = sqlite3.connect(db_path)
+            conn = obtener_conexion(db_path)
             cursor = conn.cursor()
             
             # Verificar archivos_procesados
-            cursor.execute("SELECT COUNT(*) FROM archivos_procesados WHERE procesado = 1")
-            archivos_procesados = cursor.fetchone()[0]
-            cursor.execute("SELECT COUNT(*) FROM archivos_procesados WHERE procesado = 0")
-            archivos_pendientes = cursor.fetchone()[0]
-            print(f"  archivos_procesados.procesado: {archivos_procesados} en 1, {archivos_pendientes} en 0")
+            contadores = contadores_bd(db_path)
+            print(f"  archivos_procesados.procesado: {contadores['archivos_procesados']} en 1, "
+                  f"{contadores['archivos_sin_procesar']} en 0")
             
             # Verificar última fecha de procesamiento
             cursor.execute("SELECT MAX(fecha_procesado) FROM archivos_procesados")
@@ -697,12 +666,9 @@ def mostrar_estado_sistema():
             if ultima_fecha:
                 print(f"  Última fecha procesado: {ultima_fecha}")
             
-            # Verificar alertas procesadas
-            cursor.execute("SELECT COUNT(*) FROM alertas_sistema WHERE procesada = 1 AND fecha_procesada IS NOT NULL")
-            alertas_completas = cursor.fetchone()[0]
-            print(f"  alertas_sistema completas (procesada=1, fecha_procesada!=NULL): {alertas_completas}")
+            # Verificar alertas procesadas (al procesarse siempre se guarda fecha_procesada)
+            print(f"  alertas_sistema completas (procesada=1, fecha_procesada!=NULL): {contadores['alertas_procesadas']}")
             
-            conn.close()
         except:
             print("  Error consultando variables de procesamiento")
     else:
@@ -720,7 +686,7 @@ def limpiar_datos_temporales():
     print("\nSe eliminaran los siguientes datos:")
     print("  [X] Archivos JSON en data/raw_json/ (pendientes de procesar)")
     print("  [X] Archivos en data/archive/ (ya procesados)")
-    print("  [X] Alertas JSON en data/alertas/ (si existen)")
+    print("  [X] Alertas JSON/NDJSON en data/alertas/ (si existen)")
     print("  [X] Reportes/imagenes antiguos en reports/ (excepto 5 mas recientes)")
     
     print("\nSe MANTENDRAN los siguientes datos CRÍTICOS:")
@@ -758,7 +724,7 @@ def limpiar_datos_temporales():
         for directorio in directorios_a_limpiar:
             if os.path.exists(directorio):
                 # Contar archivos antes de eliminar
-                archivos = [f for f in os.listdir(directorio) if f.endswith('.json')]
+                archivos = [f for f in os.listdir(directorio) if f.endswith(('.json', '.ndjson', '.ndjson.gz'))]
                 # Eliminar archivos
                 for archivo in archivos:
                     try:
@@ -817,6 +783,88 @@ def limpiar_datos_temporales():
         print(f"\n✗ ERROR DURANTE LA LIMPIEZA: {e}")
         return False
 
+def mantenimiento_base_datos():
+    """Tareas de mantenimiento de la base de datos"""
+    from particiones_db import archivar_meses_cerrados, listar_particiones, eliminar_particion
+    from compresion_payload import migrar_payloads, mostrar_resultado as mostrar_resultado_compresion
+    from respaldo_db import crear_respaldo, mostrar_respaldo
+    from retencion import (
+        POLITICAS_RETENCION, ejecutar_retencion, mostrar_resultado,
+        vacuum_incremental_activo, activar_vacuum_incremental
+    )
+    
+    db_path = ruta_db()
+    if not os.path.exists(db_path):
+        print("ERROR: Base de datos no encontrada")
+        print("  Ejecute primero el procesador (opcion 2)")
+        return False
+    
+    conn = obtener_conexion(db_path)
+    migrar(conn)
+    
+    while True:
+        print("\n" + "="*50)
+        print("MANTENIMIENTO DE BASE DE DATOS")
+        print("="*50)
+        print("1. Archivar meses cerrados en particiones mensuales")
+        print("2. Ver particiones")
+        print("3. Eliminar particion de un mes")
+        print("4. Comprimir payloads guardados como texto")
+        print("5. Ejecutar retencion de datos")
+        print("6. Crear respaldo en caliente")
+        print("7. Volver")
+        
+        opcion = input("\nSeleccione una opcion (1-7): ").strip()
+        
+        if opcion == "1":
+            movidos = archivar_meses_cerrados(conn)
+            if not movidos:
+                print("No hay meses cerrados pendientes de archivar")
+            for mes, cantidad in movidos.items():
+                print(f"  {mes}: {cantidad} mediciones archivadas")
+        
+        elif opcion == "2":
+            particiones = listar_particiones(conn)
+            if not particiones:
+                print("No hay particiones archivadas")
+            for mes, archivo, _, _, filas_resp, filas_req, _, _ in particiones:
+                print(f"  {mes}  {archivo}  responses: {filas_resp}  requests: {filas_req}")
+        
+        elif opcion == "3":
+            mes = input("Mes a eliminar (AAAA-MM): ").strip()
+            if mes not in [fila[0] for fila in listar_particiones(conn)]:
+                print(f"No existe la particion {mes}")
+                continue
+            confirmar = input(f"Se borraran los datos crudos de {mes}. ¿Continuar? (s/N): ").strip().lower()
+            if confirmar == 's':
+                eliminar_particion(conn, mes)
+                print(f"Particion {mes} eliminada (los resumenes se conservan)")
+        
+        elif opcion == "4":
+            mostrar_resultado_compresion(migrar_payloads(conn))
+        
+        elif opcion == "5":
+            for politica, dias in POLITICAS_RETENCION.items():
+                print(f"  {politica}: {dias} dias en la BD principal")
+            if not vacuum_incremental_activo(conn):
+                activar = input("auto_vacuum incremental no esta activo. ¿Activarlo ahora? "
+                                "(VACUUM completo, una sola vez) (s/N): ").strip().lower()
+                if activar == 's':
+                    activar_vacuum_incremental(conn)
+            mostrar_resultado(ejecutar_retencion(conn))
+        
+        elif opcion == "6":
+            try:
+                mostrar_respaldo(crear_respaldo(db_path))
+            except Exception as e:
+                print(f"✗ Error creando respaldo: {e}")
+        
+        elif opcion == "7":
+            return True
+        
+        else:
+            print("Opcion invalida")
+
 def ejecutar_flujo_completo():
     """Ejecuta el flujo completo del sistema"""
     print("\n" + "="*70)
@@ -918,15 +966,10 @@ def ejecutar_flujo_completo():
         print(f"  Archivos procesados: {archivos_procesados}")
     
     # Base de datos
-    db_path = 'data/database/calidad_aire.db'
+    db_path = ruta_db()
     if os.path.exists(db_path):
-        import sqlite3
         try:
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*) FROM sensor_responses")
-            count = cursor.fetchone()[0]
-            conn.close()
+            count = contadores_bd(db_path)['filas']['sensor_responses']
             print(f"  Datos en base de datos: {count} registros")
         except:
             print(f"  Base de datos: PRESENTE (error al consultar)")
@@ -957,10 +1000,11 @@ def menu_principal():
         print("8.  Mostrar estado del sistema")
         print("9.  Ejecutar flujo completo (2->7->3->6)")
         print("10. Limpiar datos temporales")
-        print("11. Salir del sistema")
+        print("11. Mantenimiento de base de datos")
+        print("12. Salir del sistema")
         
         try:
-            opcion = input("\nSeleccione una opcion (1-11): ").strip()
+            opcion = input("\nSeleccione una opcion (1-12): ").strip()
             
             if opcion == "1":
                 verificar_estructura()
@@ -1015,6 +1059,9 @@ def menu_principal():
                 limpiar_datos_temporales()
             
             elif opcion == "11":
+                mantenimiento_base_datos()
+            
+            elif opcion == "12":
                 print("\n" + "="*70)
                 print("SALIENDO DEL SISTEMA")
                 print("Gracias por usar el Sistema de Monitoreo de Calidad del Aire")
@@ -1033,7 +1080,7 @@ def menu_principal():
             import traceback
             traceback.print_exc()
         
-        if opcion != "11":
+        if opcion != "12":
             input("\nPresione Enter para continuar...")
 
 def main():
@@ -1,8 +1,15 @@
 # archivo: limpiar_base_datos.py
 import os
-import sqlite3
+import sys
 import shutil
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'scripts'))
+from conexion_db import obtener_conexion, cerrar_conexiones, ruta_db
+from respaldo_db import crear_respaldo
+from migraciones import migrar, version_esquema
+from particiones_db import directorio_particiones
+from retencion import RUTA_ARCHIVO_FRIO
+
 def limpiar_base_datos_completamente():
     """Limpia toda la base de datos y la deja como nueva"""
     
@@ -11,87 +18,54 @@ def limpiar_base_datos_completamente():
     print("="*60)
     
     # Ruta de la base de datos
-    db_path = "data/database/calidad_aire.db"
-    backup_path = "calidad_aire_backup.db"
+    db_path = ruta_db()
+    backup_path = os.path.join(os.path.dirname(db_path), "calidad_aire_backup.db")
     
-    # 1. Hacer backup de la base de datos actual
+    # 1. Hacer backup consistente de la base de datos actual (API de backup de SQLite)
     if os.path.exists(db_path):
-        shutil.copy2(db_path, backup_path)
-        print(f"✓ Backup creado: {backup_path}")
+        respaldo = crear_respaldo(db_path, destino=backup_path)
+        print(f"✓ Backup creado: {backup_path} ({respaldo['mb_s']:.1f} MB/s, integridad: {respaldo['integridad']})")
     else:
         print("ℹ️  Base de datos no encontrada, se creará nueva")
     
-    # 2. Eliminar base de datos actual
+    # 2. Eliminar base de datos actual (cerrar antes las conexiones compartidas)
+    cerrar_conexiones(db_path)
     if os.path.exists(db_path):
         os.remove(db_path)
+        for sufijo in ('-wal', '-shm'):
+            if os.path.exists(db_path + sufijo):
+                os.remove(db_path + sufijo)
         print("✓ Base de datos eliminada")
     
+    # 2b. Particiones mensuales y archivo frio: son parte de la misma BD (con
+    # AUTOINCREMENT en 1 sus ids chocarian con los nuevos), se apartan como respaldo
+    particiones = directorio_particiones(db_path)
+    if os.path.isdir(particiones):
+        destino = particiones + '_backup'
+        if os.path.exists(destino):
+            shutil.rmtree(destino)
+        os.rename(particiones, destino)
+        print(f"✓ Particiones mensuales movidas a {destino}")
+    
+    ruta_frio = ruta_db(RUTA_ARCHIVO_FRIO)
+    cerrar_conexiones(ruta_frio)
+    if os.path.exists(ruta_frio):
+        respaldo_frio = os.path.splitext(ruta_frio)[0] + '_backup.db'
+        for sufijo in ('', '-wal', '-shm'):
+            if os.path.exists(respaldo_frio + sufijo):
+                os.remove(respaldo_frio + sufijo)  # de un respaldo anterior
+            if os.path.exists(ruta_frio + sufijo):
+                os.replace(ruta_frio + sufijo, respaldo_frio + sufijo)
+        print(f"✓ Archivo frio movido a {respaldo_frio}")
+    
     # 3. Crear estructura nueva
     print("\nCreando estructura nueva de base de datos...")
     
-    # Asegurar que existe el directorio
-    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    conn = obtener_conexion(db_path)
     
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    # 4. Crear tabla sensor_requests (JSON originales)
-    cursor.execute('''
-        CREATE TABLE sensor_requests (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT,
-            device_id TEXT,
-            request_data TEXT,
-            processed_at TEXT,
-            archived INTEGER DEFAULT 0
-        )
-    ''')
-    print("✓ Tabla 'sensor_requests' creada")
-    
-    # 5. Crear tabla sensor_responses (análisis)
-    cursor.execute('''
-        CREATE TABLE sensor_responses (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            request_id INTEGER,
-            calidad_aire_pred TEXT,
-            co2_nivel TEXT,
-            temperatura REAL,
-            humedad REAL,
-            presion REAL,
-            importancia_variables TEXT,
-            prediccion_detalle TEXT,
-            created_at TEXT,
-            FOREIGN KEY (request_id) REFERENCES sensor_requests(id)
-        )
-    ''')
-    print("✓ Tabla 'sensor_responses' creada")
-    
-    # 6. Crear tabla alertas_sistema CORRECTA
-    cursor.execute('''
-        CREATE TABLE alertas_sistema (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT NOT NULL,
-            nivel TEXT NOT NULL,
-            tipo TEXT NOT NULL,
-            ubicacion TEXT,
-            mensaje TEXT NOT NULL,
-            datos_adicionales TEXT,
-            procesada INTEGER DEFAULT 0,
-            fecha_procesada TEXT
-        )
-    ''')
-    print("✓ Tabla 'alertas_sistema' creada (estructura correcta)")
-    
-    # 7. Crear índices para mejor performance
-    cursor.execute('CREATE INDEX idx_requests_timestamp ON sensor_requests(timestamp)')
-    cursor.execute('CREATE INDEX idx_responses_created ON sensor_responses(created_at)')
-    cursor.execute('CREATE INDEX idx_alertas_timestamp ON alertas_sistema(timestamp)')
-    cursor.execute('CREATE INDEX idx_alertas_procesada ON alertas_sistema(procesada)')
-    cursor.execute('CREATE INDEX idx_alertas_nivel ON alertas_sistema(nivel)')
-    print("✓ Índices creados")
-    
-    conn.commit()
-    conn.close()
+    # 4. Tablas, columnas derivadas, resumenes e indices: migraciones versionadas
+    aplicadas = migrar(conn, mostrar=False)
+    print(f"✓ Esquema creado (version {version_esquema(conn)}, {len(aplicadas)} migraciones aplicadas)")
     
     print("\n" + "="*60)
     print("✅ BASE DE DATOS LIMPIA Y LISTA PARA USAR")
@@ -100,18 +74,19 @@ def limpiar_base_datos_completamente():
     print("  • sensor_requests     - JSON originales de sensores")
     print("  • sensor_responses    - Análisis y predicciones")
     print("  • alertas_sistema     - Alertas del sistema (estructura correcta)")
+    print("  • archivos_procesados - Registro de archivos JSON procesados")
+    print("  • resumen_horario / resumen_diario - Agregados por ubicacion")
     print("\nNota: El backup está en data/database/calidad_aire_backup.db")
+    print("      (particiones en particiones_backup/, archivo frio en archivo_frio_backup.db)")
     print("="*60)
 
 def verificar_estructura():
     """Verifica la estructura de la base de datos"""
-    db_path = "data/database/calidad_aire.db"
-    
-    if not os.path.exists(db_path):
+    conn = obtener_conexion(crear=False)
+    if conn is None:
         print("❌ Base de datos no encontrada")
         return
     
-    conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
     
     print("\n" + "="*60)
@@ -136,7 +111,6 @@ def verificar_estructura():
             default = f" DEFAULT {col[4]}" if col[4] else ""
             print(f"      - {col[1]} ({col[2]}{not_null}{default})")
     
-    conn.close()
     
     print("\n" + "="*60)
     print("VERIFICACIÓN COMPLETADA")
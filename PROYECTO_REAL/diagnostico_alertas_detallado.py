@@ -1,12 +1,17 @@
 # verificar_contenido_tablas.py
-import sqlite3
+import os
+import sys
 import json
 import pandas as pd
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
+from conexion_db import obtener_conexion
+from migraciones import migrar
+
 def verificar_contenido_detallado():
     """Verifica contenido detallado de todas las tablas"""
-    db_path = 'data/database/calidad_aire.db'
-    conn = sqlite3.connect(db_path)
+    conn = obtener_conexion()
+    migrar(conn)
     
     print("=" * 80)
     print("VERIFICACIÓN DETALLADA DEL CONTENIDO DE TABLAS")
@@ -60,14 +65,14 @@ def verificar_contenido_detallado():
     print("\n\n3. CORRELACIÓN RESPUESTAS-ALERTAS:")
     print("-" * 40)
     
-    # Buscar respuestas críticas que deberían tener alertas
+    # Buscar respuestas críticas que deberían tener alertas (enlace exacto en responses_alertas)
     query = '''
         SELECT sr.id, sr.request_id, sr.calidad_aire_pred, sr.co2_nivel,
                sr.temperature, sr.humedad,
-               (SELECT COUNT(*) FROM alertas_sistema a 
-                WHERE a.timestamp >= datetime(sr.created_at, '-10 minutes')
-                  AND a.timestamp <= datetime(sr.created_at, '+10 minutes')
-                  AND a.nivel IN ('CRITICA', 'ALTA')) as alertas_cercanas
+               (SELECT COUNT(*) FROM responses_alertas ra
+                JOIN alertas_sistema a ON a.id = ra.alerta_id
+                WHERE ra.response_id = sr.id
+                  AND a.nivel IN ('CRITICA', 'ALTA')) as alertas_enlazadas
         FROM sensor_responses sr
         WHERE sr.co2_nivel LIKE '%Critico%' OR sr.co2_nivel LIKE '%Muy elevado%'
         ORDER BY sr.id DESC 
@@ -103,7 +108,6 @@ def verificar_contenido_detallado():
     df_archivos = pd.read_sql_query(query, conn)
     print(df_archivos.to_string(index=False))
     
-    conn.close()
     
     # 6. RESUMEN FINAL
     print("\n" + "=" * 80)
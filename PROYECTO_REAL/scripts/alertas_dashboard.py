@@ -1,13 +1,27 @@
 # alertas_dashboard.py
 import os
-import sqlite3
 import pandas as pd
 from datetime import datetime, timedelta
+from conexion_db import obtener_conexion, ruta_db
+from migraciones import migrar
+from tiempo_utc import epoch_hace
+from busqueda_alertas import mostrar_busqueda
+from replica_lectura import ReplicaLectura
 
 class DashboardAlertas:
     def __init__(self):
         self.proyecto_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        self.db_path = os.path.join(self.proyecto_root, 'data/database/calidad_aire.db')
+        self.db_path = ruta_db()
+        self._esquema_verificado = False
+        self.replica = ReplicaLectura(self.db_path)
+    
+    def conectar_db(self):
+        """Conexion de solo lectura a la replica; aplica una vez las migraciones pendientes en la BD principal"""
+        if not self._esquema_verificado:
+            if migrar(obtener_conexion(self.db_path)):
+                self.replica.refrescar()
+            self._esquema_verificado = True
+        return self.replica.conexion()
     
     def mostrar_alertas_pendientes(self):
         """Muestra alertas pendientes de atencion"""
@@ -20,7 +34,7 @@ class DashboardAlertas:
             return
         
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self.conectar_db()
             query = '''
                 SELECT id, timestamp, nivel, tipo, ubicacion, mensaje
                 FROM alertas_sistema
@@ -31,11 +45,10 @@ class DashboardAlertas:
                         WHEN 'ADVERTENCIA' THEN 2
                         ELSE 3
                     END,
-                    timestamp DESC
+                    timestamp_epoch DESC
                 LIMIT 20
             '''
             df = pd.read_sql_query(query, conn)
-            conn.close()
             
             if df.empty:
                 print("No hay alertas pendientes ✓")
@@ -75,19 +88,20 @@ class DashboardAlertas:
             return
         
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self.conectar_db()
             
             # Estadisticas generales
-            query = f'''
+            desde = epoch_hace(horas)
+            query = '''
                 SELECT 
                     nivel,
                     COUNT(*) as total,
                     SUM(CASE WHEN procesada = 1 THEN 1 ELSE 0 END) as procesadas
                 FROM alertas_sistema
-                WHERE datetime(timestamp) >= datetime('now', '-{horas} hours')
+                WHERE timestamp_epoch >= ?
                 GROUP BY nivel
             '''
-            df = pd.read_sql_query(query, conn)
+            df = pd.read_sql_query(query, conn, params=(desde,))
             
             if not df.empty:
                 print("\nResumen por nivel:")
@@ -96,14 +110,14 @@ class DashboardAlertas:
                     print(f"   {row['nivel']}: {row['total']} total, {row['procesadas']} procesadas, {pendientes} pendientes")
             
             # Alertas por tipo
-            query = f'''
+            query = '''
                 SELECT tipo, COUNT(*) as cantidad
                 FROM alertas_sistema
-                WHERE datetime(timestamp) >= datetime('now', '-{horas} hours')
+                WHERE timestamp_epoch >= ?
                 GROUP BY tipo
                 ORDER BY cantidad DESC
             '''
-            df_tipos = pd.read_sql_query(query, conn)
+            df_tipos = pd.read_sql_query(query, conn, params=(desde,))
             
             if not df_tipos.empty:
                 print("\nAlertas por tipo:")
@@ -111,22 +125,25 @@ class DashboardAlertas:
                     print(f"   {row['tipo']}: {row['cantidad']}")
             
             # Ubicaciones con mas alertas
-            query = f'''
-                SELECT ubicacion, COUNT(*) as cantidad
-                FROM alertas_sistema
-                WHERE datetime(timestamp) >= datetime('now', '-{horas} hours')
-                GROUP BY ubicacion
-                ORDER BY cantidad DESC
+            query = '''
+                SELECT COALESCE(u.nombre, 'Desconocida') as ubicacion, c.cantidad
+                FROM (
+                    SELECT ubicacion_id, COUNT(*) as cantidad
+                    FROM alertas_sistema
+                    WHERE timestamp_epoch >= ?
+                    GROUP BY ubicacion_id
+                ) c
+                LEFT JOIN ubicaciones u ON u.id = c.ubicacion_id
+                ORDER BY c.cantidad DESC
                 LIMIT 5
             '''
-            df_ubicaciones = pd.read_sql_query(query, conn)
+            df_ubicaciones = pd.read_sql_query(query, conn, params=(desde,))
             
             if not df_ubicaciones.empty:
                 print("\nUbicaciones con mas alertas:")
                 for _, row in df_ubicaciones.iterrows():
                     print(f"   {row['ubicacion']}: {row['cantidad']} alertas")
             
-            conn.close()
             
         except Exception as e:
             print(f"Error obteniendo estadisticas: {e}")
@@ -141,10 +158,11 @@ class DashboardAlertas:
             print("2. Ver estadisticas (24h)")
             print("3. Ver estadisticas (12h)")
             print("4. Ver estadisticas (6h)")
-            print("5. Volver al menu principal")
+            print("5. Buscar alertas por texto")
+            print("6. Volver al menu principal")
             print("-"*70)
             
-            opcion = input("Seleccione una opcion (1-5): ").strip()
+            opcion = input("Seleccione una opcion (1-6): ").strip()
             
             if opcion == "1":
                 self.mostrar_alertas_pendientes()
@@ -155,12 +173,17 @@ class DashboardAlertas:
             elif opcion == "4":
                 self.mostrar_estadisticas_alertas(6)
             elif opcion == "5":
+                texto = input("Texto a buscar (mensaje, ubicacion o condicion): ").strip()
+                if texto:
+                    solo_pendientes = input("Solo pendientes? (s/n): ").strip().lower() == 's'
+                    mostrar_busqueda(self.conectar_db(), texto, solo_pendientes=solo_pendientes)
+            elif opcion == "6":
                 print("Saliendo del dashboard de alertas...")
                 break
             else:
                 print("Opcion invalida. Intente nuevamente.")
             
-            if opcion in ["1", "2", "3", "4"]:
+            if opcion in ["1", "2", "3", "4", "5"]:
                 input("\nPresione Enter para continuar...")
 
 def main():
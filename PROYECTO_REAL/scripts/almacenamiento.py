@@ -0,0 +1,826 @@
+import json
+import time
+import threading
+from datetime import datetime
+from abc import ABC, abstractmethod
+from conexion_db import obtener_conexion, ruta_db, existe_db
+from esquema_db import verificar_planes_consulta
+from migraciones import migrar
+from resumenes_db import actualizar_resumenes
+from compresion_payload import comprimir_payload
+from dimensiones_db import (
+    CacheDimensiones, UBICACION_DESCONOCIDA, ids_ubicaciones_que_contienen, nombres_ubicaciones
+)
+from busqueda_alertas import buscar_alertas
+from versiones_modelo import CacheVersiones, huella_version
+from enlaces_alertas import guardar_enlaces
+from enfriamiento_alertas import reservar_enfriamiento, purgar_enfriamientos
+from ultimas_lecturas import (
+    CacheUltimasLecturas, lecturas_de_responses, actualizar_ultimas, leer_ultimas
+)
+from tiempo_utc import a_epoch
+
+# Interfaz de persistencia del procesador y del sistema de alertas.
+# ProcesadorCalidadAire y SistemaAlertas solo llaman a estos metodos; el
+# motor concreto se elige al construirlos. Las escrituras reciben lotes
+# (listas) y cada lote es una transaccion.
+#
+#   request:  {'timestamp', 'device_id', 'json_data', 'dispositivo_id'}
+#   response: columnas de sensor_responses (ver COLUMNAS_RESPONSE) y opcionalmente
+#             'alerta_ids' (alertas ya guardadas que genero; van a responses_alertas)
+#   alerta:   {'timestamp', 'nivel', 'tipo', 'ubicacion', 'mensaje', 'datos_adicionales'}
+#             y opcionalmente 'procesada' y 'fecha_procesada' si ya se guarda procesada
+
+COLUMNAS_RESPONSE = (
+    'request_id', 'calidad_aire_pred', 'co2_nivel', 'temperature', 'humedad', 'presion',
+    'model_version_id', 'prediccion_detalle', 'created_at', 'co2_ppm', 'prediccion_valor',
+    'ubicacion', 'device_id', 'created_at_epoch', 'ubicacion_id', 'dispositivo_id'
+)
+
+# Columnas devueltas por las consultas por rango de responses
+COLUMNAS_RANGO_RESPONSES = (
+    'id', 'created_at', 'ubicacion', 'device_id', 'calidad_aire_pred',
+    'co2_ppm', 'temperature', 'humedad', 'presion', 'prediccion_valor'
+)
+
+
+class Almacenamiento(ABC):
+    """Interfaz comun de los motores de almacenamiento
+
+    Los metodos abstractos son obligatorios: un motor incompleto falla al
+    instanciarse, no a mitad de una ingesta.
+    """
+
+    descripcion = ''
+
+    def disponible(self):
+        """Indica si el almacenamiento se puede usar (p. ej. si la BD existe)"""
+        return True
+
+    def preparar(self):
+        """Crea o migra la estructura; devuelve advertencias (lista de textos)"""
+        return []
+
+    # Dimensiones
+    @abstractmethod
+    def id_ubicacion(self, nombre, latitud=None, longitud=None):
+        pass
+
+    @abstractmethod
+    def id_dispositivo(self, codigo, ubicacion_id=None):
+        pass
+
+    @abstractmethod
+    def id_version_modelo(self, importancias, features, fecha_entrenamiento=None):
+        """Id de la version del modelo con esas importancias y features (la registra si es nueva)"""
+
+    # Archivos procesados
+    @abstractmethod
+    def archivo_procesado(self, nombre_archivo):
+        """(id, fecha_procesado) si el archivo ya se proceso, si no None"""
+
+    @abstractmethod
+    def registrar_archivos_procesados(self, archivos):
+        """archivos: lista de (nombre_archivo, request_id)"""
+
+    # Requests y responses
+    @abstractmethod
+    def guardar_requests(self, requests):
+        """Guarda los requests con processed_at = NULL; devuelve sus ids"""
+
+    @abstractmethod
+    def marcar_requests_procesados(self, request_ids):
+        pass
+
+    @abstractmethod
+    def guardar_responses(self, responses):
+        """Guarda los responses, sus enlaces a alertas, agregados y ultimas lecturas; devuelve sus ids"""
+
+    @abstractmethod
+    def alertas_de_response(self, response_id):
+        """Ids de las alertas que genero el response"""
+
+    @abstractmethod
+    def ultimas_lecturas(self, ubicacion=None):
+        """Ultima lectura de cada ubicacion y dispositivo (dicts de COLUMNAS_ULTIMAS), la mas reciente primero"""
+
+    @abstractmethod
+    def responses_en_rango(self, desde_epoch, hasta_epoch=None, ubicacion=None, limite=None):
+        """Responses con created_at_epoch en [desde, hasta), del mas reciente al mas antiguo"""
+
+    @abstractmethod
+    def agregados_por_ubicacion(self, desde_epoch, hasta_epoch=None):
+        """{ubicacion: {'n', 'co2_promedio', 'co2_min', 'co2_max', 'temperatura_promedio', 'humedad_promedio'}}"""
+
+    # Alertas
+    @abstractmethod
+    def guardar_alertas(self, alertas):
+        """Guarda las alertas (por defecto con procesada = 0); devuelve sus ids"""
+
+    @abstractmethod
+    def marcar_alertas_procesadas(self, marcas):
+        """marcas: lista de (alerta_id, datos que se agregan a datos_adicionales)
+
+        Devuelve el numero de alertas actualizadas.
+        """
+
+    @abstractmethod
+    def contar_alertas_pendientes(self, nivel, hasta_epoch):
+        """Alertas sin procesar del nivel dado con timestamp_epoch <= hasta_epoch"""
+
+    @abstractmethod
+    def alertas_pendientes(self, nivel=None, ubicacion=None, limite=20):
+        """Alertas sin procesar (la ubicacion se busca por coincidencia parcial)"""
+
+    @abstractmethod
+    def buscar_alertas(self, texto, limite=20, solo_pendientes=False):
+        pass
+
+    @abstractmethod
+    def resumen_alertas(self, desde_epoch):
+        """Conteos por nivel, tipo y ubicacion: lista de (nivel, tipo, ubicacion, cantidad, procesadas)"""
+
+    @abstractmethod
+    def alertas_recientes(self, desde_epoch, limite=10):
+        pass
+
+    # Enfriamiento de alertas (deduplicacion compartida entre procesos)
+    @abstractmethod
+    def reservar_enfriamiento(self, clave, ahora_epoch, espera):
+        """Comprobar y fijar atomico: (permitida, ultima_epoch) de la clave"""
+
+    @abstractmethod
+    def purgar_enfriamientos(self, antes_epoch):
+        """Borra las claves sin alertas desde antes_epoch"""
+
+
+def _datos_resumen(response):
+    """Fila de response -> entrada para los resumenes horario/diario"""
+    return {
+        'ubicacion': response['ubicacion'],
+        'device_id': response['device_id'],
+        'epoch': response['created_at_epoch'],
+        'calidad_aire': response['calidad_aire_pred'],
+        'co2': response['co2_ppm'],
+        'temperatura': response['temperature'],
+        'humedad': response['humedad'],
+        'presion': response['presion'],
+    }
+
+
+def _combinar_datos(datos_json, extra):
+    """Agrega extra al JSON de datos_adicionales (un JSON invalido se reemplaza)"""
+    try:
+        datos = json.loads(datos_json) if datos_json else {}
+    except ValueError:
+        datos = {}
+    if not isinstance(datos, dict):
+        datos = {}
+    datos.update(extra)
+    return datos
+
+
+def _orden_nivel(nivel):
+    return {'CRITICA': 1, 'ADVERTENCIA': 2, 'INFO': 3}.get(nivel, 4)
+
+
+class AlmacenamientoSQLite(Almacenamiento):
+    """Motor actual: la BD SQLite del proyecto (conexion persistente por hilo)"""
+
+    _SQL_INSERTAR_RESPONSE = (f"INSERT INTO sensor_responses ({', '.join(COLUMNAS_RESPONSE)}) "
+                              f"VALUES ({', '.join('?' * len(COLUMNAS_RESPONSE))})")
+
+    def __init__(self, db_path=None, crear=True):
+        self.db_path = ruta_db(db_path)
+        self.crear = crear
+        self.descripcion = self.db_path
+        self.dimensiones = CacheDimensiones()  # nombre/codigo -> id entero
+        self.ultimas = CacheUltimasLecturas()  # copia de latest_readings
+        self.versiones = CacheVersiones()      # huella -> id de model_versions
+        self._migrada = False
+        self._lock_migracion = threading.Lock()
+
+    def conexion(self):
+        """Conexion persistente de este hilo (None si la BD no existe y crear=False)
+
+        La primera vez que se abre la BD se aplican las migraciones pendientes.
+        """
+        conn = obtener_conexion(self.db_path, crear=self.crear)
+        if conn is not None and not self._migrada:
+            with self._lock_migracion:
+                if not self._migrada:
+                    migrar(conn)
+                    self._migrada = True
+        return conn
+
+    def disponible(self):
+        return self.crear or existe_db(self.db_path)
+
+    def preparar(self):
+        """Migra (al abrir la conexion) y revisa los planes de las consultas frecuentes"""
+        conn = self.conexion()
+        return [f"Consulta sin indice ({descripcion}): {detalle}"
+                for descripcion, detalle in verificar_planes_consulta(conn)]
+
+    def id_ubicacion(self, nombre, latitud=None, longitud=None):
+        return self.dimensiones.id_ubicacion(self.conexion(), nombre, latitud, longitud)
+
+    def id_dispositivo(self, codigo, ubicacion_id=None):
+        return self.dimensiones.id_dispositivo(self.conexion(), codigo, ubicacion_id)
+
+    def id_version_modelo(self, importancias, features, fecha_entrenamiento=None):
+        return self.versiones.id_version(self.conexion(), importancias, features, fecha_entrenamiento)
+
+    def archivo_procesado(self, nombre_archivo):
+        return self.conexion().execute('''
+            SELECT id, fecha_procesado
+            FROM archivos_procesados
+            WHERE nombre_archivo = ? AND procesado = 1
+        ''', (nombre_archivo,)).fetchone()
+
+    def registrar_archivos_procesados(self, archivos):
+        ahora = datetime.now()
+        conn = self.conexion()
+        # UPSERT y no INSERT OR REPLACE: el borrado implicito de REPLACE no
+        # dispara los triggers de stats_counters
+        with conn:
+            conn.executemany('''
+                INSERT INTO archivos_procesados
+                (nombre_archivo, fecha_procesado, procesado, request_id, fecha_procesado_epoch)
+                VALUES (?, ?, 1, ?, ?)
+                ON CONFLICT (nombre_archivo) DO UPDATE SET
+                    fecha_procesado = excluded.fecha_procesado,
+                    procesado = 1,
+                    request_id = excluded.request_id,
+                    fecha_procesado_epoch = excluded.fecha_procesado_epoch
+            ''', [(nombre, ahora.isoformat(), request_id, a_epoch(ahora)) for nombre, request_id in archivos])
+
+    def guardar_requests(self, requests):
+        conn = self.conexion()
+        ids = []
+        with conn:
+            for request in requests:
+                ids.append(conn.execute('''
+                    INSERT INTO sensor_requests
+                    (timestamp, device_id, request_data, processed_at, archived, timestamp_epoch, dispositivo_id)
+                    VALUES (?, ?, ?, NULL, 0, ?, ?)
+                ''', (request['timestamp'], request['device_id'], comprimir_payload(request['json_data']),
+                      a_epoch(request['timestamp']), request.get('dispositivo_id'))).lastrowid)
+        return ids
+
+    def marcar_requests_procesados(self, request_ids):
+        ahora = datetime.now()
+        conn = self.conexion()
+        with conn:
+            conn.executemany('''
+                UPDATE sensor_requests
+                SET processed_at = ?, processed_at_epoch = ?, archived = 1
+                WHERE id = ?
+            ''', [(ahora.isoformat(), a_epoch(ahora), request_id) for request_id in request_ids])
+
+    def guardar_responses(self, responses):
+        conn = self.conexion()
+        lecturas = lecturas_de_responses(responses)
+        # Enlaces, resumenes y ultimas lecturas en la misma transaccion que los responses
+        with conn:
+            conn.executemany(self._SQL_INSERTAR_RESPONSE,
+                             [[response.get(columna) for columna in COLUMNAS_RESPONSE] for response in responses])
+            # Ids consecutivos de AUTOINCREMENT dentro de la transaccion (ver guardar_alertas)
+            ultimo = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
+            ids = list(range(ultimo - len(responses) + 1, ultimo + 1))
+            guardar_enlaces(conn, [(response_id, alerta_id)
+                                   for response_id, response in zip(ids, responses)
+                                   for alerta_id in response.get('alerta_ids') or ()])
+            actualizar_resumenes(conn, [_datos_resumen(response) for response in responses])
+            actualizar_ultimas(conn, lecturas)
+        self.ultimas.actualizar(lecturas)  # solo despues de confirmar
+        return ids
+
+    def alertas_de_response(self, response_id):
+        return [fila[0] for fila in self.conexion().execute(
+            'SELECT alerta_id FROM responses_alertas WHERE response_id = ? ORDER BY alerta_id', (response_id,))]
+
+    def ultimas_lecturas(self, ubicacion=None):
+        if not self.ultimas.cargada():
+            self.ultimas.cargar(leer_ultimas(self.conexion()))
+        return self.ultimas.lecturas(ubicacion)
+
+    def responses_en_rango(self, desde_epoch, hasta_epoch=None, ubicacion=None, limite=None):
+        conn = self.conexion()
+        query = f'''
+            SELECT {', '.join(COLUMNAS_RANGO_RESPONSES)}
+            FROM sensor_responses
+            WHERE created_at_epoch >= ?
+        '''
+        params = [desde_epoch]
+        if hasta_epoch is not None:
+            query += ' AND created_at_epoch < ?'
+            params.append(hasta_epoch)
+        if ubicacion is not None:
+            fila = conn.execute('SELECT id FROM ubicaciones WHERE nombre = ?', (ubicacion,)).fetchone()
+            if fila is None:
+                return []
+            query += ' AND ubicacion_id = ?'
+            params.append(fila[0])
+        query += ' ORDER BY created_at_epoch DESC'
+        if limite is not None:
+            query += ' LIMIT ?'
+            params.append(limite)
+        return [dict(zip(COLUMNAS_RANGO_RESPONSES, fila)) for fila in conn.execute(query, params)]
+
+    def agregados_por_ubicacion(self, desde_epoch, hasta_epoch=None):
+        conn = self.conexion()
+        filtro_hasta = ' AND created_at_epoch < ?' if hasta_epoch is not None else ''
+        params = [desde_epoch] + ([hasta_epoch] if hasta_epoch is not None else [])
+        filas = conn.execute(f'''
+            SELECT ubicacion_id, COUNT(*), AVG(co2_ppm), MIN(co2_ppm), MAX(co2_ppm),
+                   AVG(temperature), AVG(humedad)
+            FROM sensor_responses
+            WHERE created_at_epoch >= ?{filtro_hasta}
+            GROUP BY ubicacion_id
+        ''', params).fetchall()
+        nombres = nombres_ubicaciones(conn)
+        return {
+            nombres.get(ubicacion_id, UBICACION_DESCONOCIDA): {
+                'n': n, 'co2_promedio': co2_promedio, 'co2_min': co2_min, 'co2_max': co2_max,
+                'temperatura_promedio': temperatura, 'humedad_promedio': humedad
+            }
+            for ubicacion_id, n, co2_promedio, co2_min, co2_max, temperatura, humedad in filas
+        }
+
+    def guardar_alertas(self, alertas):
+        if not alertas:
+            return []
+        conn = self.conexion()
+        # Las ubicaciones nuevas se confirman antes, fuera de la transaccion del lote
+        filas = []
+        for alerta in alertas:
+            ubicacion = alerta.get('ubicacion') or UBICACION_DESCONOCIDA
+            fecha_procesada = alerta.get('fecha_procesada')
+            filas.append((
+                alerta['timestamp'],
+                alerta['nivel'],
+                alerta['tipo'],
+                ubicacion,
+                alerta['mensaje'],
+                json.dumps(alerta.get('datos_adicionales') or {}, ensure_ascii=False),
+                alerta.get('procesada', 0),
+                fecha_procesada,
+                a_epoch(alerta['timestamp']),
+                a_epoch(fecha_procesada) if fecha_procesada else None,
+                self.dimensiones.id_ubicacion(conn, ubicacion)
+            ))
+        with conn:
+            conn.executemany('''
+                INSERT INTO alertas_sistema
+                (timestamp, nivel, tipo, ubicacion, mensaje, datos_adicionales, procesada, fecha_procesada,
+                 timestamp_epoch, fecha_procesada_epoch, ubicacion_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', filas)
+            # executemany no informa los ids; dentro de la transaccion los de
+            # AUTOINCREMENT son consecutivos y terminan en last_insert_rowid()
+            ultimo = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
+        return list(range(ultimo - len(filas) + 1, ultimo + 1))
+
+    def marcar_alertas_procesadas(self, marcas):
+        ahora = datetime.now()
+        conn = self.conexion()
+        actualizadas = 0
+        with conn:
+            for alerta_id, extra in marcas:
+                fila = conn.execute('SELECT datos_adicionales FROM alertas_sistema WHERE id = ?',
+                                    (alerta_id,)).fetchone()
+                if fila is None:
+                    continue
+                actualizadas += conn.execute('''
+                    UPDATE alertas_sistema
+                    SET procesada = 1,
+                        fecha_procesada = ?,
+                        fecha_procesada_epoch = ?,
+                        datos_adicionales = ?
+                    WHERE id = ?
+                ''', (ahora.isoformat(), a_epoch(ahora),
+                      json.dumps(_combinar_datos(fila[0], extra), ensure_ascii=False),
+                      alerta_id)).rowcount
+        return actualizadas
+
+    def contar_alertas_pendientes(self, nivel, hasta_epoch):
+        return self.conexion().execute('''
+            SELECT COUNT(*) FROM alertas_sistema
+            WHERE procesada = 0 AND nivel = ?
+            AND timestamp_epoch <= ?
+        ''', (nivel, hasta_epoch)).fetchone()[0]
+
+    def alertas_pendientes(self, nivel=None, ubicacion=None, limite=20):
+        conn = self.conexion()
+        query = '''
+            SELECT id, timestamp, nivel, tipo, ubicacion, mensaje, datos_adicionales,
+                   procesada, fecha_procesada
+            FROM alertas_sistema
+            WHERE procesada = 0
+        '''
+        params = []
+        if nivel:
+            query += ' AND nivel = ?'
+            params.append(nivel)
+        if ubicacion:
+            # Coincidencia parcial sobre la dimension; la tabla se filtra por enteros
+            ids = ids_ubicaciones_que_contienen(conn, ubicacion)
+            if not ids:
+                return []
+            query += f" AND ubicacion_id IN ({','.join('?' * len(ids))})"
+            params.extend(ids)
+        query += ' ORDER BY timestamp_epoch DESC LIMIT ?'
+        params.append(limite)
+
+        columnas = ('id', 'timestamp', 'nivel', 'tipo', 'ubicacion', 'mensaje',
+                    'datos_adicionales', 'procesada', 'fecha_procesada')
+        alertas = []
+        for fila in conn.execute(query, params).fetchall():
+            alerta = dict(zip(columnas, fila))
+            alerta['datos_adicionales'] = json.loads(alerta['datos_adicionales']) if alerta['datos_adicionales'] else {}
+            alertas.append(alerta)
+        return alertas
+
+    def buscar_alertas(self, texto, limite=20, solo_pendientes=False):
+        return buscar_alertas(self.conexion(), texto, limite, solo_pendientes)
+
+    def resumen_alertas(self, desde_epoch):
+        conn = self.conexion()
+        filas = conn.execute('''
+            SELECT
+                nivel,
+                tipo,
+                ubicacion_id,
+                COUNT(*) as cantidad,
+                SUM(CASE WHEN procesada = 1 THEN 1 ELSE 0 END) as procesadas
+            FROM alertas_sistema
+            WHERE timestamp_epoch >= ?
+            GROUP BY nivel, tipo, ubicacion_id
+            ORDER BY
+                CASE nivel
+                    WHEN 'CRITICA' THEN 1
+                    WHEN 'ADVERTENCIA' THEN 2
+                    WHEN 'INFO' THEN 3
+                    ELSE 4
+                END,
+                cantidad DESC
+        ''', (desde_epoch,)).fetchall()
+        nombres = nombres_ubicaciones(conn)
+        return [(nivel, tipo, nombres.get(ubicacion_id, UBICACION_DESCONOCIDA), cantidad, procesadas)
+                for nivel, tipo, ubicacion_id, cantidad, procesadas in filas]
+
+    def alertas_recientes(self, desde_epoch, limite=10):
+        columnas = ('timestamp', 'nivel', 'tipo', 'ubicacion', 'mensaje', 'procesada', 'fecha_procesada')
+        filas = self.conexion().execute(f'''
+            SELECT {', '.join(columnas)}
+            FROM alertas_sistema
+            WHERE timestamp_epoch >= ?
+            ORDER BY timestamp_epoch DESC
+            LIMIT ?
+        ''', (desde_epoch, limite)).fetchall()
+        return [dict(zip(columnas, fila)) for fila in filas]
+
+    def reservar_enfriamiento(self, clave, ahora_epoch, espera):
+        return reservar_enfriamiento(self.conexion(), clave, ahora_epoch, espera)
+
+    def purgar_enfriamientos(self, antes_epoch):
+        return purgar_enfriamientos(self.conexion(), antes_epoch)
+
+
+class AlmacenamientoMemoria(Almacenamiento):
+    """Motor en memoria (listas y dicts), sin E/S
+
+    Sirve para medir el costo de CPU del procesamiento sin el de disco y
+    para pruebas. El payload se comprime igual que en SQLite para que la
+    diferencia medida sea solo la del motor. Nada sobrevive al proceso.
+    """
+
+    descripcion = 'memoria'
+
+    def __init__(self):
+        self.ubicaciones = {}   # nombre -> {'id', 'latitud', 'longitud'}
+        self.dispositivos = {}  # codigo -> {'id', 'ubicacion_id'}
+        self.archivos = {}      # nombre -> (request_id, fecha_procesado)
+        self.requests = {}      # id -> dict
+        self.responses = []
+        self.alertas = {}       # id -> dict (datos_adicionales como dict)
+        self.versiones = {}     # huella -> {'id', 'importancia_variables', 'features_utilizadas', ...}
+        self.enfriamientos = {} # clave -> epoch de la ultima alerta
+        self.ultimas = CacheUltimasLecturas()
+        self.ultimas.cargar([])
+
+    def id_ubicacion(self, nombre, latitud=None, longitud=None):
+        nombre = nombre or UBICACION_DESCONOCIDA
+        ubicacion = self.ubicaciones.get(nombre)
+        if ubicacion is None:
+            ubicacion = self.ubicaciones[nombre] = {'id': len(self.ubicaciones) + 1,
+                                                    'latitud': None, 'longitud': None}
+        if latitud is not None and ubicacion['latitud'] is None:
+            ubicacion['latitud'], ubicacion['longitud'] = latitud, longitud
+        return ubicacion['id']
+
+    def id_dispositivo(self, codigo, ubicacion_id=None):
+        if not codigo:
+            return None
+        dispositivo = self.dispositivos.get(codigo)
+        if dispositivo is None:
+            dispositivo = self.dispositivos[codigo] = {'id': len(self.dispositivos) + 1, 'ubicacion_id': None}
+        if ubicacion_id is not None:
+            dispositivo['ubicacion_id'] = ubicacion_id
+        return dispositivo['id']
+
+    def id_version_modelo(self, importancias, features, fecha_entrenamiento=None):
+        huella = huella_version(importancias, features)
+        version = self.versiones.get(huella)
+        if version is None:
+            version = self.versiones[huella] = {
+                'id': len(self.versiones) + 1, 'importancia_variables': dict(importancias),
+                'features_utilizadas': list(features), 'fecha_entrenamiento': fecha_entrenamiento
+            }
+        return version['id']
+
+    def archivo_procesado(self, nombre_archivo):
+        registro = self.archivos.get(nombre_archivo)
+        return (registro[0], registro[1]) if registro else None
+
+    def registrar_archivos_procesados(self, archivos):
+        fecha = datetime.now().isoformat()
+        for nombre, request_id in archivos:
+            self.archivos[nombre] = (request_id, fecha)
+
+    def guardar_requests(self, requests):
+        ids = []
+        for request in requests:
+            request_id = len(self.requests) + 1
+            self.requests[request_id] = {
+                'timestamp': request['timestamp'],
+                'device_id': request['device_id'],
+                'request_data': comprimir_payload(request['json_data']),
+                'processed_at': None,
+                'archived': 0,
+                'timestamp_epoch': a_epoch(request['timestamp']),
+                'dispositivo_id': request.get('dispositivo_id'),
+            }
+            ids.append(request_id)
+        return ids
+
+    def marcar_requests_procesados(self, request_ids):
+        ahora = datetime.now().isoformat()
+        for request_id in request_ids:
+            if request_id in self.requests:
+                self.requests[request_id].update(processed_at=ahora, archived=1)
+
+    def guardar_responses(self, responses):
+        ids = []
+        for response in responses:
+            fila = {columna: response.get(columna) for columna in COLUMNAS_RESPONSE}
+            fila['id'] = len(self.responses) + 1
+            fila['alerta_ids'] = list(response.get('alerta_ids') or ())
+            self.responses.append(fila)
+            ids.append(fila['id'])
+        self.ultimas.actualizar(lecturas_de_responses(responses))
+        return ids
+
+    def alertas_de_response(self, response_id):
+        if not 1 <= response_id <= len(self.responses):
+            return []
+        return sorted(self.responses[response_id - 1]['alerta_ids'])
+
+    def ultimas_lecturas(self, ubicacion=None):
+        return self.ultimas.lecturas(ubicacion)
+
+    def _responses_en(self, desde_epoch, hasta_epoch):
+        return [r for r in self.responses
+                if r['created_at_epoch'] is not None and r['created_at_epoch'] >= desde_epoch
+                and (hasta_epoch is None or r['created_at_epoch'] < hasta_epoch)]
+
+    def responses_en_rango(self, desde_epoch, hasta_epoch=None, ubicacion=None, limite=None):
+        filas = [r for r in self._responses_en(desde_epoch, hasta_epoch)
+                 if ubicacion is None or r['ubicacion'] == ubicacion]
+        filas.sort(key=lambda r: r['created_at_epoch'], reverse=True)
+        return [{columna: r[columna] for columna in COLUMNAS_RANGO_RESPONSES} for r in filas[:limite]]
+
+    def agregados_por_ubicacion(self, desde_epoch, hasta_epoch=None):
+        grupos = {}
+        for r in self._responses_en(desde_epoch, hasta_epoch):
+            grupos.setdefault(r['ubicacion'] or UBICACION_DESCONOCIDA, []).append(r)
+
+        def promedio(valores):
+            valores = [v for v in valores if v is not None]
+            return sum(valores) / len(valores) if valores else None
+
+        agregados = {}
+        for ubicacion, filas in grupos.items():
+            co2 = [r['co2_ppm'] for r in filas if r['co2_ppm'] is not None]
+            agregados[ubicacion] = {
+                'n': len(filas),
+                'co2_promedio': promedio(co2),
+                'co2_min': min(co2, default=None),
+                'co2_max': max(co2, default=None),
+                'temperatura_promedio': promedio(r['temperature'] for r in filas),
+                'humedad_promedio': promedio(r['humedad'] for r in filas),
+            }
+        return agregados
+
+    def guardar_alertas(self, alertas):
+        ids = []
+        for alerta in alertas:
+            alerta_id = len(self.alertas) + 1
+            ubicacion = alerta.get('ubicacion') or UBICACION_DESCONOCIDA
+            self.alertas[alerta_id] = {
+                'id': alerta_id,
+                'timestamp': alerta['timestamp'],
+                'nivel': alerta['nivel'],
+                'tipo': alerta['tipo'],
+                'ubicacion': ubicacion,
+                'mensaje': alerta['mensaje'],
+                'datos_adicionales': dict(alerta.get('datos_adicionales') or {}),
+                'procesada': alerta.get('procesada', 0),
+                'fecha_procesada': alerta.get('fecha_procesada'),
+                'timestamp_epoch': a_epoch(alerta['timestamp']),
+                'ubicacion_id': self.id_ubicacion(ubicacion),
+            }
+            ids.append(alerta_id)
+        return ids
+
+    def marcar_alertas_procesadas(self, marcas):
+        ahora = datetime.now().isoformat()
+        actualizadas = 0
+        for alerta_id, extra in marcas:
+            alerta = self.alertas.get(alerta_id)
+            if alerta is None:
+                continue
+            alerta['datos_adicionales'].update(extra)
+            alerta['procesada'], alerta['fecha_procesada'] = 1, ahora
+            actualizadas += 1
+        return actualizadas
+
+    def contar_alertas_pendientes(self, nivel, hasta_epoch):
+        return sum(1 for a in self.alertas.values()
+                   if not a['procesada'] and a['nivel'] == nivel and a['timestamp_epoch'] <= hasta_epoch)
+
+    def _copia_alerta(self, alerta):
+        copia = {columna: alerta[columna] for columna in
+                 ('id', 'timestamp', 'nivel', 'tipo', 'ubicacion', 'mensaje', 'procesada', 'fecha_procesada')}
+        copia['datos_adicionales'] = dict(alerta['datos_adicionales'])
+        return copia
+
+    def alertas_pendientes(self, nivel=None, ubicacion=None, limite=20):
+        texto = ubicacion.lower() if ubicacion else None
+        filas = [a for a in self.alertas.values()
+                 if not a['procesada'] and (not nivel or a['nivel'] == nivel)
+                 and (texto is None or texto in a['ubicacion'].lower())]
+        filas.sort(key=lambda a: a['timestamp_epoch'], reverse=True)
+        return [self._copia_alerta(a) for a in filas[:limite]]
+
+    def buscar_alertas(self, texto, limite=20, solo_pendientes=False):
+        # Todas las palabras deben aparecer en el mensaje o la ubicacion; las mas recientes primero
+        palabras = texto.lower().split()
+        if not palabras:
+            return []
+        filas = []
+        for alerta in reversed(list(self.alertas.values())):
+            if solo_pendientes and alerta['procesada']:
+                continue
+            contenido = f"{alerta['mensaje']} {alerta['ubicacion']}".lower()
+            if all(palabra in contenido for palabra in palabras):
+                filas.append({columna: alerta[columna] for columna in
+                              ('id', 'timestamp', 'nivel', 'tipo', 'ubicacion', 'mensaje', 'procesada')})
+                if len(filas) == limite:
+                    break
+        return filas
+
+    def resumen_alertas(self, desde_epoch):
+        grupos = {}
+        for a in self.alertas.values():
+            if a['timestamp_epoch'] >= desde_epoch:
+                grupo = grupos.setdefault((a['nivel'], a['tipo'], a['ubicacion']), [0, 0])
+                grupo[0] += 1
+                grupo[1] += a['procesada']
+        filas = [(nivel, tipo, ubicacion, cantidad, procesadas)
+                 for (nivel, tipo, ubicacion), (cantidad, procesadas) in grupos.items()]
+        filas.sort(key=lambda f: (_orden_nivel(f[0]), -f[3]))
+        return filas
+
+    def alertas_recientes(self, desde_epoch, limite=10):
+        filas = [a for a in self.alertas.values() if a['timestamp_epoch'] >= desde_epoch]
+        filas.sort(key=lambda a: a['timestamp_epoch'], reverse=True)
+        return [{columna: a[columna] for columna in
+                 ('timestamp', 'nivel', 'tipo', 'ubicacion', 'mensaje', 'procesada', 'fecha_procesada')}
+                for a in filas[:limite]]
+
+    def reservar_enfriamiento(self, clave, ahora_epoch, espera):
+        ultima = self.enfriamientos.get(clave)
+        if ultima is not None and ahora_epoch - ultima < espera:
+            return False, ultima
+        self.enfriamientos[clave] = ahora_epoch
+        return True, ahora_epoch
+
+    def purgar_enfriamientos(self, antes_epoch):
+        viejas = [clave for clave, ultima in self.enfriamientos.items() if ultima < antes_epoch]
+        for clave in viejas:
+            del self.enfriamientos[clave]
+        return len(viejas)
+
+
+MOTORES = {
+    'sqlite': AlmacenamientoSQLite,
+    'memoria': AlmacenamientoMemoria,
+}
+
+
+def crear_almacenamiento(motor='sqlite', **opciones):
+    """Instancia el motor por nombre ('sqlite' o 'memoria')"""
+    if motor not in MOTORES:
+        raise ValueError(f"Motor de almacenamiento desconocido: {motor} (disponibles: {', '.join(MOTORES)})")
+    return MOTORES[motor](**opciones)
+
+
+def _carga_sintetica(almacenamiento, n=2000, lote=100):
+    """Carga n lecturas sinteticas por lotes; devuelve segundos por etapa"""
+    ubicaciones = ['Biblioteca Central', 'Laboratorio 1', 'Aula 101', 'Auditorio']
+    tiempos = {'requests': 0.0, 'responses': 0.0, 'alertas': 0.0, 'consultas': 0.0}
+    base_epoch = int(time.time()) - n * 60
+    almacenamiento.preparar()
+    version_id = almacenamiento.id_version_modelo({'co2': 0.7, 'temperatura': 0.2, 'humedad': 0.1},
+                                                  ['co2', 'temperatura', 'humedad'])
+
+    for inicio in range(0, n, lote):
+        indices = range(inicio, min(inicio + lote, n))
+        lecturas = []
+        for i in indices:
+            ubicacion = ubicaciones[i % len(ubicaciones)]
+            momento = datetime.fromtimestamp(base_epoch + i * 60).isoformat()
+            ubicacion_id = almacenamiento.id_ubicacion(ubicacion)
+            dispositivo_id = almacenamiento.id_dispositivo(f'ESP32_{i % 8:02d}', ubicacion_id)
+            lecturas.append((i, ubicacion, momento, ubicacion_id, dispositivo_id))
+
+        t = time.perf_counter()
+        request_ids = almacenamiento.guardar_requests([{
+            'timestamp': momento, 'device_id': f'ESP32_{i % 8:02d}', 'dispositivo_id': dispositivo_id,
+            'json_data': {'sensor_data': {'readings': {'scd30': {'co2': 400 + i % 1200}}}}
+        } for i, ubicacion, momento, ubicacion_id, dispositivo_id in lecturas])
+        tiempos['requests'] += time.perf_counter() - t
+
+        t = time.perf_counter()
+        almacenamiento.guardar_responses([{
+            'request_id': request_id, 'calidad_aire_pred': 'Buena', 'co2_nivel': 'Normal',
+            'temperature': 24.0, 'humedad': 55.0, 'presion': 1010.0,
+            'model_version_id': version_id, 'prediccion_detalle': '{}', 'created_at': momento,
+            'co2_ppm': 400 + i % 1200, 'prediccion_valor': 1.0, 'ubicacion': ubicacion,
+            'device_id': f'ESP32_{i % 8:02d}', 'created_at_epoch': a_epoch(momento),
+            'ubicacion_id': ubicacion_id, 'dispositivo_id': dispositivo_id
+        } for request_id, (i, ubicacion, momento, ubicacion_id, dispositivo_id) in zip(request_ids, lecturas)])
+        almacenamiento.marcar_requests_procesados(request_ids)
+        tiempos['responses'] += time.perf_counter() - t
+
+        t = time.perf_counter()
+        alerta_ids = almacenamiento.guardar_alertas([{
+            'timestamp': momento, 'nivel': 'CRITICA', 'tipo': 'CALIDAD_AIRE', 'ubicacion': ubicacion,
+            'mensaje': f'Nivel de CO2 CRITICO: {400 + i % 1200} ppm', 'datos_adicionales': {'co2': 400 + i % 1200}
+        } for i, ubicacion, momento, _, _ in lecturas if (400 + i % 1200) >= 1200])
+        almacenamiento.marcar_alertas_procesadas([(alerta_id, {'procesado_por': 'benchmark'})
+                                                  for alerta_id in alerta_ids[::2]])
+        tiempos['alertas'] += time.perf_counter() - t
+
+    t = time.perf_counter()
+    for _ in range(20):
+        almacenamiento.responses_en_rango(base_epoch + n * 30, ubicacion='Aula 101', limite=50)
+        almacenamiento.agregados_por_ubicacion(base_epoch)
+        almacenamiento.alertas_pendientes(limite=20)
+        almacenamiento.resumen_alertas(base_epoch)
+        almacenamiento.ultimas_lecturas()
+    tiempos['consultas'] += time.perf_counter() - t
+    return tiempos
+
+
+def main():
+    """Compara el mismo trabajo en el motor en memoria y en SQLite (BD temporal)"""
+    import os
+    import sys
+    import tempfile
+    from conexion_db import cerrar_conexiones
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    directorio = tempfile.mkdtemp(prefix='almacenamiento_')
+    db_temporal = os.path.join(directorio, 'benchmark.db')
+
+    print(f"Carga sintetica de {n} lecturas por lotes de 100")
+    print(f"{'Motor':<10}{'requests':>10}{'responses':>11}{'alertas':>10}{'consultas':>11}{'total':>9}")
+    for motor, opciones in (('memoria', {}), ('sqlite', {'db_path': db_temporal})):
+        tiempos = _carga_sintetica(crear_almacenamiento(motor, **opciones), n)
+        print(f"{motor:<10}" + ''.join(f"{tiempos[etapa]:>{ancho}.3f}" for etapa, ancho in
+                                      (('requests', 10), ('responses', 11), ('alertas', 10), ('consultas', 11)))
+              + f"{sum(tiempos.values()):>9.3f}")
+
+    cerrar_conexiones(db_temporal)
+    for sufijo in ('', '-wal', '-shm'):
+        if os.path.exists(db_temporal + sufijo):
+            os.remove(db_temporal + sufijo)
+    os.rmdir(directorio)
+    print("(segundos; la diferencia entre motores es el costo de SQLite y del disco)")
+
+
+if __name__ == "__main__":
+    main()
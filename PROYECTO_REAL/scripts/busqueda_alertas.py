@@ -0,0 +1,156 @@
+import re
+import sqlite3
+import time
+from esquema_db import existe_tabla
+
+# Indice de texto completo de alertas_sistema. Es una tabla FTS5 sin
+# contenido propio (content=''): guarda solo el indice y se une con
+# alertas_sistema por rowid = id. Los triggers la mantienen sincronizada.
+TABLA_FTS = 'alertas_fts'
+
+# bm25 se calcula solo sobre las coincidencias mas recientes: con un
+# millon de alertas, ordenar por relevancia todas las coincidencias de
+# una palabra comun cuesta cientos de ms y el operador busca lo reciente.
+VENTANA_RANKING = 1000
+
+# 'condicion' sale del JSON de datos_adicionales (CO2_CRITICO, CALIDAD_PELIGROSA, ...)
+_SQL_CONDICION = ("CASE WHEN json_valid({fila}.datos_adicionales) "
+                  "THEN json_extract({fila}.datos_adicionales, '$.condicion') END")
+
+_SQL_INSERTAR = (f"INSERT INTO {TABLA_FTS} (rowid, mensaje, ubicacion, condicion) "
+                 f"VALUES (new.id, new.mensaje, new.ubicacion, {_SQL_CONDICION.format(fila='new')})")
+_SQL_BORRAR = (f"INSERT INTO {TABLA_FTS} ({TABLA_FTS}, rowid, mensaje, ubicacion, condicion) "
+               f"VALUES ('delete', old.id, old.mensaje, old.ubicacion, {_SQL_CONDICION.format(fila='old')})")
+
+TRIGGERS_FTS = {
+    'trg_alertas_fts_insert': f'AFTER INSERT ON alertas_sistema BEGIN {_SQL_INSERTAR}; END',
+    'trg_alertas_fts_delete': f'AFTER DELETE ON alertas_sistema BEGIN {_SQL_BORRAR}; END',
+    'trg_alertas_fts_update': (f'AFTER UPDATE OF mensaje, ubicacion, datos_adicionales ON alertas_sistema '
+                               f'BEGIN {_SQL_BORRAR}; {_SQL_INSERTAR}; END'),
+}
+
+
+def fts5_disponible(conn):
+    """Indica si el SQLite enlazado incluye FTS5"""
+    try:
+        conn.execute('CREATE VIRTUAL TABLE IF NOT EXISTS temp._prueba_fts5 USING fts5(x)')
+        conn.execute('DROP TABLE temp._prueba_fts5')
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def crear_indice_fts(conn):
+    """Crea la tabla FTS5 y sus triggers; si es nueva la llena con las alertas existentes
+
+    Devuelve el numero de alertas indexadas (0 si ya existia o si FTS5 no
+    esta disponible).
+    """
+    if not fts5_disponible(conn):
+        return 0
+    nueva = not existe_tabla(conn, TABLA_FTS)
+    with conn:
+        conn.execute(f'''
+            CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_FTS} USING fts5(
+                mensaje, ubicacion, condicion,
+                content='',
+                prefix='2 3',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+        ''')
+        for nombre, definicion in TRIGGERS_FTS.items():
+            conn.execute(f'CREATE TRIGGER IF NOT EXISTS {nombre} {definicion}')
+        if not nueva:
+            return 0
+        return conn.execute(f'''
+            INSERT INTO {TABLA_FTS} (rowid, mensaje, ubicacion, condicion)
+            SELECT id, mensaje, ubicacion, {_SQL_CONDICION.format(fila='alertas_sistema')}
+            FROM alertas_sistema
+        ''').rowcount
+
+
+def consulta_fts(texto):
+    """Convierte el texto del operador en una consulta FTS5 segura
+
+    Cada palabra se busca como prefijo y todas deben aparecer
+    ('co2 bibl' -> '"co2"* "bibl"*'). Devuelve None si no hay palabras.
+    """
+    palabras = re.findall(r'\w+', texto, re.UNICODE)
+    if not palabras:
+        return None
+    return ' '.join(f'"{palabra}"*' for palabra in palabras)
+
+
+def buscar_alertas(conn, texto, limite=20, solo_pendientes=False):
+    """Alertas que coinciden con el texto, de la mas relevante a la menos (bm25)
+
+    La relevancia se ordena dentro de las VENTANA_RANKING coincidencias
+    mas recientes. Sin FTS5 se usa un LIKE sobre el mensaje (recorre la tabla).
+    Devuelve una lista de dicts.
+    """
+    filtro_pendientes = ' AND a.procesada = 0' if solo_pendientes else ''
+    if existe_tabla(conn, TABLA_FTS):
+        consulta = consulta_fts(texto)
+        if consulta is None:
+            return []
+        desde_id = conn.execute(f'''
+            SELECT MIN(rowid) FROM (
+                SELECT rowid FROM {TABLA_FTS} WHERE {TABLA_FTS} MATCH ?
+                ORDER BY rowid DESC LIMIT {VENTANA_RANKING}
+            )
+        ''', (consulta,)).fetchone()[0]
+        if desde_id is None:
+            return []
+        cursor = conn.execute(f'''
+            SELECT a.id, a.timestamp, a.nivel, a.tipo, a.ubicacion, a.mensaje, a.procesada
+            FROM {TABLA_FTS} f
+            JOIN alertas_sistema a ON a.id = f.rowid
+            WHERE {TABLA_FTS} MATCH ? AND f.rowid >= ?{filtro_pendientes}
+            ORDER BY f.rank
+            LIMIT ?
+        ''', (consulta, desde_id, limite))
+    else:
+        cursor = conn.execute(f'''
+            SELECT a.id, a.timestamp, a.nivel, a.tipo, a.ubicacion, a.mensaje, a.procesada
+            FROM alertas_sistema a
+            WHERE (a.mensaje LIKE ? OR a.ubicacion LIKE ?){filtro_pendientes}
+            ORDER BY a.timestamp_epoch DESC
+            LIMIT ?
+        ''', (f'%{texto}%', f'%{texto}%', limite))
+
+    columnas = [d[0] for d in cursor.description]
+    return [dict(zip(columnas, fila)) for fila in cursor.fetchall()]
+
+
+def mostrar_busqueda(conn, texto, limite=20, solo_pendientes=False):
+    """Imprime los resultados de una busqueda con su tiempo"""
+    inicio = time.perf_counter()
+    resultados = buscar_alertas(conn, texto, limite, solo_pendientes)
+    milisegundos = (time.perf_counter() - inicio) * 1000
+
+    metodo = 'FTS5' if existe_tabla(conn, TABLA_FTS) else 'LIKE'
+    print(f"\nResultados para '{texto}': {len(resultados)} ({milisegundos:.1f} ms, {metodo})")
+    print("-" * 70)
+    for alerta in resultados:
+        estado = 'PROCESADA' if alerta['procesada'] else 'PENDIENTE'
+        print(f"  [{alerta['timestamp'][:19]}] {alerta['nivel']} {alerta['ubicacion']}: "
+              f"{alerta['mensaje'][:60]} ({estado})")
+    return resultados
+
+
+def main():
+    """Busqueda de alertas por texto desde la linea de comandos"""
+    import sys
+    from conexion_db import obtener_conexion
+
+    conn = obtener_conexion(crear=False)
+    if conn is None:
+        print("Base de datos no encontrada")
+        return
+
+    texto = ' '.join(sys.argv[1:]) or input("Texto a buscar: ").strip()
+    mostrar_busqueda(conn, texto)
+
+
+if __name__ == "__main__":
+    main()
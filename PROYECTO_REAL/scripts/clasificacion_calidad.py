@@ -0,0 +1,82 @@
+import bisect
+import numpy as np
+
+# Tabla de cortes de CO2 (ppm). Cada limite es exclusivo: co2 < 450 -> Excelente
+LIMITES_CO2 = (450, 600, 800, 1000, 1200)
+CATEGORIAS_CALIDAD = ("Excelente", "Buena", "Moderada", "Deficiente", "Muy deficiente", "Peligrosa")
+NIVELES_CO2 = ("Muy bueno", "Aceptable", "Ligeramente elevado", "Elevado", "Muy elevado", "Critico")
+RECOMENDACIONES = (
+    "Condiciones optimas. Mantener ventilacion normal.",
+    "Condiciones aceptables. Verificar fuentes de emision.",
+    "Aumentar ventilacion. Considerar reducir actividades intensas.",
+    "Ventilacion forzada recomendada. Monitorear continuamente.",
+    "ALERTA: Condiciones peligrosas. Limitar actividades.",
+    "ALERTA CRITICA: Evitar exposicion. Activar sistemas de emergencia."
+)
+
+# Tabla de cortes para el valor de prediccion del modelo (0-1)
+LIMITES_PREDICCION = (0.2, 0.4, 0.6, 0.8)
+CATEGORIAS_PREDICCION = ("Excelente", "Buena", "Moderada", "Deficiente", "Peligrosa")
+
+# Versiones numpy de las tablas para busquedas vectorizadas
+_LIMITES_CO2_NP = np.array(LIMITES_CO2, dtype=float)
+_LIMITES_PREDICCION_NP = np.array(LIMITES_PREDICCION, dtype=float)
+_CATEGORIAS_CALIDAD_NP = np.array(CATEGORIAS_CALIDAD, dtype=object)
+_NIVELES_CO2_NP = np.array(NIVELES_CO2, dtype=object)
+_RECOMENDACIONES_NP = np.array(RECOMENDACIONES, dtype=object)
+_CATEGORIAS_PREDICCION_NP = np.array(CATEGORIAS_PREDICCION, dtype=object)
+
+# Codigo de categoria por etiqueta (las etiquetas desconocidas caen en Peligrosa)
+CODIGO_POR_CATEGORIA = {categoria: i for i, categoria in enumerate(CATEGORIAS_CALIDAD)}
+CODIGO_PELIGROSA = len(CATEGORIAS_CALIDAD) - 1
+
+
+def codigo_co2(co2):
+    """Devuelve el codigo de categoria para un valor individual de CO2"""
+    if co2 != co2:  # NaN se trata como fuera de rango, igual que searchsorted
+        return CODIGO_PELIGROSA
+    return bisect.bisect_right(LIMITES_CO2, co2)
+
+
+def codigo_prediccion(valor):
+    """Devuelve el codigo de categoria para un valor individual de prediccion"""
+    if valor != valor:
+        return len(CATEGORIAS_PREDICCION) - 1
+    return bisect.bisect_right(LIMITES_PREDICCION, valor)
+
+
+def codigo_categoria(calidad_aire):
+    """Convierte una etiqueta de calidad en su codigo"""
+    return CODIGO_POR_CATEGORIA.get(calidad_aire, CODIGO_PELIGROSA)
+
+
+def codigos_co2(valores_co2):
+    """Clasifica un vector de CO2 (ppm) y devuelve los codigos de categoria"""
+    valores = np.asarray(valores_co2, dtype=float)
+    return np.searchsorted(_LIMITES_CO2_NP, valores, side='right')
+
+
+def codigos_prediccion(valores_prediccion):
+    """Clasifica un vector de predicciones del modelo y devuelve los codigos"""
+    valores = np.asarray(valores_prediccion, dtype=float)
+    return np.searchsorted(_LIMITES_PREDICCION_NP, valores, side='right')
+
+
+def calidades_por_codigo(codigos):
+    """Etiquetas de calidad del aire para un vector de codigos"""
+    return _CATEGORIAS_CALIDAD_NP[np.asarray(codigos)]
+
+
+def niveles_co2_por_codigo(codigos):
+    """Etiquetas de nivel de CO2 para un vector de codigos"""
+    return _NIVELES_CO2_NP[np.asarray(codigos)]
+
+
+def recomendaciones_por_codigo(codigos):
+    """Recomendaciones para un vector de codigos"""
+    return _RECOMENDACIONES_NP[np.asarray(codigos)]
+
+
+def categorias_prediccion_por_codigo(codigos):
+    """Categorias del modelo para un vector de codigos de prediccion"""
+    return _CATEGORIAS_PREDICCION_NP[np.asarray(codigos)]
@@ -0,0 +1,174 @@
+import json
+import time
+import zlib
+import os
+from particiones_db import archivo_principal, aplicar_en_particiones
+
+# zstd es opcional: si no esta instalado se usa zlib
+try:
+    import zstandard
+    ZSTD_DISPONIBLE = True
+except ImportError:
+    ZSTD_DISPONIBLE = False
+
+# Primer byte del BLOB: formato de compresion
+FORMATO_ZLIB = 1
+FORMATO_ZSTD = 2
+
+NIVEL_ZLIB = 6
+NIVEL_ZSTD = 10
+
+if ZSTD_DISPONIBLE:
+    _compresor_zstd = zstandard.ZstdCompressor(level=NIVEL_ZSTD)
+    _descompresor_zstd = zstandard.ZstdDecompressor()
+
+
+def comprimir_payload(json_data):
+    """Serializa el JSON compacto y lo comprime; devuelve bytes con el byte de formato"""
+    texto = json.dumps(json_data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    if ZSTD_DISPONIBLE:
+        return bytes([FORMATO_ZSTD]) + _compresor_zstd.compress(texto)
+    return bytes([FORMATO_ZLIB]) + zlib.compress(texto, NIVEL_ZLIB)
+
+
+def descomprimir_texto(valor):
+    """Devuelve el texto JSON de request_data (comprimido o texto heredado)"""
+    if valor is None:
+        return None
+    if isinstance(valor, str):
+        return valor  # Filas anteriores a la compresion
+    valor = bytes(valor)
+    formato, contenido = valor[0], valor[1:]
+    if formato == FORMATO_ZLIB:
+        return zlib.decompress(contenido).decode('utf-8')
+    if formato == FORMATO_ZSTD:
+        if not ZSTD_DISPONIBLE:
+            raise RuntimeError("Payload comprimido con zstd pero el modulo zstandard no esta instalado")
+        return _descompresor_zstd.decompress(contenido).decode('utf-8')
+    raise ValueError(f"Formato de payload desconocido: {formato}")
+
+
+def descomprimir_payload(valor):
+    """Devuelve el dict JSON de request_data (comprimido o texto heredado)"""
+    texto = descomprimir_texto(valor)
+    return json.loads(texto) if texto is not None else None
+
+
+def _recomprimir_esquema(conn, esquema, tamano_lote, pausa, tabla='sensor_requests', columna_id='id'):
+    """Recomprime los request_data de texto de un esquema (main o una particion adjunta)
+
+    tabla/columna_id: tambien payloads_frios (request_id) del archivo frio.
+    Devuelve (filas, bytes_antes, bytes_despues, bytes_reutilizables).
+    """
+    tamano_pagina = conn.execute(f'PRAGMA {esquema}.page_size').fetchone()[0]
+    libres_antes = conn.execute(f'PRAGMA {esquema}.freelist_count').fetchone()[0]
+
+    filas = bytes_antes = bytes_despues = 0
+    ultimo_id = 0
+    while True:
+        lote = conn.execute(f'''
+            SELECT {columna_id}, request_data FROM {esquema}.{tabla}
+            WHERE {columna_id} > ? AND typeof(request_data) = 'text'
+            ORDER BY {columna_id}
+            LIMIT ?
+        ''', (ultimo_id, tamano_lote)).fetchall()
+        if not lote:
+            break
+
+        actualizaciones = []
+        for request_id, texto in lote:
+            try:
+                comprimido = comprimir_payload(json.loads(texto))
+            except ValueError:
+                continue  # Texto que no es JSON: se deja como esta
+            bytes_antes += len(texto.encode('utf-8'))
+            bytes_despues += len(comprimido)
+            actualizaciones.append((comprimido, request_id))
+
+        with conn:
+            conn.executemany(f'UPDATE {esquema}.{tabla} SET request_data = ? WHERE {columna_id} = ?',
+                             actualizaciones)
+        filas += len(actualizaciones)
+        ultimo_id = lote[-1][0]
+        if pausa:
+            time.sleep(pausa)
+
+    libres_despues = conn.execute(f'PRAGMA {esquema}.freelist_count').fetchone()[0]
+    return filas, bytes_antes, bytes_despues, max(libres_despues - libres_antes, 0) * tamano_pagina
+
+
+def migrar_payloads(conn, tamano_lote=500, pausa=0.0):
+    """Recomprime por lotes los request_data guardados como texto
+
+    Recorre la BD principal, las particiones mensuales y el archivo frio;
+    cada lote es una transaccion corta. Devuelve un dict con:
+      filas                 payloads recomprimidos
+      bytes_antes/despues   tamano de esos payloads (ahorro = antes - despues)
+      bytes_reutilizables   paginas que quedaron libres: SQLite las reutiliza,
+                            pero el archivo no se reduce
+      bytes_devueltos       devueltos al sistema por el vacuum incremental
+                            (0 si auto_vacuum no es INCREMENTAL)
+    """
+    # retencion importa comprimir_payload de este modulo
+    from retencion import (
+        RUTA_ARCHIVO_FRIO, conectar_archivo_frio, vacuum_incremental, vacuum_incremental_total
+    )
+    from conexion_db import ruta_db
+
+    resultados = [_recomprimir_esquema(conn, 'main', tamano_lote, pausa)]
+    archivo = archivo_principal(conn)
+    if archivo:
+        resultados += aplicar_en_particiones(
+            conn, lambda conn, alias: _recomprimir_esquema(conn, alias, tamano_lote, pausa), archivo)
+    devueltos = vacuum_incremental_total(conn, pausa=pausa) if any(r[0] for r in resultados) else 0
+
+    # Payloads que la retencion copio como texto al archivo frio
+    ruta_frio = ruta_db(RUTA_ARCHIVO_FRIO)
+    if archivo and os.path.exists(ruta_frio):
+        conn_frio = conectar_archivo_frio(ruta_frio)
+        frio = _recomprimir_esquema(conn_frio, 'main', tamano_lote, pausa, 'payloads_frios', 'request_id')
+        resultados.append(frio)
+        if frio[0]:
+            devueltos += vacuum_incremental(conn_frio, pausa=pausa)
+
+    filas, antes, despues, reutilizables = (sum(columna) for columna in zip(*resultados))
+    return {
+        'filas': filas,
+        'bytes_antes': antes,
+        'bytes_despues': despues,
+        'bytes_reutilizables': reutilizables,
+        'bytes_devueltos': devueltos,
+    }
+
+
+def mostrar_resultado(resultado):
+    """Imprime el resumen de una recompresion"""
+    print(f"  Filas recomprimidas: {resultado['filas']}")
+    if resultado['filas']:
+        antes, despues = resultado['bytes_antes'], resultado['bytes_despues']
+        print(f"  Tamano payloads: {antes / 1024:.1f} KB -> {despues / 1024:.1f} KB "
+              f"(ahorro {(antes - despues) / 1024:.1f} KB, {100 * (1 - despues / antes):.1f}% menos)")
+        print(f"  Paginas libres reutilizables: {resultado['bytes_reutilizables'] / 1024:.1f} KB")
+        if resultado['bytes_devueltos']:
+            print(f"  Espacio devuelto al sistema: {resultado['bytes_devueltos'] / 1024:.1f} KB")
+        else:
+            print("  [INFO] El archivo no se reduce sin auto_vacuum incremental (ver retencion)")
+
+
+def main():
+    """Recomprime los payloads existentes de la BD principal, las particiones y el archivo frio"""
+    from conexion_db import obtener_conexion
+
+    conn = obtener_conexion(crear=False)
+    if conn is None:
+        print("Base de datos no encontrada")
+        return
+
+    formato = 'zstd' if ZSTD_DISPONIBLE else 'zlib'
+    print(f"COMPRIMIENDO PAYLOADS EXISTENTES ({formato})")
+    print("-" * 60)
+    mostrar_resultado(migrar_payloads(conn))
+
+
+if __name__ == "__main__":
+    main()
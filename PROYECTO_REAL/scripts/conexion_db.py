@@ -0,0 +1,97 @@
+import os
+import sqlite3
+import threading
+
+PROYECTO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUTA_DB_DEFECTO = 'data/database/calidad_aire.db'
+
+# Pragmas aplicados a cada conexion nueva
+PRAGMAS_CONEXION = (
+    ('auto_vacuum', 'INCREMENTAL'), # Solo surte efecto en BD nuevas (o tras un VACUUM)
+    ('journal_mode', 'WAL'),        # Lectores no bloquean al escritor
+    ('synchronous', 'NORMAL'),      # Seguro con WAL, mucho menos fsync
+    ('cache_size', -20000),         # ~20 MB de cache de paginas
+    ('mmap_size', 268435456),       # 256 MB mapeados en memoria
+    ('busy_timeout', 5000),         # Esperar hasta 5 s si la BD esta ocupada
+    ('temp_store', 'MEMORY'),
+)
+
+# Sentencias preparadas que se mantienen en cache por conexion
+TAMANO_CACHE_SENTENCIAS = 256
+
+_local = threading.local()
+_conexiones_abiertas = []
+_lock = threading.Lock()
+
+
+def ruta_db(db_path=None):
+    """Devuelve la ruta absoluta de la base de datos"""
+    db_path = db_path or RUTA_DB_DEFECTO
+    if not os.path.isabs(db_path):
+        db_path = os.path.join(PROYECTO_ROOT, db_path)
+    return os.path.normpath(db_path)
+
+
+def existe_db(db_path=None):
+    """Indica si el archivo de base de datos existe"""
+    return os.path.exists(ruta_db(db_path))
+
+
+def _abrir_conexion(ruta):
+    """Abre una conexion nueva y aplica los pragmas de rendimiento"""
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    conn = sqlite3.connect(
+        ruta,
+        cached_statements=TAMANO_CACHE_SENTENCIAS,
+        check_same_thread=False  # Permite cerrarla desde cerrar_conexiones()
+    )
+    for pragma, valor in PRAGMAS_CONEXION:
+        conn.execute(f'PRAGMA {pragma} = {valor}')
+    return conn
+
+
+def obtener_conexion(db_path=None, crear=True):
+    """Devuelve la conexion persistente de este hilo para la base de datos
+
+    La conexion se reutiliza entre llamadas; no debe cerrarse al terminar
+    cada operacion. Usar 'with conn:' para delimitar transacciones.
+    Si crear=False y el archivo no existe devuelve None.
+    """
+    ruta = ruta_db(db_path)
+    conexiones = getattr(_local, 'conexiones', None)
+    if conexiones is None:
+        conexiones = _local.conexiones = {}
+
+    conn = conexiones.get(ruta)
+    if conn is not None:
+        return conn
+
+    if not crear and not os.path.exists(ruta):
+        return None
+
+    conn = _abrir_conexion(ruta)
+    conexiones[ruta] = conn
+    with _lock:
+        _conexiones_abiertas.append((ruta, conn, conexiones))
+    return conn
+
+
+def cerrar_conexiones(db_path=None):
+    """Cierra las conexiones abiertas (de todos los hilos)
+
+    Necesario antes de borrar, reemplazar o mover el archivo de la BD.
+    Si db_path es None cierra todas.
+    """
+    ruta_objetivo = ruta_db(db_path) if db_path else None
+    with _lock:
+        pendientes = []
+        for ruta, conn, conexiones in _conexiones_abiertas:
+            if ruta_objetivo is None or ruta == ruta_objetivo:
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+                conexiones.pop(ruta, None)
+            else:
+                pendientes.append((ruta, conn, conexiones))
+        _conexiones_abiertas[:] = pendientes
@@ -1,19 +1,41 @@
 import os
-import sqlite3
 import json
 import pandas as pd
+from conexion_db import obtener_conexion, ruta_db
+from migraciones import migrar
+from particiones_db import RouterParticiones
+from tiempo_utc import a_epoch
+from compresion_payload import descomprimir_payload
+from retencion import leer_payload_frio
+from replica_lectura import ReplicaLectura
+from contadores_db import estado_contadores
+from ultimas_lecturas import leer_ultimas, mostrar_lecturas_actuales
+from resumenes_db import estadisticas_generales
 
 class ConsultaBaseDatos:
     def __init__(self):
         self.proyecto_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        self.db_path = os.path.join(self.proyecto_root, 'data/database/calidad_aire.db')
+        self.db_path = ruta_db()
+        self._esquema_verificado = False
+        self._router = None
+        self.replica = ReplicaLectura(self.db_path)  # Consultas y exportaciones sin competir con la ingesta
         
     def conectar(self):
-        """Conecta a la base de datos"""
+        """Conexion de solo lectura a la replica de la base de datos"""
         if not os.path.exists(self.db_path):
             print(f"Error: Base de datos no encontrada en {self.db_path}")
             return None
-        return sqlite3.connect(self.db_path)
+        if not self._esquema_verificado:
+            if migrar(obtener_conexion(self.db_path, crear=False)):
+                self.replica.refrescar()
+            self._esquema_verificado = True
+        return self.replica.conexion()
+    
+    def router(self, conn):
+        """Router de lecturas sobre la BD principal y las particiones mensuales"""
+        if self._router is None or self._router.conn is not conn:
+            self._router = RouterParticiones(conn, self.db_path)
+        return self._router
     
     def mostrar_tablas(self):
         """Muestra todas las tablas en la base de datos"""
@@ -28,32 +50,32 @@ class ConsultaBaseDatos:
             print()
     
     def contar_registros(self):
-        """Cuenta los registros en cada tabla"""
+        """Cuenta los registros en cada tabla (contadores de stats_counters, sin COUNT(*))"""
         with self.conectar() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
             tablas = cursor.fetchall()
+            filas = estado_contadores(conn)['filas']
             
             print("CONTEO DE REGISTROS:")
             print("-" * 40)
             for tabla in tablas:
-                cursor.execute(f"SELECT COUNT(*) FROM {tabla[0]}")
-                count = cursor.fetchone()[0]
-                print(f"{tabla[0]}: {count} registros")
+                if tabla[0] in filas:
+                    print(f"{tabla[0]}: {filas[tabla[0]]} registros")
+                else:
+                    print(f"{tabla[0]}: sin contador")
             print()
     
     def mostrar_requests_recientes(self, limite=3):
         """Muestra los requests más recientes"""
         with self.conectar() as conn:
-            cursor = conn.cursor()
             query = '''
                 SELECT id, timestamp, device_id, processed_at, archived 
-                FROM sensor_requests 
+                FROM {esquema}.sensor_requests 
                 ORDER BY processed_at DESC 
                 LIMIT ?
             '''
-            cursor.execute(query, (limite,))
-            resultados = cursor.fetchall()
+            _, resultados = self.router(conn).consultar_recientes(query, limite=limite)
             
             print("ULTIMOS REQUESTS (JSON ORIGINALES):")
             print("-" * 60)
@@ -66,41 +88,36 @@ class ConsultaBaseDatos:
                 print()
     
     def mostrar_responses_recientes(self, limite=3):
-        """Muestra los responses más recientes"""
+        """Muestra los responses más recientes (la ultima prediccion de cada dispositivo, de latest_readings)"""
         with self.conectar() as conn:
-            cursor = conn.cursor()
-            query = '''
-                SELECT r.id, s.calidad_aire_pred, s.co2_nivel, s.temperature, 
-                       s.humedad, s.created_at
-                FROM sensor_responses s
-                INNER JOIN sensor_requests r ON s.request_id = r.id
-                ORDER BY s.created_at DESC 
-                LIMIT ?
-            '''
-            cursor.execute(query, (limite,))
-            resultados = cursor.fetchall()
+            resultados = leer_ultimas(conn)[:limite]
             
             print("ULTIMAS PREDICCIONES (RESPONSES):")
             print("-" * 60)
-            for row in resultados:
-                print(f"Request ID: {row[0]}")
-                print(f"  Calidad del aire: {row[1]}")
-                print(f"  Nivel CO2: {row[2]}")
-                print(f"  Temperatura: {row[3]}°C")
-                print(f"  Humedad: {row[4]}%")
-                print(f"  Fecha analisis: {row[5]}")
+            for lectura in resultados:
+                print(f"Request ID: {lectura['request_id']}")
+                print(f"  Ubicacion: {lectura['ubicacion']} [{lectura['device_id']}]")
+                print(f"  Calidad del aire: {lectura['calidad_aire_pred']}")
+                print(f"  Nivel CO2: {lectura['co2_nivel']}")
+                print(f"  Temperatura: {lectura['temperature']}°C")
+                print(f"  Humedad: {lectura['humedad']}%")
+                print(f"  Fecha analisis: {lectura['created_at']}")
                 print()
     
+    def mostrar_lecturas_actuales(self):
+        """Muestra la lectura actual (CO2, calidad, temperatura) de cada ubicacion"""
+        with self.conectar() as conn:
+            mostrar_lecturas_actuales(leer_ultimas(conn))
+    
     def mostrar_detalle_request(self, request_id):
         """Muestra el detalle completo de un request"""
         with self.conectar() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
+            # El request puede estar en la BD principal o en una particion mensual
+            resultado = self.router(conn).buscar_request('''
                 SELECT timestamp, device_id, request_data, processed_at
-                FROM sensor_requests 
+                FROM {esquema}.sensor_requests 
                 WHERE id = ?
-            ''', (request_id,))
-            resultado = cursor.fetchone()
+            ''', request_id)
             
             if resultado:
                 print(f"DETALLE REQUEST ID: {request_id}")
@@ -109,53 +126,110 @@ class ConsultaBaseDatos:
                 print(f"Dispositivo: {resultado[1]}")
                 print(f"Procesado: {resultado[3]}")
                 print("\nDATOS DEL SENSOR (JSON):")
+                request_data = resultado[2]
+                if request_data is None:
+                    # Payload movido al archivo frio por la politica de retencion
+                    request_data = leer_payload_frio(request_id)
                 try:
-                    datos_json = json.loads(resultado[2])
+                    # request_data puede estar comprimido (BLOB) o ser texto heredado
+                    datos_json = descomprimir_payload(request_data)
                     print(json.dumps(datos_json, indent=2, ensure_ascii=False))
                 except:
-                    print(resultado[2])
+                    print(request_data)
             else:
                 print(f"No se encontro request con ID: {request_id}")
     
+    def mostrar_registros_por_ubicacion(self, ubicacion, limite=10):
+        """Muestra las mediciones mas recientes de una ubicacion (usa idx_responses_ubicacion_id)"""
+        with self.conectar() as conn:
+            fila = conn.execute('SELECT id FROM ubicaciones WHERE nombre = ?', (ubicacion,)).fetchone()
+            resultados = []
+            if fila is not None:
+                _, resultados = self.router(conn).consultar_recientes('''
+                    SELECT created_at, device_id, calidad_aire_pred, co2_ppm, temperature, humedad
+                    FROM {esquema}.sensor_responses
+                    WHERE ubicacion_id = ?
+                    ORDER BY created_at DESC
+                    LIMIT ?
+                ''', (fila[0],), limite=limite)
+            
+            print(f"ULTIMAS MEDICIONES EN: {ubicacion}")
+            print("-" * 60)
+            if not resultados:
+                print("Sin mediciones para esta ubicacion")
+            for row in resultados:
+                print(f"{row[0]}  [{row[1]}]  {row[2]}  CO2: {row[3]} ppm  "
+                      f"Temp: {row[4]}°C  Hum: {row[5]}%")
+            print()
+    
+    def mostrar_registros_rango_co2(self, co2_min, co2_max, limite=20):
+        """Muestra mediciones con CO2 dentro de un rango (usa idx_responses_co2)"""
+        with self.conectar() as conn:
+            # Sin rango de tiempo: se consulta cada fuente y se combinan los mejores
+            _, resultados = self.router(conn).consultar('''
+                SELECT created_at, ubicacion, calidad_aire_pred, co2_ppm
+                FROM {esquema}.sensor_responses
+                WHERE co2_ppm BETWEEN ? AND ?
+                ORDER BY co2_ppm DESC
+                LIMIT ?
+            ''', (co2_min, co2_max, limite))
+            resultados = sorted(resultados, key=lambda row: row[3], reverse=True)[:limite]
+            
+            print(f"MEDICIONES CON CO2 ENTRE {co2_min} Y {co2_max} ppm:")
+            print("-" * 60)
+            if not resultados:
+                print("Sin mediciones en el rango indicado")
+            for row in resultados:
+                print(f"{row[0]}  {row[1]}  {row[2]}  CO2: {row[3]} ppm")
+            print()
+    
     def mostrar_resumen_calidad(self):
-        """Muestra un resumen de la calidad del aire"""
+        """Muestra un resumen de la calidad del aire (desde resumen_diario, incluye meses archivados)"""
         with self.conectar() as conn:
-            cursor = conn.cursor()
-            query = '''
-                SELECT calidad_aire_pred, COUNT(*) as cantidad,
-                       AVG(temperature) as temp_promedio,
-                       AVG(humedad) as humedad_promedio
-                FROM sensor_responses
-                GROUP BY calidad_aire_pred
-                ORDER BY 
-                    CASE calidad_aire_pred
-                        WHEN 'Excelente' THEN 1
-                        WHEN 'Buena' THEN 2
-                        WHEN 'Moderada' THEN 3
-                        WHEN 'Deficiente' THEN 4
-                        WHEN 'Peligrosa' THEN 5
-                        ELSE 6
-                    END
-            '''
-            cursor.execute(query)
-            resultados = cursor.fetchall()
+            total, promedios, categorias = estadisticas_generales(conn)
             
             print("RESUMEN CALIDAD DEL AIRE:")
             print("-" * 60)
-            print(f"{'Categoría':<15} {'Cantidad':<10} {'Temp (°C)':<12} {'Humedad (%)':<12}")
+            print(f"{'Categoría':<15} {'Cantidad':<10} {'Porcentaje':<12}")
             print("-" * 60)
             
-            total = 0
-            for row in resultados:
-                print(f"{row[0]:<15} {row[1]:<10} {row[2]:<12.2f} {row[3]:<12.2f}")
-                total += row[1]
+            # En el orden de la tabla de calidad (Excelente ... Peligrosa, Desconocida)
+            for categoria, cantidad in categorias.items():
+                if cantidad:
+                    print(f"{categoria:<15} {cantidad:<10} {cantidad / total * 100:<12.1f}")
             
             print("-" * 60)
             print(f"{'TOTAL':<15} {total:<10}")
+            if total:
+                print(f"Temperatura promedio: {promedios['temperatura']:.2f} °C   "
+                      f"Humedad promedio: {promedios['humedad']:.2f} %")
             print()
     
-    def exportar_a_csv(self, archivo_salida='data/processed/resumen_calidad.csv'):
-        """Exporta los datos a CSV para analisis externo"""
+    def mostrar_registros_rango_fechas(self, fecha_desde, fecha_hasta, limite=50):
+        """Muestra mediciones entre dos fechas (solo lee las particiones que solapan)"""
+        desde, hasta = a_epoch(fecha_desde), a_epoch(fecha_hasta)
+        if desde is None or hasta is None:
+            print("Error: Use fechas en formato AAAA-MM-DD")
+            return
+        
+        with self.conectar() as conn:
+            _, resultados = self.router(conn).consultar('''
+                SELECT created_at, ubicacion, calidad_aire_pred, co2_ppm
+                FROM {esquema}.sensor_responses
+                WHERE created_at_epoch >= ? AND created_at_epoch < ?
+                ORDER BY created_at_epoch
+            ''', (desde, hasta), desde=desde, hasta=hasta)
+            
+            print(f"MEDICIONES ENTRE {fecha_desde} Y {fecha_hasta}: {len(resultados)}")
+            print("-" * 60)
+            for row in sorted(resultados)[:limite]:
+                print(f"{row[0]}  {row[1]}  {row[2]}  CO2: {row[3]} ppm")
+            if len(resultados) > limite:
+                print(f"... ({len(resultados) - limite} mas)")
+            print()
+    
+    def exportar_a_csv(self, archivo_salida='data/processed/resumen_calidad.csv', desde=None, hasta=None):
+        """Exporta los datos a CSV para analisis externo (desde/hasta: epoch opcional)"""
         with self.conectar() as conn:
             query = '''
                 SELECT 
@@ -167,11 +241,19 @@ class ConsultaBaseDatos:
                     s.humedad,
                     s.presion,
                     s.created_at
-                FROM sensor_responses s
-                INNER JOIN sensor_requests r ON s.request_id = r.id
-                ORDER BY r.timestamp
+                FROM {esquema}.sensor_responses s
+                INNER JOIN {esquema}.sensor_requests r ON s.request_id = r.id
+                WHERE 1 = 1
             '''
-            df = pd.read_sql_query(query, conn)
+            parametros = []
+            if desde is not None:
+                query += ' AND s.created_at_epoch >= ?'
+                parametros.append(desde)
+            if hasta is not None:
+                query += ' AND s.created_at_epoch < ?'
+                parametros.append(hasta)
+            columnas, filas = self.router(conn).consultar(query, parametros, desde=desde, hasta=hasta)
+            df = pd.DataFrame(filas, columns=columnas).sort_values('timestamp')
             
             archivo_completo = os.path.join(self.proyecto_root, archivo_salida)
             os.makedirs(os.path.dirname(archivo_completo), exist_ok=True)
@@ -194,10 +276,14 @@ class ConsultaBaseDatos:
             print("5. Resumen calidad del aire")
             print("6. Ver detalle de un request")
             print("7. Exportar datos a CSV")
-            print("8. Salir")
+            print("8. Ver mediciones por ubicacion")
+            print("9. Ver mediciones por rango de CO2")
+            print("10. Ver mediciones por rango de fechas")
+            print("11. Ver lecturas actuales por ubicacion")
+            print("12. Salir")
             print("-"*60)
             
-            opcion = input("Seleccione una opcion (1-8): ").strip()
+            opcion = input("Seleccione una opcion (1-12): ").strip()
             
             if opcion == "1":
                 self.mostrar_tablas()
@@ -218,6 +304,22 @@ class ConsultaBaseDatos:
             elif opcion == "7":
                 self.exportar_a_csv()
             elif opcion == "8":
+                ubicacion = input("Ingrese la ubicacion: ").strip()
+                self.mostrar_registros_por_ubicacion(ubicacion)
+            elif opcion == "9":
+                try:
+                    co2_min = float(input("CO2 minimo (ppm): "))
+                    co2_max = float(input("CO2 maximo (ppm): "))
+                    self.mostrar_registros_rango_co2(co2_min, co2_max)
+                except ValueError:
+                    print("Error: Ingrese valores numericos")
+            elif opcion == "10":
+                fecha_desde = input("Fecha desde (AAAA-MM-DD): ").strip()
+                fecha_hasta = input("Fecha hasta (AAAA-MM-DD): ").strip()
+                self.mostrar_registros_rango_fechas(fecha_desde, fecha_hasta)
+            elif opcion == "11":
+                self.mostrar_lecturas_actuales()
+            elif opcion == "12":
                 print("Saliendo del consultor...")
                 break
             else:
@@ -0,0 +1,207 @@
+from esquema_db import existe_tabla
+
+# Contadores de filas mantenidos por triggers: las pantallas de estado
+# leen una tabla de pocas filas en vez de hacer COUNT(*) sobre tablas
+# completas. Claves:
+#   filas:<tabla>            filas de cada tabla principal
+#   requests:sin_procesar    sensor_requests con processed_at NULL
+#   alertas:pendientes       alertas_sistema con procesada = 0
+#   alertas:procesadas       alertas_sistema con procesada = 1
+#   archivos:procesados      archivos_procesados con procesado = 1
+#   calidad:<categoria>      sensor_responses por calidad_aire_pred
+#
+# Los contadores de sensor_requests y sensor_responses son totales de la BD
+# principal mas las particiones mensuales: archivar un mes (que borra de la
+# BD principal) no los cambia y descartar una particion los descuenta.
+TABLA_CONTADORES = 'stats_counters'
+PREFIJO_CALIDAD = 'calidad:'
+
+TABLAS_CONTADAS = ('sensor_requests', 'sensor_responses', 'alertas_sistema', 'archivos_procesados')
+TABLAS_CON_PARTICIONES = ('sensor_requests', 'sensor_responses')
+
+# (clave, tabla, condicion, columna que la cambia) de los contadores condicionales
+CONTADORES_CONDICIONALES = (
+    ('requests:sin_procesar', 'sensor_requests', '{fila}.processed_at IS NULL', 'processed_at'),
+    ('alertas:pendientes', 'alertas_sistema', '{fila}.procesada = 0', 'procesada'),
+    ('alertas:procesadas', 'alertas_sistema', '{fila}.procesada = 1', 'procesada'),
+    ('archivos:procesados', 'archivos_procesados', '{fila}.procesado = 1', 'procesado'),
+)
+
+
+def _sumar(clave_sql, cantidad, condicion='1'):
+    """UPSERT que suma cantidad (+1/-1) al contador si se cumple la condicion (SQL)"""
+    # INSERT ... SELECT ... WHERE: el WHERE evita que el ON CONFLICT sea ambiguo
+    return (f"INSERT INTO {TABLA_CONTADORES} (clave, valor) SELECT {clave_sql}, {cantidad} WHERE {condicion} "
+            f"ON CONFLICT (clave) DO UPDATE SET valor = valor + excluded.valor")
+
+
+def _definir_triggers():
+    """nombre -> definicion de los triggers de contadores"""
+    sentencias = {}  # (tabla, evento) -> lista de sentencias
+    for tabla in TABLAS_CONTADAS:
+        sentencias.setdefault((tabla, 'INSERT'), []).append(_sumar(f"'filas:{tabla}'", 1))
+        sentencias.setdefault((tabla, 'DELETE'), []).append(_sumar(f"'filas:{tabla}'", -1))
+
+    for clave, tabla, condicion, columna in CONTADORES_CONDICIONALES:
+        nueva, vieja = condicion.format(fila='new'), condicion.format(fila='old')
+        sentencias[(tabla, 'INSERT')].append(_sumar(f"'{clave}'", 1, nueva))
+        sentencias[(tabla, 'DELETE')].append(_sumar(f"'{clave}'", -1, vieja))
+        actualizacion = sentencias.setdefault((tabla, f'UPDATE OF {columna}'), [])
+        actualizacion.append(_sumar(f"'{clave}'", 1, f'({nueva}) AND NOT ({vieja})'))
+        actualizacion.append(_sumar(f"'{clave}'", -1, f'({vieja}) AND NOT ({nueva})'))
+
+    calidad = f"'{PREFIJO_CALIDAD}' || COALESCE({{fila}}.calidad_aire_pred, '')"
+    sentencias[('sensor_responses', 'INSERT')].append(_sumar(calidad.format(fila='new'), 1))
+    sentencias[('sensor_responses', 'DELETE')].append(_sumar(calidad.format(fila='old'), -1))
+    sentencias[('sensor_responses', 'UPDATE OF calidad_aire_pred')] = [
+        _sumar(calidad.format(fila='old'), -1), _sumar(calidad.format(fila='new'), 1)
+    ]
+
+    triggers = {}
+    for (tabla, evento), cuerpo in sentencias.items():
+        sufijo = evento.split()[-1] if evento.startswith('UPDATE') else evento.lower()
+        nombre = f"trg_contadores_{tabla}_{sufijo}"
+        triggers[nombre] = f"AFTER {evento} ON {tabla} BEGIN {'; '.join(cuerpo)}; END"
+    return triggers
+
+
+TRIGGERS_CONTADORES = _definir_triggers()
+
+
+def conteos_tablas(conn, tablas=TABLAS_CONTADAS, esquema='main'):
+    """Conteos con COUNT(*) de las tablas dadas en un esquema (recorre las tablas)"""
+    conteos = {}
+    for tabla in tablas:
+        conteos[f'filas:{tabla}'] = conn.execute(f'SELECT COUNT(*) FROM {esquema}.{tabla}').fetchone()[0]
+    for clave, tabla, condicion, _ in CONTADORES_CONDICIONALES:
+        if tabla in tablas:
+            conteos[clave] = conn.execute(
+                f'SELECT COUNT(*) FROM {esquema}.{tabla} WHERE {condicion.format(fila=tabla)}').fetchone()[0]
+    if 'sensor_responses' in tablas:
+        for categoria, cantidad in conn.execute(
+                f"SELECT COALESCE(calidad_aire_pred, ''), COUNT(*) FROM {esquema}.sensor_responses GROUP BY 1"):
+            conteos[PREFIJO_CALIDAD + categoria] = cantidad
+    return conteos
+
+
+def _conteos_reales(conn):
+    """Conteos de la BD principal mas las particiones (solo para crear o verificar)
+
+    Adjunta las particiones: no se puede llamar dentro de una transaccion.
+    """
+    # Import local: particiones_db usa este modulo al archivar y descartar meses
+    from particiones_db import archivo_principal, aplicar_en_particiones
+
+    conteos = conteos_tablas(conn)
+    archivo = archivo_principal(conn)
+    if archivo:
+        for conteos_particion in aplicar_en_particiones(
+                conn, lambda conn, alias: conteos_tablas(conn, TABLAS_CON_PARTICIONES, alias), archivo):
+            for clave, cantidad in conteos_particion.items():
+                conteos[clave] = conteos.get(clave, 0) + cantidad
+    return conteos
+
+
+def fijar_contadores(conn, contadores):
+    """Reemplaza todos los contadores por los dados; no confirma"""
+    conn.execute(f'DELETE FROM {TABLA_CONTADORES}')
+    conn.executemany(f'INSERT INTO {TABLA_CONTADORES} (clave, valor) VALUES (?, ?)', contadores.items())
+
+
+def restar_contadores(conn, conteos):
+    """Descuenta conteos (p. ej. de una particion descartada); no confirma"""
+    conn.executemany(f'UPDATE {TABLA_CONTADORES} SET valor = valor - ? WHERE clave = ?',
+                     [(cantidad, clave) for clave, cantidad in conteos.items()])
+
+
+def reconstruir_contadores(conn):
+    """Recalcula todos los contadores con COUNT(*) en una sola transaccion"""
+    conteos = _conteos_reales(conn)
+    with conn:
+        fijar_contadores(conn, conteos)
+
+
+def crear_contadores(conn):
+    """Tabla stats_counters y sus triggers; la llena si es nueva"""
+    nueva = not existe_tabla(conn, TABLA_CONTADORES)
+    with conn:
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {TABLA_CONTADORES} (
+                clave TEXT PRIMARY KEY,
+                valor INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID
+        ''')
+        for nombre, definicion in TRIGGERS_CONTADORES.items():
+            conn.execute(f'CREATE TRIGGER IF NOT EXISTS {nombre} {definicion}')
+    if nueva:
+        reconstruir_contadores(conn)
+
+
+def leer_contadores(conn):
+    """Dict clave -> valor de todos los contadores"""
+    return dict(conn.execute(f'SELECT clave, valor FROM {TABLA_CONTADORES}').fetchall())
+
+
+def estado_contadores(conn):
+    """Contadores agrupados para las pantallas de estado"""
+    contadores = leer_contadores(conn)
+    filas = {tabla: contadores.get(f'filas:{tabla}', 0) for tabla in TABLAS_CONTADAS}
+    calidad = {clave[len(PREFIJO_CALIDAD):]: valor for clave, valor in contadores.items()
+               if clave.startswith(PREFIJO_CALIDAD) and valor > 0}
+    sin_procesar = contadores.get('requests:sin_procesar', 0)
+    return {
+        'filas': filas,
+        'requests_sin_procesar': sin_procesar,
+        'requests_procesados': filas['sensor_requests'] - sin_procesar,
+        'alertas_pendientes': contadores.get('alertas:pendientes', 0),
+        'alertas_procesadas': contadores.get('alertas:procesadas', 0),
+        'archivos_procesados': contadores.get('archivos:procesados', 0),
+        'archivos_sin_procesar': filas['archivos_procesados'] - contadores.get('archivos:procesados', 0),
+        'calidad': dict(sorted(calidad.items(), key=lambda par: par[1], reverse=True)),
+    }
+
+
+def verificar_contadores(conn):
+    """Compara los contadores con COUNT(*) (incluidas las particiones)
+
+    Devuelve {clave: (contador, real)} de los que difieren.
+    """
+    contadores = leer_contadores(conn)
+    reales = _conteos_reales(conn)
+    diferencias = {}
+    for clave in set(contadores) | set(reales):
+        contador, real = contadores.get(clave, 0), reales.get(clave, 0)
+        if contador != real:
+            diferencias[clave] = (contador, real)
+    return diferencias
+
+
+def main():
+    """Muestra los contadores y los verifica contra COUNT(*)"""
+    import sys
+    from conexion_db import obtener_conexion
+    from migraciones import migrar
+
+    conn = obtener_conexion(crear=False)
+    if conn is None:
+        print("Base de datos no encontrada")
+        return
+    migrar(conn)
+
+    for clave, valor in sorted(leer_contadores(conn).items()):
+        print(f"  {clave:<40} {valor:>10}")
+
+    diferencias = verificar_contadores(conn)
+    if not diferencias:
+        print("\nContadores verificados: coinciden con COUNT(*)")
+        return
+    print("\nContadores desalineados (contador / real):")
+    for clave, (contador, real) in sorted(diferencias.items()):
+        print(f"  {clave}: {contador} / {real}")
+    if '--reparar' in sys.argv:
+        reconstruir_contadores(conn)
+        print("Contadores reconstruidos")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,24 @@
 import os
-import sqlite3
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 from datetime import datetime, timedelta
-import json
 import matplotlib
+from conexion_db import obtener_conexion, ruta_db
+from migraciones import migrar, version_esquema
+from resumenes_db import estadisticas_generales
+from particiones_db import RouterParticiones
+from replica_lectura import ReplicaLectura
+from contadores_db import estado_contadores
 
 class DashboardCalidadAire:
     def __init__(self):
         self.proyecto_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        self.db_path = os.path.join(self.proyecto_root, 'data/database/calidad_aire.db')
+        self.db_path = ruta_db()
         self.fig = None
+        self._esquema_verificado = False
+        self._router = None
+        self.replica = ReplicaLectura(self.db_path)  # Lecturas sin competir con la ingesta
         self.colores_calidad = {
             'Excelente': '#00FF00',    # Verde
             'Buena': '#90EE90',        # Verde claro
@@ -22,11 +29,22 @@ class DashboardCalidadAire:
         }
         
     def conectar_db(self):
-        """Conecta a la base de datos"""
+        """Conexion de solo lectura a la replica de la base de datos"""
         if not os.path.exists(self.db_path):
             print(f"Error: Base de datos no encontrada en {self.db_path}")
             return None
-        return sqlite3.connect(self.db_path)
+        if not self._esquema_verificado:
+            # Migraciones pendientes (columnas derivadas, resumenes, indices) en la BD principal, una sola vez
+            if migrar(obtener_conexion(self.db_path, crear=False)):
+                self.replica.refrescar()
+            self._esquema_verificado = True
+        return self.replica.conexion()
+    
+    def router(self, conn):
+        """Router de lecturas sobre la BD principal y las particiones mensuales"""
+        if self._router is None or self._router.conn is not conn:
+            self._router = RouterParticiones(conn, self.db_path)
+        return self._router
     
     def verificar_estructura_db(self):
         """Verifica la estructura de la base de datos para diagnóstico"""
@@ -54,8 +72,7 @@ class DashboardCalidadAire:
                 print(f"  {col[1]} - {col[2]}")
             
             # Ver conteo de datos
-            cursor.execute("SELECT COUNT(*) FROM sensor_responses")
-            total_muestras = cursor.fetchone()[0]
+            total_muestras = estado_contadores(conn)['filas']['sensor_responses']
             print(f"\nTotal muestras en sensor_responses: {total_muestras}")
             
             # Ver rango de fechas
@@ -65,36 +82,15 @@ class DashboardCalidadAire:
             print(f"  Inicio: {min_max[0]}")
             print(f"  Fin: {min_max[1]}")
             
-            # Ver 5 ejemplos recientes
-            print(f"\n5 mediciones más recientes:")
+            # Ver 5 ejemplos recientes (ultima lectura de cada ubicacion y dispositivo)
+            print(f"\n5 mediciones más recientes (una por ubicación y dispositivo):")
             
-            # Primero verificar qué columnas existen
-            cursor.execute("PRAGMA table_info(sensor_responses)")
-            columnas_info = cursor.fetchall()
-            columnas_nombres = [col[1] for col in columnas_info]
-            
-            # Construir consulta con columnas correctas
-            if 'temperature' in columnas_nombres:
-                query_ejemplos = '''
-                    SELECT created_at, calidad_aire_pred, co2_nivel, temperature, humedad 
-                    FROM sensor_responses 
-                    ORDER BY created_at DESC 
-                    LIMIT 5
-                '''
-            elif 'temperatura' in columnas_nombres:
-                query_ejemplos = '''
-                    SELECT created_at, calidad_aire_pred, co2_nivel, temperatura, humedad 
-                    FROM sensor_responses 
-                    ORDER BY created_at DESC 
-                    LIMIT 5
-                '''
-            else:
-                query_ejemplos = '''
-                    SELECT created_at, calidad_aire_pred, co2_nivel 
-                    FROM sensor_responses 
-                    ORDER BY created_at DESC 
-                    LIMIT 5
-                '''
+            query_ejemplos = '''
+                SELECT created_at, calidad_aire_pred, co2_nivel, temperature, humedad 
+                FROM latest_readings 
+                ORDER BY created_at_epoch DESC 
+                LIMIT 5
+            '''
             
             cursor.execute(query_ejemplos)
             for i, row in enumerate(cursor.fetchall()):
@@ -122,35 +118,26 @@ class DashboardCalidadAire:
                 
                 print(f"[DEBUG] Obteniendo últimos {limite} registros...")
                 
-                # Primero verificar nombres de columnas
-                cursor = conn.cursor()
-                cursor.execute("PRAGMA table_info(sensor_responses)")
-                columnas_info = cursor.fetchall()
-                columnas_nombres = [col[1] for col in columnas_info]
-                
-                # Determinar nombre de la columna de temperatura
-                col_temperatura = 'temperatura'
-                if 'temperature' in columnas_nombres:
-                    col_temperatura = 'temperature'
-                elif 'temperatura' in columnas_nombres:
-                    col_temperatura = 'temperatura'
-                
-                # Consulta para últimos N registros
+                # Consulta para últimos N registros (BD principal y, si hace falta,
+                # las particiones mensuales más recientes)
                 query = f'''
                     SELECT 
                         s.created_at as timestamp,
                         s.calidad_aire_pred,
                         s.co2_nivel,
-                        s.{col_temperatura} as temperatura,
+                        s.temperature as temperatura,
                         s.humedad,
                         s.presion,
-                        s.prediccion_detalle
-                    FROM sensor_responses s
+                        s.prediccion_valor,
+                        s.co2_ppm,
+                        s.ubicacion
+                    FROM {{esquema}}.sensor_responses s
                     ORDER BY s.created_at DESC
-                    LIMIT {limite}
+                    LIMIT ?
                 '''
                 
-                df = pd.read_sql_query(query, conn)
+                columnas, filas = self.router(conn).consultar_recientes(query, limite=limite)
+                df = pd.DataFrame(filas, columns=columnas)
                 
                 if not df.empty:
                     print(f"[DEBUG] Encontrados {len(df)} registros")
@@ -161,29 +148,8 @@ class DashboardCalidadAire:
                     # Ordenar cronológicamente
                     df = df.sort_values('timestamp')
                     
-                    # Extraer predicción
-                    def extraer_prediccion(valor):
-                        try:
-                            if pd.isna(valor):
-                                return 0.5
-                            if isinstance(valor, (int, float)):
-                                return float(valor)
-                            if isinstance(valor, str):
-                                try:
-                                    data = json.loads(valor)
-                                    if isinstance(data, dict):
-                                        return data.get('prediccion_valor', 0.5)
-                                    return float(data)
-                                except:
-                                    try:
-                                        return float(valor)
-                                    except:
-                                        return 0.5
-                            return 0.5
-                        except:
-                            return 0.5
-                    
-                    df['prediccion_valor'] = df['prediccion_detalle'].apply(extraer_prediccion)
+                    # Predicción (columna promovida; filas sin valor usan 0.5)
+                    df['prediccion_valor'] = df['prediccion_valor'].fillna(0.5)
                     
                     # Calcular índice de calidad
                     def calcular_indice_calidad(categoria):
@@ -218,64 +184,40 @@ class DashboardCalidadAire:
                     return pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
                 
                 cursor = conn.cursor()
-                cursor.execute("PRAGMA table_info(sensor_responses)")
-                columnas_info = cursor.fetchall()
-                columnas_nombres = [col[1] for col in columnas_info]
                 
-                col_temperatura = 'temperatura'
-                if 'temperature' in columnas_nombres:
-                    col_temperatura = 'temperature'
-                elif 'temperatura' in columnas_nombres:
-                    col_temperatura = 'temperatura'
+                # Conteos y promedios de TODOS los datos desde el resumen diario
+                # (miles de filas agregadas en lugar de todas las mediciones)
+                total, promedios, categorias = estadisticas_generales(conn)
                 
-                # Conteo por categoría (de TODOS los datos)
-                query_categorias = '''
-                    SELECT 
-                        CASE 
-                            WHEN calidad_aire_pred IN ('Excelente', 'Buena', 'Moderada', 'Deficiente', 'Muy deficiente', 'Peligrosa') 
-                            THEN calidad_aire_pred
-                            ELSE 'Desconocida'
-                        END as categoria,
-                        COUNT(*) as cantidad
-                    FROM sensor_responses
-                    GROUP BY categoria
-                    ORDER BY 
-                        CASE categoria
-                            WHEN 'Excelente' THEN 1
-                            WHEN 'Buena' THEN 2
-                            WHEN 'Moderada' THEN 3
-                            WHEN 'Deficiente' THEN 4
-                            WHEN 'Muy deficiente' THEN 5
-                            WHEN 'Peligrosa' THEN 6
-                            ELSE 7
-                        END
-                '''
-                df_categorias = pd.read_sql_query(query_categorias, conn)
+                # Conteo por categoría (en el orden de la tabla de calidad)
+                df_categorias = pd.DataFrame(
+                    [(categoria, cantidad) for categoria, cantidad in categorias.items() if cantidad],
+                    columns=['categoria', 'cantidad']
+                )
                 
-                # Estadísticas generales (de TODOS los datos)
-                query_estadisticas = f'''
-                    SELECT 
-                        COUNT(*) as total_muestras,
-                        COALESCE(AVG({col_temperatura}), 0) as temp_promedio,
-                        COALESCE(AVG(humedad), 0) as humedad_promedio,
-                        COALESCE(AVG(presion), 0) as presion_promedio,
-                        MIN(created_at) as fecha_min,
-                        MAX(created_at) as fecha_max
-                    FROM sensor_responses
-                '''
-                df_estadisticas = pd.read_sql_query(query_estadisticas, conn)
+                # Rango de fechas (MIN/MAX resueltos con idx_responses_created)
+                cursor.execute("SELECT MIN(created_at), MAX(created_at) FROM sensor_responses")
+                fecha_min, fecha_max = cursor.fetchone()
                 
-                # Última medición
-                query_ultima = f'''
+                df_estadisticas = pd.DataFrame([{
+                    'total_muestras': total,
+                    'temp_promedio': promedios['temperatura'],
+                    'humedad_promedio': promedios['humedad'],
+                    'presion_promedio': promedios['presion'],
+                    'fecha_min': fecha_min,
+                    'fecha_max': fecha_max
+                }])
+                
+                # Última medición (latest_readings: una fila por ubicación y dispositivo)
+                query_ultima = '''
                     SELECT 
                         calidad_aire_pred, 
                         COALESCE(co2_nivel, 'Normal') as co2_nivel,
-                        COALESCE({col_temperatura}, 0) as temperatura,
+                        COALESCE(temperature, 0) as temperatura,
                         COALESCE(humedad, 0) as humedad,
                         created_at
-                    FROM sensor_responses
-                    WHERE created_at IS NOT NULL
-                    ORDER BY created_at DESC
+                    FROM latest_readings
+                    ORDER BY created_at_epoch DESC
                     LIMIT 1
                 '''
                 df_ultima = pd.read_sql_query(query_ultima, conn)
@@ -835,9 +777,7 @@ class DashboardCalidadAire:
                 # Obtener el total de registros disponibles
                 with self.conectar_db() as conn:
                     if conn:
-                        cursor = conn.cursor()
-                        cursor.execute("SELECT COUNT(*) FROM sensor_responses")
-                        total = cursor.fetchone()[0]
+                        total = estado_contadores(conn)['filas']['sensor_responses']
                         self.crear_dashboard_historico(registros=total)
             elif opcion == "4":
                 try:
@@ -887,8 +827,7 @@ def main():
     print(f"\n Realizando diagnóstico rápido...")
     with dashboard.conectar_db() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM sensor_responses")
-        total_muestras = cursor.fetchone()[0]
+        total_muestras = estado_contadores(conn)['filas']['sensor_responses']
         print(f"   * Muestras en base de datos: {total_muestras}")
         
         cursor.execute("SELECT MIN(created_at), MAX(created_at) FROM sensor_responses")
@@ -898,15 +837,9 @@ def main():
             fecha_fin = str(min_max[1])[:10]
             print(f"   * Periodo de datos: {fecha_inicio} a {fecha_fin}")
         
-        # Verificar nombre de columna de temperatura
-        cursor.execute("PRAGMA table_info(sensor_responses)")
-        columnas = cursor.fetchall()
-        col_temp = None
-        for col in columnas:
-            if col[1] in ['temperature', 'temperatura']:
-                col_temp = col[1]
-                break
-        print(f"   * Columna temperatura: {col_temp}")
+        print(f"   * Version de esquema: {version_esquema(conn)}")
+        print(f"   * Replica de lectura: {dashboard.replica.antiguedad():.0f} s de antiguedad "
+              f"(se refresca cada {dashboard.replica.max_antiguedad} s)")
     
     if total_muestras == 0:
         print(f"\n  ADVERTENCIA: Base de datos vacía")
@@ -0,0 +1,241 @@
+import os
+import re
+import json
+import gzip
+import time
+import atexit
+import shutil
+from datetime import datetime
+
+# Diario de alertas en NDJSON (una alerta JSON por linea), solo se agrega.
+# Reemplaza a los arreglos diarios alertas_AAAAMMDD.json, que se leian y
+# reescribian completos con cada alerta (O(n^2) por dia y un corte a
+# mitad de la escritura dejaba el archivo invalido).
+#
+# Segmentos: alertas_AAAAMMDD_NNN.ndjson en data/alertas. Se cambia de
+# segmento al cambiar el dia o al superar MAX_BYTES_SEGMENTO; el segmento
+# cerrado se comprime a .ndjson.gz si comprimir=True. Las alertas se
+# acumulan en memoria y se escriben cada MAX_PENDIENTES alertas o cada
+# INTERVALO_ESCRITURA segundos; fsync cada INTERVALO_FSYNC segundos y al
+# cerrar. Pensado para un escritor por directorio (el procesador).
+MAX_BYTES_SEGMENTO = 5 * 1024 * 1024
+MAX_PENDIENTES = 20
+INTERVALO_ESCRITURA = 1.0
+INTERVALO_FSYNC = 5.0
+
+# Conversiones al formato antiguo (junto a data/alertas, no dentro)
+DIRECTORIO_EXPORTADAS = 'alertas_exportadas'
+
+_PATRON_SEGMENTO = re.compile(r'^alertas_(\d{8})_(\d{3})\.ndjson(\.gz)?$')
+_PATRON_LEGADO = re.compile(r'^alertas_(\d{8})\.json$')
+
+
+def _fecha_hoy():
+    return datetime.now().strftime("%Y%m%d")
+
+
+def _segmentos(directorio, fecha=None):
+    """[(fecha, numero, ruta)] de los segmentos NDJSON, en orden"""
+    segmentos = []
+    if not os.path.isdir(directorio):
+        return segmentos
+    for nombre in os.listdir(directorio):
+        coincidencia = _PATRON_SEGMENTO.match(nombre)
+        if coincidencia and (fecha is None or coincidencia.group(1) == fecha):
+            segmentos.append((coincidencia.group(1), int(coincidencia.group(2)), os.path.join(directorio, nombre)))
+    return sorted(segmentos)
+
+
+def _comprimir(ruta):
+    """Comprime un segmento cerrado a .gz y borra el original
+
+    Se escribe a un temporal y se renombra: un corte a mitad de camino no
+    deja un .gz incompleto junto al original.
+    """
+    temporal = ruta + '.gz.tmp'
+    with open(ruta, 'rb') as origen, gzip.open(temporal, 'wb') as destino:
+        shutil.copyfileobj(origen, destino)
+    os.replace(temporal, ruta + '.gz')
+    os.remove(ruta)
+
+
+class DiarioAlertas:
+    """Escritor del diario NDJSON de alertas"""
+
+    def __init__(self, directorio, max_bytes=MAX_BYTES_SEGMENTO, comprimir=True,
+                 max_pendientes=MAX_PENDIENTES, intervalo_escritura=INTERVALO_ESCRITURA,
+                 intervalo_fsync=INTERVALO_FSYNC):
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        self.comprimir = comprimir
+        self.max_pendientes = max_pendientes
+        self.intervalo_escritura = intervalo_escritura
+        self.intervalo_fsync = intervalo_fsync
+        self._archivo = None
+        self._ruta = None
+        self._fecha = None
+        self._numero = 0
+        self._pendientes = []
+        self._ultima_escritura = time.monotonic()
+        self._ultimo_fsync = time.monotonic()
+        os.makedirs(directorio, exist_ok=True)
+        atexit.register(self.cerrar)
+
+    def _abrir(self, fecha):
+        """Abre el ultimo segmento del dia (o el primero) para agregar"""
+        existentes = _segmentos(self.directorio, fecha)
+        if existentes and not existentes[-1][2].endswith('.gz') and os.path.getsize(existentes[-1][2]) < self.max_bytes:
+            _, self._numero, self._ruta = existentes[-1]
+        else:
+            self._numero = existentes[-1][1] + 1 if existentes else 1
+            self._ruta = os.path.join(self.directorio, f'alertas_{fecha}_{self._numero:03d}.ndjson')
+        self._fecha = fecha
+        if self.comprimir:
+            self._comprimir_cerrados()
+        self._archivo = open(self._ruta, 'a+b')
+        # Una escritura cortada (caida del proceso) deja la ultima linea
+        # incompleta: la siguiente alerta empieza en una linea nueva
+        if self._archivo.tell() > 0:
+            self._archivo.seek(-1, os.SEEK_END)
+            if self._archivo.read(1) != b'\n':
+                self._archivo.write(b'\n')
+
+    def _comprimir_cerrados(self):
+        """Comprime los segmentos sin comprimir anteriores al que se abre
+
+        cerrar() no comprime (el segmento puede seguir en uso en la proxima
+        ejecucion del mismo dia) y las ejecuciones cortas rara vez rotan, asi
+        que los segmentos de dias anteriores o con numero menor se comprimen aqui.
+        """
+        for fecha, numero, ruta in _segmentos(self.directorio):
+            if ruta.endswith('.gz') or (fecha, numero) >= (self._fecha, self._numero):
+                continue
+            if os.path.exists(ruta + '.gz'):
+                os.remove(ruta + '.gz')  # resto de una compresion interrumpida
+            _comprimir(ruta)
+
+    def _cerrar_segmento(self, rotar):
+        if self._archivo is None:
+            return
+        self._archivo.flush()
+        os.fsync(self._archivo.fileno())
+        self._archivo.close()
+        self._archivo = None
+        if rotar and self.comprimir and os.path.exists(self._ruta):
+            _comprimir(self._ruta)
+
+    def escribir(self, alerta):
+        """Agrega una alerta al diario (se escribe en el siguiente vaciado)"""
+        self._pendientes.append(json.dumps(alerta, ensure_ascii=False, default=str) + '\n')
+        if (len(self._pendientes) >= self.max_pendientes
+                or time.monotonic() - self._ultima_escritura >= self.intervalo_escritura):
+            self.vaciar()
+
+    def vaciar(self, sincronizar=False):
+        """Escribe las alertas pendientes; fsync si toca (o si sincronizar=True)"""
+        if self._pendientes:
+            fecha = _fecha_hoy()
+            if self._archivo is not None and (fecha != self._fecha or not os.path.exists(self._ruta)
+                                              or self._archivo.tell() >= self.max_bytes):
+                self._cerrar_segmento(rotar=os.path.exists(self._ruta))
+            if self._archivo is None:
+                self._abrir(fecha)
+            self._archivo.write(''.join(self._pendientes).encode('utf-8'))
+            self._archivo.flush()
+            self._pendientes = []
+        ahora = time.monotonic()
+        self._ultima_escritura = ahora
+        if self._archivo is not None and (sincronizar or ahora - self._ultimo_fsync >= self.intervalo_fsync):
+            os.fsync(self._archivo.fileno())
+            self._ultimo_fsync = ahora
+
+    def cerrar(self):
+        """Escribe lo pendiente, sincroniza y cierra el segmento (sin comprimirlo)"""
+        self.vaciar(sincronizar=True)
+        self._cerrar_segmento(rotar=False)
+
+
+def _leer_lineas(ruta):
+    abrir = gzip.open if ruta.endswith('.gz') else open
+    with abrir(ruta, 'rt', encoding='utf-8') as f:
+        for linea in f:
+            linea = linea.strip()
+            if not linea:
+                continue
+            try:
+                yield json.loads(linea)
+            except ValueError:
+                continue  # Linea cortada por una caida: se descarta
+
+
+def leer_alertas(directorio, fecha=None):
+    """Alertas del diario (y de los arreglos JSON antiguos), en orden de escritura
+
+    fecha: 'AAAAMMDD' para un solo dia; None para todos.
+    """
+    legados = []
+    if os.path.isdir(directorio):
+        for nombre in sorted(os.listdir(directorio)):
+            coincidencia = _PATRON_LEGADO.match(nombre)
+            if coincidencia and (fecha is None or coincidencia.group(1) == fecha):
+                legados.append((coincidencia.group(1), os.path.join(directorio, nombre)))
+    fechas = sorted({f for f, _ in legados} | {f for f, _, _ in _segmentos(directorio, fecha)})
+    for dia in fechas:
+        for _, ruta in (par for par in legados if par[0] == dia):
+            try:
+                with open(ruta, 'r', encoding='utf-8') as f:
+                    yield from json.load(f)
+            except ValueError:
+                print(f"  [ADVERTENCIA] Arreglo de alertas invalido: {ruta}")
+        for _, _, ruta in _segmentos(directorio, dia):
+            yield from _leer_lineas(ruta)
+
+
+def convertir_a_json(directorio, fecha, destino=None):
+    """Escribe las alertas de un dia en el formato antiguo (arreglo JSON con indent=2)
+
+    Por defecto en alertas_exportadas/alertas_AAAAMMDD.json, fuera del diario:
+    dentro, leer_alertas lo tomaria como arreglo antiguo y contaria dos veces
+    esas alertas. Devuelve (ruta, cantidad).
+    """
+    if destino is None:
+        destino = os.path.join(os.path.dirname(os.path.abspath(directorio)), DIRECTORIO_EXPORTADAS,
+                               f'alertas_{fecha}.json')
+    elif (os.path.dirname(os.path.abspath(destino)) == os.path.abspath(directorio)
+          and _PATRON_LEGADO.match(os.path.basename(destino))):
+        raise ValueError(f"{destino} se leeria como arreglo antiguo del diario; use otro nombre o directorio")
+    alertas = [alerta for alerta in leer_alertas(directorio, fecha)]
+    os.makedirs(os.path.dirname(os.path.abspath(destino)), exist_ok=True)
+    temporal = destino + '.tmp'
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(alertas, f, indent=2, ensure_ascii=False)
+    os.replace(temporal, destino)
+    return destino, len(alertas)
+
+
+def main():
+    """Resumen del diario por dia, o conversion de un dia al formato antiguo
+
+    python diario_alertas.py                         alertas por dia
+    python diario_alertas.py AAAAMMDD [salida.json]  arreglo JSON de ese dia
+    """
+    import sys
+
+    directorio = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'alertas')
+    if len(sys.argv) > 1:
+        fecha = sys.argv[1]
+        destino, cantidad = convertir_a_json(directorio, fecha, sys.argv[2] if len(sys.argv) > 2 else None)
+        print(f"{cantidad} alertas del {fecha} escritas en {destino}")
+        return
+
+    por_dia = {}
+    for alerta in leer_alertas(directorio):
+        dia = str(alerta.get('timestamp', ''))[:10]
+        por_dia[dia] = por_dia.get(dia, 0) + 1
+    print(f"Diario de alertas: {directorio}")
+    for dia, cantidad in sorted(por_dia.items()):
+        print(f"  {dia}: {cantidad} alertas")
+
+
+if __name__ == "__main__":
+    main()
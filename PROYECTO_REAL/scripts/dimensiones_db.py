@@ -0,0 +1,184 @@
+import time
+from compresion_payload import descomprimir_payload
+
+# Dimensiones con claves enteras pequenas. Las tablas de hechos guardan
+# ubicacion_id / dispositivo_id; el texto se conserva para compatibilidad
+# con las particiones y consultas anteriores, pero filtros y agrupaciones
+# comparan enteros.
+UBICACION_DESCONOCIDA = 'Desconocida'
+
+
+def crear_tablas_dimensiones(conn):
+    """Tablas ubicaciones y dispositivos"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS ubicaciones (
+            id INTEGER PRIMARY KEY,
+            nombre TEXT NOT NULL UNIQUE,
+            latitud REAL,
+            longitud REAL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS dispositivos (
+            id INTEGER PRIMARY KEY,
+            codigo TEXT NOT NULL UNIQUE,
+            ubicacion_id INTEGER REFERENCES ubicaciones(id)
+        )
+    ''')
+
+
+class CacheDimensiones:
+    """Cache en proceso nombre -> id de ubicaciones y dispositivos
+
+    Solo los valores nuevos llegan a la BD; el resto se resuelve con un
+    dict. Cada alta se confirma de inmediato para que un id en la cache
+    nunca apunte a una fila revertida.
+    """
+
+    def __init__(self):
+        self._ubicaciones = {}       # nombre -> id
+        self._sin_coordenadas = set()  # ids de ubicaciones aun sin lat/lon
+        self._dispositivos = {}      # codigo -> (id, ubicacion_id)
+
+    def id_ubicacion(self, conn, nombre, latitud=None, longitud=None):
+        """Id de la ubicacion (la crea si no existe y completa lat/lon si faltaban)"""
+        nombre = nombre or UBICACION_DESCONOCIDA
+        ubicacion_id = self._ubicaciones.get(nombre)
+        if ubicacion_id is not None and (latitud is None or ubicacion_id not in self._sin_coordenadas):
+            return ubicacion_id
+
+        with conn:
+            if ubicacion_id is None:
+                conn.execute('INSERT OR IGNORE INTO ubicaciones (nombre) VALUES (?)', (nombre,))
+                ubicacion_id, lat_actual = conn.execute(
+                    'SELECT id, latitud FROM ubicaciones WHERE nombre = ?', (nombre,)).fetchone()
+                self._ubicaciones[nombre] = ubicacion_id
+                if lat_actual is None:
+                    self._sin_coordenadas.add(ubicacion_id)
+            if latitud is not None and ubicacion_id in self._sin_coordenadas:
+                conn.execute('''
+                    UPDATE ubicaciones SET latitud = ?, longitud = ?
+                    WHERE id = ? AND latitud IS NULL
+                ''', (latitud, longitud, ubicacion_id))
+                self._sin_coordenadas.discard(ubicacion_id)
+        return ubicacion_id
+
+    def id_dispositivo(self, conn, codigo, ubicacion_id=None):
+        """Id del dispositivo (lo crea si no existe y guarda su ultima ubicacion)"""
+        if not codigo:
+            return None
+        actual = self._dispositivos.get(codigo)
+        if actual is not None and (ubicacion_id is None or actual[1] == ubicacion_id):
+            return actual[0]
+
+        with conn:
+            conn.execute('INSERT OR IGNORE INTO dispositivos (codigo) VALUES (?)', (codigo,))
+            dispositivo_id, ubicacion_actual = conn.execute(
+                'SELECT id, ubicacion_id FROM dispositivos WHERE codigo = ?', (codigo,)).fetchone()
+            if ubicacion_id is not None and ubicacion_actual != ubicacion_id:
+                conn.execute('UPDATE dispositivos SET ubicacion_id = ? WHERE id = ?',
+                             (ubicacion_id, dispositivo_id))
+                ubicacion_actual = ubicacion_id
+        self._dispositivos[codigo] = (dispositivo_id, ubicacion_actual)
+        return dispositivo_id
+
+
+def ids_ubicaciones_que_contienen(conn, texto):
+    """Ids de las ubicaciones cuyo nombre contiene el texto (sin distinguir mayusculas)
+
+    La busqueda parcial se hace sobre la dimension (pocas filas) y la
+    tabla de hechos se filtra luego por ubicacion_id.
+    """
+    texto = texto.lower()
+    return [ubicacion_id for ubicacion_id, nombre in
+            conn.execute('SELECT id, nombre FROM ubicaciones').fetchall()
+            if texto in nombre.lower()]
+
+
+def nombres_ubicaciones(conn):
+    """Dict id -> nombre de todas las ubicaciones"""
+    return dict(conn.execute('SELECT id, nombre FROM ubicaciones').fetchall())
+
+
+def backfill_dimensiones(conn, esquema='main', tamano_lote=1000, pausa=0.0):
+    """Da de alta las ubicaciones/dispositivos existentes y rellena las claves enteras
+
+    Tambien sirve para una particion mensual adjunta (esquema): sus
+    ubicaciones y dispositivos se dan de alta en las dimensiones de la BD
+    principal. Devuelve el numero de filas actualizadas.
+    """
+    tablas_ubicacion = ('sensor_responses', 'alertas_sistema') if esquema == 'main' else ('sensor_responses',)
+    with conn:
+        for tabla in tablas_ubicacion:
+            conn.execute(f'''
+                INSERT OR IGNORE INTO main.ubicaciones (nombre)
+                SELECT DISTINCT ubicacion FROM {esquema}.{tabla} WHERE ubicacion IS NOT NULL
+            ''')
+        for tabla in ('sensor_requests', 'sensor_responses'):
+            conn.execute(f'''
+                INSERT OR IGNORE INTO main.dispositivos (codigo)
+                SELECT DISTINCT device_id FROM {esquema}.{tabla} WHERE device_id IS NOT NULL
+            ''')
+
+    # Las columnas sin prefijo dentro de las subconsultas son las de la tabla actualizada
+    asignaciones = {
+        'sensor_requests':
+            'dispositivo_id = (SELECT d.id FROM main.dispositivos d WHERE d.codigo = device_id)',
+        'sensor_responses':
+            'ubicacion_id = (SELECT u.id FROM main.ubicaciones u WHERE u.nombre = ubicacion), '
+            'dispositivo_id = (SELECT d.id FROM main.dispositivos d WHERE d.codigo = device_id)',
+        'alertas_sistema':
+            'ubicacion_id = (SELECT u.id FROM main.ubicaciones u WHERE u.nombre = ubicacion)',
+    }
+    if esquema != 'main':
+        asignaciones.pop('alertas_sistema')
+
+    actualizadas = 0
+    for tabla, asignacion in asignaciones.items():
+        id_maximo = conn.execute(f'SELECT COALESCE(MAX(id), 0) FROM {esquema}.{tabla}').fetchone()[0]
+        desde = 0
+        while desde < id_maximo:
+            hasta = desde + tamano_lote
+            with conn:
+                actualizadas += conn.execute(
+                    f'UPDATE {esquema}.{tabla} SET {asignacion} WHERE id > ? AND id <= ?',
+                    (desde, hasta)).rowcount
+            desde = hasta
+            if pausa:
+                time.sleep(pausa)
+
+    if esquema == 'main':
+        _completar_dimensiones(conn)
+    return actualizadas
+
+
+def _completar_dimensiones(conn):
+    """Ultima ubicacion de cada dispositivo y lat/lon tomada de un payload de cada ubicacion"""
+    with conn:
+        conn.execute('''
+            UPDATE dispositivos SET ubicacion_id = (
+                SELECT r.ubicacion_id FROM sensor_responses r
+                WHERE r.dispositivo_id = dispositivos.id
+                ORDER BY r.created_at_epoch DESC LIMIT 1
+            )
+            WHERE ubicacion_id IS NULL
+        ''')
+
+    sin_coordenadas = conn.execute('SELECT id FROM ubicaciones WHERE latitud IS NULL').fetchall()
+    for (ubicacion_id,) in sin_coordenadas:
+        fila = conn.execute('''
+            SELECT q.request_data FROM sensor_responses r
+            JOIN sensor_requests q ON q.id = r.request_id
+            WHERE r.ubicacion_id = ? AND q.request_data IS NOT NULL
+            ORDER BY r.id DESC LIMIT 1
+        ''', (ubicacion_id,)).fetchone()
+        if fila is None:
+            continue
+        try:
+            metadata = descomprimir_payload(fila[0]).get('sensor_data', {}).get('metadata', {})
+        except (ValueError, AttributeError):
+            continue
+        if metadata.get('latitude') is not None:
+            with conn:
+                conn.execute('UPDATE ubicaciones SET latitud = ?, longitud = ? WHERE id = ?',
+                             (metadata.get('latitude'), metadata.get('longitude'), ubicacion_id))
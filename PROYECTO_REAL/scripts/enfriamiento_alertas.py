@@ -0,0 +1,207 @@
+import time
+from collections import OrderedDict
+
+# Cache de deduplicacion de SistemaAlertas: momento de la ultima alerta
+# emitida por clave (tipo_ubicacion_condicion). Una clave se olvida
+# RETENCION segundos despues de su ultima alerta. Antes se recorria el
+# dict completo en cada lectura para olvidar las viejas (O(n) por lectura).
+RETENCION = 3600
+
+# Estado compartido entre procesos y ejecuciones: tabla alert_cooldowns con
+# el epoch (reloj del sistema) de la ultima alerta por clave. El alta de una
+# alerta es un upsert condicional (comprobar y fijar atomicos): de dos
+# procesos que intentan la misma clave solo uno lo logra. Cada proceso
+# recuerda por DURACION_LEASE segundos como maximo que una clave esta en
+# espera y en ese tiempo la suprime sin ir a la BD.
+TABLA_ENFRIAMIENTOS = 'alert_cooldowns'
+DURACION_LEASE = 30
+
+_SQL_RESERVAR = f'''
+    INSERT INTO {TABLA_ENFRIAMIENTOS} (clave, ultima_epoch) VALUES (?, ?)
+    ON CONFLICT (clave) DO UPDATE SET ultima_epoch = excluded.ultima_epoch
+    WHERE excluded.ultima_epoch - {TABLA_ENFRIAMIENTOS}.ultima_epoch >= ?
+'''
+
+
+def crear_tabla_enfriamientos(conn):
+    """Tabla alert_cooldowns (ultima alerta por clave)"""
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {TABLA_ENFRIAMIENTOS} (
+            clave TEXT PRIMARY KEY,
+            ultima_epoch REAL NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    conn.execute(f'CREATE INDEX IF NOT EXISTS idx_alert_cooldowns_epoch ON {TABLA_ENFRIAMIENTOS}(ultima_epoch)')
+
+
+def reservar_enfriamiento(conn, clave, ahora_epoch, espera):
+    """Comprueba y fija la ultima alerta de la clave en una sola transaccion
+
+    Devuelve (permitida, ultima_epoch): si pasaron `espera` segundos (o la
+    clave es nueva) queda ahora como su ultima alerta; si no, se informa la
+    ultima registrada.
+    """
+    with conn:
+        if conn.execute(_SQL_RESERVAR, (clave, ahora_epoch, espera)).rowcount == 1:
+            return True, ahora_epoch
+        fila = conn.execute(f'SELECT ultima_epoch FROM {TABLA_ENFRIAMIENTOS} WHERE clave = ?',
+                            (clave,)).fetchone()
+    return False, fila[0]
+
+
+def purgar_enfriamientos(conn, antes_epoch):
+    """Borra las claves sin alertas desde antes_epoch; devuelve las borradas"""
+    with conn:
+        return conn.execute(f'DELETE FROM {TABLA_ENFRIAMIENTOS} WHERE ultima_epoch < ?',
+                            (antes_epoch,)).rowcount
+
+
+class CacheEnfriamiento:
+    """Ultima alerta por clave con vencimiento en orden (O(1) amortizado)
+
+    Todas las claves tienen la misma retencion, asi que el orden de la
+    ultima emision es tambien el orden de vencimiento: la clave renovada
+    pasa al final del OrderedDict y las vencidas se quitan desde el
+    principio (una rueda de tiempo de una sola ranura). Los momentos son
+    de time.monotonic, que no salta con cambios de hora del sistema.
+    """
+
+    def __init__(self, retencion=RETENCION, reloj=time.monotonic):
+        self.retencion = retencion
+        self.reloj = reloj
+        self._ultimas = OrderedDict()  # clave -> momento de la ultima alerta
+
+    def __len__(self):
+        return len(self._ultimas)
+
+    def __contains__(self, clave):
+        return clave in self._ultimas
+
+    def _vencer(self, ahora):
+        """Quita las claves sin alertas en los ultimos `retencion` segundos"""
+        while self._ultimas:
+            clave, momento = next(iter(self._ultimas.items()))
+            if ahora - momento <= self.retencion:
+                break
+            self._ultimas.popitem(last=False)
+
+    def permitir(self, clave, espera):
+        """True si pasaron `espera` segundos desde la ultima alerta de la clave
+
+        Si se permite, se registra ahora como su ultima alerta.
+        """
+        ahora = self.reloj()
+        self._vencer(ahora)
+        ultima = self._ultimas.get(clave)
+        if ultima is not None and ahora - ultima < espera:
+            return False
+        self._ultimas[clave] = ahora
+        self._ultimas.move_to_end(clave)
+        return True
+
+
+class CacheEnfriamientoCompartida:
+    """Enfriamiento persistente (via el almacenamiento) con leases locales
+
+    Misma interfaz que CacheEnfriamiento. Si el proceso sabe que la clave
+    sigue en espera (lease vigente) suprime sin consultar; si no, hace el
+    comprobar y fijar en la BD. Otro proceso solo puede hacer mas reciente
+    la ultima alerta, asi que "en espera hasta T" no caduca antes de T; el
+    lease se acorta a DURACION_LEASE para notar una tabla vaciada a mano.
+    """
+
+    def __init__(self, almacenamiento, retencion=RETENCION, duracion_lease=DURACION_LEASE,
+                 reloj=time.time, reloj_local=time.monotonic):
+        self.almacenamiento = almacenamiento
+        self.duracion_lease = duracion_lease
+        self.reloj = reloj              # compartido entre procesos
+        self.reloj_local = reloj_local  # vencimiento de los leases
+        # clave -> (momento local del lease, fin del lease); el orden de alta es
+        # el orden de vencimiento maximo, como en CacheEnfriamiento
+        self._leases = OrderedDict()
+        almacenamiento.purgar_enfriamientos(reloj() - retencion)
+
+    def __len__(self):
+        return len(self._leases)
+
+    def __contains__(self, clave):
+        return clave in self._leases
+
+    def _vencer(self, ahora_local):
+        while self._leases:
+            clave, (desde, _) = next(iter(self._leases.items()))
+            if ahora_local - desde < self.duracion_lease:
+                break
+            self._leases.popitem(last=False)
+
+    def permitir(self, clave, espera):
+        """True si pasaron `espera` segundos desde la ultima alerta de la clave en cualquier proceso"""
+        ahora_local = self.reloj_local()
+        self._vencer(ahora_local)
+        lease = self._leases.get(clave)
+        if lease is not None and ahora_local < lease[1]:
+            return False
+
+        ahora = self.reloj()
+        permitida, ultima = self.almacenamiento.reservar_enfriamiento(clave, ahora, espera)
+        restante = min(ultima + espera - ahora, self.duracion_lease)
+        if restante > 0:
+            self._leases[clave] = (ahora_local, ahora_local + restante)
+            self._leases.move_to_end(clave)
+        else:
+            self._leases.pop(clave, None)
+        return permitida
+
+
+def _permitir_recorriendo(ultimas, clave, espera, ahora, retencion=RETENCION):
+    """Algoritmo anterior (dict y recorrido completo), solo para comparar"""
+    ultima = ultimas.get(clave)
+    if ultima is not None and ahora - ultima < espera:
+        return False
+    ultimas[clave] = ahora
+    for vieja in [k for k, momento in ultimas.items() if ahora - momento > retencion]:
+        del ultimas[vieja]
+    return True
+
+
+def main():
+    """Benchmark con claves activas: recorrido completo vs vencimiento en orden
+
+    Las claves se reparten en la ventana de retencion; cada llamada avanza
+    el reloj lo justo para que venza una clave y entre otra, asi que siempre
+    hay `claves` activas. python enfriamiento_alertas.py [claves] (100000)
+    """
+    import sys
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    paso = RETENCION / n
+    print(f"{n} claves activas")
+    for nombre, llamadas, recorrido in (('recorrido completo', 200, True),
+                                         ('vencimiento en orden', 200_000, False)):
+        reloj = [0.0]
+        cache = CacheEnfriamiento(reloj=lambda: reloj[0])
+        ultimas = {}
+        for i in range(n):
+            reloj[0] = i * paso
+            clave = f'CALIDAD_AIRE_Aula {i}_co2_alto'
+            if recorrido:
+                ultimas[clave] = reloj[0]
+            else:
+                cache.permitir(clave, 300)
+
+        t = time.perf_counter()
+        for j in range(n, n + llamadas):
+            reloj[0] = j * paso + 1.0
+            clave = f'CALIDAD_AIRE_Aula {j}_co2_alto'
+            if recorrido:
+                _permitir_recorriendo(ultimas, clave, 300, reloj[0])
+            else:
+                cache.permitir(clave, 300)
+        duracion = time.perf_counter() - t
+        activas = len(ultimas) if recorrido else len(cache)
+        print(f"  {nombre:<22}{llamadas:>8} llamadas {duracion / llamadas * 1e6:>10.2f} us/llamada  "
+              f"({activas} claves al final)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import time
+
+# Enlace response -> alertas generadas al procesarlo. Antes cada response
+# copiaba la lista completa de alertas dentro de prediccion_detalle
+# (info_alertas.alertas_generadas); ahora prediccion_detalle guarda solo
+# los conteos y el enlace se escribe en el mismo lote que el response.
+# Los ids de responses se conservan al moverlos a una particion mensual,
+# asi que los enlaces siguen validos; al borrar una alerta (compactacion)
+# un trigger borra sus enlaces.
+TABLA_ENLACES = 'responses_alertas'
+
+
+def crear_tabla_enlaces(conn):
+    """Tabla responses_alertas, su indice por alerta y el trigger de borrado"""
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {TABLA_ENLACES} (
+            response_id INTEGER NOT NULL,
+            alerta_id INTEGER NOT NULL,
+            PRIMARY KEY (response_id, alerta_id)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute(f'CREATE INDEX IF NOT EXISTS idx_responses_alertas_alerta ON {TABLA_ENLACES}(alerta_id)')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_enlaces_alertas_delete AFTER DELETE ON alertas_sistema
+        BEGIN DELETE FROM {TABLA_ENLACES} WHERE alerta_id = old.id; END
+    ''')
+
+
+def guardar_enlaces(conn, enlaces):
+    """Inserta pares (response_id, alerta_id); no confirma (va en la transaccion del lote)"""
+    if enlaces:
+        conn.executemany(f'INSERT OR IGNORE INTO {TABLA_ENLACES} (response_id, alerta_id) VALUES (?, ?)',
+                         enlaces)
+
+
+def backfill_enlaces(conn, esquema='main', tamano_lote=1000, pausa=0.0):
+    """Pasa las alertas embebidas en prediccion_detalle a responses_alertas
+
+    Los enlaces salen del db_id de cada alerta de info_alertas.alertas_generadas;
+    luego esa lista se quita de prediccion_detalle (quedan los conteos).
+    Sirve tambien para una particion mensual adjunta (esquema); los enlaces
+    van siempre a la BD principal. Devuelve los responses actualizados.
+    """
+    ruta = '$.info_alertas.alertas_generadas'
+    # Las funciones JSON fallan con texto invalido y SQLite no garantiza el
+    # orden de evaluacion del WHERE: el JSON invalido se convierte en NULL
+    valido = 'CASE WHEN json_valid({0}) THEN {0} END'
+    actualizados = 0
+    id_maximo = conn.execute(f'SELECT COALESCE(MAX(id), 0) FROM {esquema}.sensor_responses').fetchone()[0]
+    desde = 0
+    while desde < id_maximo:
+        hasta = desde + tamano_lote
+        with conn:
+            conn.execute(f'''
+                INSERT OR IGNORE INTO main.{TABLA_ENLACES} (response_id, alerta_id)
+                SELECT r.id, json_extract(a.value, '$.db_id')
+                FROM {esquema}.sensor_responses r,
+                     json_each({valido.format('r.prediccion_detalle')}, '{ruta}') a
+                WHERE r.id > ? AND r.id <= ?
+                  AND json_type({valido.format('r.prediccion_detalle')}, '{ruta}') = 'array'
+                  AND json_extract(a.value, '$.db_id') IS NOT NULL
+            ''', (desde, hasta))
+            actualizados += conn.execute(f'''
+                UPDATE {esquema}.sensor_responses
+                SET prediccion_detalle = json_remove(prediccion_detalle, '{ruta}')
+                WHERE id > ? AND id <= ?
+                  AND json_type({valido.format('prediccion_detalle')}, '{ruta}') IS NOT NULL
+            ''', (desde, hasta)).rowcount
+        desde = hasta
+        if pausa:
+            time.sleep(pausa)
+    return actualizados
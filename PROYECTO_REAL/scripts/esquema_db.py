@@ -0,0 +1,217 @@
+import time
+from tiempo_utc import a_epoch
+
+# Campos de prediccion_detalle promovidos a columnas reales de sensor_responses
+COLUMNAS_PROMOVIDAS_RESPONSES = [
+    ('co2_ppm', 'REAL'),
+    ('prediccion_valor', 'REAL'),
+    ('ubicacion', 'TEXT'),
+    ('device_id', 'TEXT'),
+]
+
+INDICES_COLUMNAS_PROMOVIDAS = [
+    ('idx_responses_co2', 'sensor_responses(co2_ppm)'),
+]
+
+# Columnas epoch UTC (INTEGER) derivadas de las columnas de texto ISO
+# tabla -> [(columna_epoch, columna_origen)]
+COLUMNAS_EPOCH = {
+    'sensor_requests': [('timestamp_epoch', 'timestamp'), ('processed_at_epoch', 'processed_at')],
+    'sensor_responses': [('created_at_epoch', 'created_at')],
+    'archivos_procesados': [('fecha_procesado_epoch', 'fecha_procesado')],
+    'alertas_sistema': [('timestamp_epoch', 'timestamp'), ('fecha_procesada_epoch', 'fecha_procesada')],
+}
+
+INDICES_EPOCH = [
+    ('idx_requests_timestamp_epoch', 'sensor_requests(timestamp_epoch)'),
+    ('idx_responses_created_epoch', 'sensor_responses(created_at_epoch)'),
+    ('idx_alertas_timestamp_epoch', 'alertas_sistema(timestamp_epoch)'),
+    ('idx_alertas_pendientes_epoch', 'alertas_sistema(procesada, nivel, timestamp_epoch)'),
+]
+
+# Indices para las consultas frecuentes (dashboard, consulta_db, alertas)
+INDICES_CONSULTAS = [
+    ('idx_requests_timestamp', 'sensor_requests(timestamp)'),
+    ('idx_requests_processed', 'sensor_requests(processed_at)'),
+    ('idx_responses_created', 'sensor_responses(created_at)'),
+    ('idx_responses_request', 'sensor_responses(request_id)'),
+    # Cubre el resumen por categoria (GROUP BY + AVG) sin leer la tabla
+    ('idx_responses_calidad', 'sensor_responses(calidad_aire_pred, temperature, humedad)'),
+    ('idx_alertas_timestamp', 'alertas_sistema(timestamp)'),
+    ('idx_alertas_procesada', 'alertas_sistema(procesada)'),
+    ('idx_alertas_nivel', 'alertas_sistema(nivel)'),
+]
+
+INDICES_TABLAS = INDICES_COLUMNAS_PROMOVIDAS + INDICES_EPOCH + INDICES_CONSULTAS
+
+# Claves enteras hacia las dimensiones ubicaciones/dispositivos (dimensiones_db)
+COLUMNAS_DIMENSIONES = {
+    'sensor_requests': [('dispositivo_id', 'INTEGER')],
+    'sensor_responses': [('ubicacion_id', 'INTEGER'), ('dispositivo_id', 'INTEGER')],
+    'alertas_sistema': [('ubicacion_id', 'INTEGER')],
+}
+
+INDICES_DIMENSIONES = [
+    ('idx_responses_ubicacion_id', 'sensor_responses(ubicacion_id, created_at)'),
+    ('idx_responses_dispositivo_id', 'sensor_responses(dispositivo_id, created_at)'),
+    ('idx_alertas_pendientes_ubicacion_id', 'alertas_sistema(procesada, ubicacion_id, timestamp_epoch)'),
+    # Cubre los reportes por periodo (GROUP BY nivel, tipo, ubicacion_id)
+    ('idx_alertas_reporte_ubicacion_id', 'alertas_sistema(timestamp_epoch, nivel, tipo, ubicacion_id, procesada)'),
+]
+
+# Indices sobre el texto de ubicacion/device_id reemplazados por los de las claves enteras
+INDICES_REEMPLAZADOS_DIMENSIONES = [
+    'idx_responses_ubicacion', 'idx_responses_device',
+    'idx_alertas_pendientes_ubicacion', 'idx_alertas_reporte',
+]
+
+# Consultas representativas que deben resolverse con indice: (descripcion, sql, parametros)
+CONSULTAS_VERIFICADAS = [
+    ('ultimos registros del dashboard',
+     'SELECT created_at, calidad_aire_pred, co2_ppm FROM sensor_responses ORDER BY created_at DESC LIMIT 10', ()),
+    ('response por request',
+     'SELECT id FROM sensor_responses WHERE request_id = ?', (1,)),
+    ('requests recientes',
+     'SELECT id, timestamp FROM sensor_requests ORDER BY processed_at DESC LIMIT 3', ()),
+    ('mediciones por ubicacion',
+     'SELECT created_at FROM sensor_responses WHERE ubicacion_id = ? ORDER BY created_at DESC LIMIT 10', (1,)),
+    ('mediciones por rango de CO2',
+     'SELECT created_at FROM sensor_responses WHERE co2_ppm BETWEEN ? AND ?', (800, 1200)),
+    ('resumen por categoria',
+     'SELECT calidad_aire_pred, COUNT(*), AVG(temperature), AVG(humedad) '
+     'FROM sensor_responses GROUP BY calidad_aire_pred', ()),
+    ('alertas pendientes por nivel',
+     "SELECT id FROM alertas_sistema WHERE procesada = 0 AND nivel = ? "
+     "ORDER BY timestamp_epoch DESC LIMIT 20", ('CRITICA',)),
+    ('alertas pendientes por ubicacion',
+     "SELECT id FROM alertas_sistema WHERE procesada = 0 AND ubicacion_id IN (?, ?) "
+     "ORDER BY timestamp_epoch DESC LIMIT 20", (1, 2)),
+    ('alertas pendientes antiguas',
+     "SELECT COUNT(*) FROM alertas_sistema WHERE procesada = 0 AND nivel = 'CRITICA' "
+     "AND timestamp_epoch <= ?", (0,)),
+    ('reporte de alertas por periodo',
+     'SELECT nivel, tipo, ubicacion_id, COUNT(*) FROM alertas_sistema '
+     'WHERE timestamp_epoch >= ? GROUP BY nivel, tipo, ubicacion_id', (0,)),
+]
+
+
+def existe_tabla(conn, tabla):
+    """Indica si la tabla existe"""
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (tabla,)
+    ).fetchone() is not None
+
+
+def columnas_tabla(conn, tabla):
+    """Nombres de las columnas de una tabla"""
+    return [col[1] for col in conn.execute(f"PRAGMA table_info({tabla})").fetchall()]
+
+
+def asegurar_columnas(conn, tabla, columnas):
+    """Agrega las columnas que falten y devuelve la lista de las agregadas"""
+    existentes = set(columnas_tabla(conn, tabla))
+    agregadas = []
+    for nombre, tipo in columnas:
+        if nombre not in existentes:
+            conn.execute(f"ALTER TABLE {tabla} ADD COLUMN {nombre} {tipo}")
+            agregadas.append(nombre)
+    return agregadas
+
+
+def crear_indices(conn, indices):
+    """Crea los indices indicados si no existen"""
+    for nombre, definicion in indices:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {nombre} ON {definicion}")
+
+
+def crear_indices_tablas(conn):
+    """Crea el conjunto completo de indices sobre las tablas existentes"""
+    with conn:
+        crear_indices(conn, [
+            (nombre, definicion) for nombre, definicion in INDICES_TABLAS
+            if existe_tabla(conn, definicion.split('(')[0])
+        ])
+    # Actualiza las estadisticas del planificador si cambiaron los indices
+    conn.execute('PRAGMA optimize')
+
+
+def verificar_planes_consulta(conn, consultas=CONSULTAS_VERIFICADAS):
+    """Ejecuta EXPLAIN QUERY PLAN y devuelve las consultas que recorren una tabla completa
+
+    Devuelve una lista de (descripcion, detalle del plan).
+    """
+    escaneos = []
+    for descripcion, sql, parametros in consultas:
+        try:
+            plan = conn.execute(f'EXPLAIN QUERY PLAN {sql}', parametros).fetchall()
+        except Exception as e:
+            escaneos.append((descripcion, f'no se pudo planificar: {e}'))
+            continue
+        for fila in plan:
+            detalle = fila[-1]
+            # 'SCAN tabla' sin indice = recorrido completo; 'SCAN ... USING INDEX' es aceptable
+            if detalle.startswith('SCAN ') and 'USING' not in detalle:
+                escaneos.append((descripcion, detalle))
+    return escaneos
+
+
+def backfill_columnas_epoch(conn, tabla, pares, tamano_lote=1000, pausa=0.0):
+    """Rellena columnas epoch a partir de sus columnas ISO por rangos de id
+
+    La conversion se hace en Python (a_epoch) porque los timestamps mezclan
+    hora local naive y UTC con 'Z'. Devuelve el numero de filas actualizadas.
+    """
+    id_maximo = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {tabla}").fetchone()[0]
+    origenes = ', '.join(origen for _, origen in pares)
+    asignaciones = ', '.join(f"{epoch} = ?" for epoch, _ in pares)
+    actualizadas = 0
+    desde = 0
+
+    while desde < id_maximo:
+        hasta = desde + tamano_lote
+        filas = conn.execute(
+            f"SELECT id, {origenes} FROM {tabla} WHERE id > ? AND id <= ?", (desde, hasta)
+        ).fetchall()
+        valores = [tuple(a_epoch(v) for v in fila[1:]) + (fila[0],) for fila in filas]
+        with conn:
+            conn.executemany(f"UPDATE {tabla} SET {asignaciones} WHERE id = ?", valores)
+        actualizadas += len(valores)
+        desde = hasta
+        if pausa:
+            time.sleep(pausa)
+
+    return actualizadas
+
+
+def backfill_columnas_promovidas(conn, tamano_lote=1000, pausa=0.0):
+    """Rellena co2_ppm, prediccion_valor, ubicacion y device_id en filas existentes
+
+    Recorre sensor_responses por rangos de id y confirma cada lote por
+    separado para no mantener el bloqueo de escritura mucho tiempo.
+    Devuelve el numero de filas actualizadas.
+    """
+    id_maximo = conn.execute("SELECT COALESCE(MAX(id), 0) FROM sensor_responses").fetchone()[0]
+    actualizadas = 0
+    desde = 0
+
+    while desde < id_maximo:
+        hasta = desde + tamano_lote
+        with conn:
+            cursor = conn.execute('''
+                UPDATE sensor_responses
+                SET co2_ppm = COALESCE(co2_ppm, CASE WHEN json_valid(prediccion_detalle)
+                                  THEN json_extract(prediccion_detalle, '$.co2_ppm') END),
+                    prediccion_valor = COALESCE(prediccion_valor, CASE WHEN json_valid(prediccion_detalle)
+                                  THEN json_extract(prediccion_detalle, '$.prediccion_valor') END),
+                    ubicacion = COALESCE(ubicacion, CASE WHEN json_valid(prediccion_detalle)
+                                  THEN json_extract(prediccion_detalle, '$.ubicacion') END),
+                    device_id = COALESCE(device_id, (SELECT r.device_id FROM sensor_requests r
+                                                     WHERE r.id = sensor_responses.request_id))
+                WHERE id > ? AND id <= ?
+            ''', (desde, hasta))
+            actualizadas += cursor.rowcount
+        desde = hasta
+        if pausa:
+            time.sleep(pausa)
+
+    return actualizadas
@@ -0,0 +1,251 @@
+from esquema_db import (
+    COLUMNAS_PROMOVIDAS_RESPONSES, COLUMNAS_EPOCH,
+    COLUMNAS_DIMENSIONES, INDICES_DIMENSIONES, INDICES_REEMPLAZADOS_DIMENSIONES,
+    columnas_tabla, asegurar_columnas, crear_indices,
+    crear_indices_tablas, backfill_columnas_promovidas, backfill_columnas_epoch
+)
+from resumenes_db import crear_tablas_resumen, reconstruir_resumenes
+from dimensiones_db import crear_tablas_dimensiones, backfill_dimensiones
+from particiones_db import actualizar_particiones, archivo_principal
+from busqueda_alertas import crear_indice_fts
+from contadores_db import crear_contadores
+from ultimas_lecturas import crear_tabla_ultimas, reconstruir_ultimas
+from versiones_modelo import crear_tabla_versiones, backfill_versiones
+from enlaces_alertas import crear_tabla_enlaces, backfill_enlaces
+from salidas_alertas import colapsar_alertas_duplicadas
+from enfriamiento_alertas import crear_tabla_enfriamientos
+
+# El esquema de la BD principal se versiona con PRAGMA user_version.
+# Cada paso es idempotente (se puede repetir si una ejecucion se interrumpe)
+# y se aplica una sola vez: al terminar se guarda su numero como version.
+# Un cambio de esquema nuevo se agrega como un paso nuevo al final de la lista.
+
+
+def _m001_tablas_base(conn):
+    """Tablas base del procesador y del sistema de alertas"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS sensor_requests (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT,
+            device_id TEXT,
+            request_data TEXT,
+            processed_at TEXT,
+            archived INTEGER DEFAULT 0
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS sensor_responses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            request_id INTEGER,
+            calidad_aire_pred TEXT,
+            co2_nivel TEXT,
+            temperature REAL,
+            humedad REAL,
+            presion REAL,
+            importancia_variables TEXT,
+            prediccion_detalle TEXT,
+            created_at TEXT,
+            FOREIGN KEY (request_id) REFERENCES sensor_requests(id)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS archivos_procesados (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nombre_archivo TEXT UNIQUE,
+            fecha_procesado TEXT,
+            procesado INTEGER DEFAULT 1,
+            request_id INTEGER,
+            FOREIGN KEY (request_id) REFERENCES sensor_requests(id)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS alertas_sistema (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            nivel TEXT NOT NULL,
+            tipo TEXT NOT NULL,
+            ubicacion TEXT,
+            mensaje TEXT NOT NULL,
+            datos_adicionales TEXT,
+            procesada INTEGER DEFAULT 0,
+            fecha_procesada TEXT
+        )
+    ''')
+    # Tabla 'alertas' de versiones antiguas, reemplazada por alertas_sistema
+    conn.execute('DROP TABLE IF EXISTS alertas')
+
+
+def _m002_renombrar_temperatura(conn):
+    """BD antiguas guardaban la columna como 'temperatura'"""
+    columnas = columnas_tabla(conn, 'sensor_responses')
+    if 'temperatura' in columnas and 'temperature' not in columnas:
+        conn.execute('ALTER TABLE sensor_responses RENAME COLUMN temperatura TO temperature')
+
+
+def _m003_columnas_promovidas(conn):
+    """co2_ppm, prediccion_valor, ubicacion y device_id como columnas reales"""
+    with conn:
+        agregadas = asegurar_columnas(conn, 'sensor_responses', COLUMNAS_PROMOVIDAS_RESPONSES)
+    if agregadas:
+        backfill_columnas_promovidas(conn)
+
+
+def _m004_columnas_epoch(conn):
+    """Columnas epoch UTC derivadas de los timestamps ISO"""
+    for tabla, pares in COLUMNAS_EPOCH.items():
+        with conn:
+            agregadas = asegurar_columnas(conn, tabla, [(epoch, 'INTEGER') for epoch, _ in pares])
+        if agregadas:
+            backfill_columnas_epoch(conn, tabla, [par for par in pares if par[0] in agregadas])
+
+
+def _m005_tablas_resumen(conn):
+    """Resumenes horario y diario por ubicacion"""
+    with conn:
+        nuevas = crear_tablas_resumen(conn)
+    if nuevas:
+        reconstruir_resumenes(conn)
+
+
+def _m006_indices(conn):
+    """Indices de las consultas frecuentes"""
+    crear_indices_tablas(conn)
+
+
+def _m007_dimensiones(conn):
+    """Dimensiones ubicaciones/dispositivos y sus claves enteras en las tablas de hechos"""
+    with conn:
+        crear_tablas_dimensiones(conn)
+        for tabla, columnas in COLUMNAS_DIMENSIONES.items():
+            asegurar_columnas(conn, tabla, columnas)
+        crear_indices(conn, INDICES_DIMENSIONES)
+        for nombre in INDICES_REEMPLAZADOS_DIMENSIONES:
+            conn.execute(f'DROP INDEX IF EXISTS {nombre}')
+    backfill_dimensiones(conn)
+
+    # Las particiones mensuales ya archivadas reciben las mismas columnas
+    archivo = archivo_principal(conn)
+    if archivo:
+        def migrar_particion(conn, alias):
+            conn.execute(f'DROP INDEX IF EXISTS {alias}.idx_p_responses_ubicacion')
+            backfill_dimensiones(conn, alias)
+        actualizar_particiones(conn, migrar_particion, archivo)
+
+
+def _m008_indice_fts_alertas(conn):
+    """Indice FTS5 de alertas_sistema (se omite si el SQLite no incluye FTS5)"""
+    crear_indice_fts(conn)
+
+
+def _m009_contadores(conn):
+    """Tabla stats_counters mantenida por triggers para las pantallas de estado"""
+    crear_contadores(conn)
+
+
+def _m010_ultimas_lecturas(conn):
+    """Tabla latest_readings con la ultima lectura de cada ubicacion y dispositivo"""
+    if crear_tabla_ultimas(conn):
+        reconstruir_ultimas(conn)
+
+
+def _m011_versiones_modelo(conn):
+    """Importancias de variables una vez por version del modelo (model_versions)"""
+    with conn:
+        crear_tabla_versiones(conn)
+        asegurar_columnas(conn, 'sensor_responses', [('model_version_id', 'INTEGER')])
+    backfill_versiones(conn)
+
+    archivo = archivo_principal(conn)
+    if archivo:
+        actualizar_particiones(conn, backfill_versiones, archivo)
+
+
+def _m012_enlaces_alertas(conn):
+    """Tabla responses_alertas en lugar de las alertas copiadas en prediccion_detalle"""
+    with conn:
+        crear_tabla_enlaces(conn)
+    backfill_enlaces(conn)
+
+    archivo = archivo_principal(conn)
+    if archivo:
+        actualizar_particiones(conn, backfill_enlaces, archivo)
+
+
+def _m013_alertas_duplicadas(conn):
+    """Una sola fila por alerta (antes la ingesta guardaba cada alerta dos veces)"""
+    with conn:
+        colapsar_alertas_duplicadas(conn)
+
+
+def _m014_enfriamiento_alertas(conn):
+    """Tabla alert_cooldowns: deduplicacion de alertas entre procesos y ejecuciones"""
+    with conn:
+        crear_tabla_enfriamientos(conn)
+
+
+# (version, descripcion, paso) en orden
+MIGRACIONES = [
+    (1, 'tablas base', _m001_tablas_base),
+    (2, "renombrar 'temperatura' a 'temperature'", _m002_renombrar_temperatura),
+    (3, 'columnas promovidas de prediccion_detalle', _m003_columnas_promovidas),
+    (4, 'columnas epoch UTC', _m004_columnas_epoch),
+    (5, 'tablas de resumen horario y diario', _m005_tablas_resumen),
+    (6, 'indices de consultas frecuentes', _m006_indices),
+    (7, 'dimensiones ubicaciones y dispositivos', _m007_dimensiones),
+    (8, 'indice de texto completo de alertas', _m008_indice_fts_alertas),
+    (9, 'contadores de filas mantenidos por triggers', _m009_contadores),
+    (10, 'ultima lectura por ubicacion y dispositivo', _m010_ultimas_lecturas),
+    (11, 'versiones del modelo e importancias de variables', _m011_versiones_modelo),
+    (12, 'enlaces entre responses y alertas', _m012_enlaces_alertas),
+    (13, 'alertas duplicadas de la ingesta', _m013_alertas_duplicadas),
+    (14, 'enfriamiento de alertas compartido', _m014_enfriamiento_alertas),
+]
+
+VERSION_ESQUEMA = MIGRACIONES[-1][0]
+
+
+def version_esquema(conn):
+    """Version del esquema guardada en la BD (0 = sin migrar)"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrar(conn, mostrar=True):
+    """Aplica en orden las migraciones pendientes; devuelve las versiones aplicadas
+
+    Si la BD ya esta en la version actual solo se lee PRAGMA user_version.
+    """
+    actual = version_esquema(conn)
+    if actual > VERSION_ESQUEMA:
+        raise RuntimeError(f"La BD tiene la version de esquema {actual}, "
+                           f"mas nueva que la soportada ({VERSION_ESQUEMA})")
+
+    aplicadas = []
+    for version, descripcion, paso in MIGRACIONES:
+        if version <= actual:
+            continue
+        paso(conn)
+        conn.commit()
+        # PRAGMA no admite parametros; version es un entero de la lista
+        conn.execute(f'PRAGMA user_version = {version}')
+        aplicadas.append(version)
+        if mostrar:
+            print(f"  [DB] Migracion {version} aplicada: {descripcion}")
+    return aplicadas
+
+
+def main():
+    """Migra la base de datos principal y muestra la version del esquema"""
+    from conexion_db import obtener_conexion
+
+    conn = obtener_conexion(crear=False)
+    if conn is None:
+        print("Base de datos no encontrada")
+        return
+
+    print(f"Version de esquema: {version_esquema(conn)} (actual: {VERSION_ESQUEMA})")
+    if not migrar(conn):
+        print("  El esquema ya esta al dia")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,7 @@ from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
 import json
 from datetime import datetime, timedelta
+from clasificacion_calidad import CATEGORIAS_PREDICCION, codigo_prediccion
 
 class ModeloCalidadAire:
     def __init__(self, modelo_path='models/modelo_calidad_aire.pkl'):
@@ -16,6 +17,10 @@ class ModeloCalidadAire:
         self.modelo = None
         self.scaler = StandardScaler()
         self.feature_names = None
+        # Importancias globales del modelo (feature_importances_): se calculan al
+        # cargar o entrenar y predecir devuelve siempre el mismo dict
+        self.importancias = None
+        self.fecha_entrenamiento = None
         
     def generar_datos_entrenamiento(self, n_samples=1000):
         """Genera datos de entrenamiento realistas basados en patrones conocidos"""
@@ -108,6 +113,8 @@ class ModeloCalidadAire:
         
         # Calcular importancia de caracteristicas
         importancias = dict(zip(self.feature_names, self.modelo.feature_importances_))
+        self.importancias = importancias
+        self.fecha_entrenamiento = datetime.now().isoformat()
         print("\nImportancia de caracteristicas:")
         for feature, importancia in sorted(importancias.items(), key=lambda x: x[1], reverse=True):
             print(f"  {feature}: {importancia:.4f}")
@@ -123,7 +130,7 @@ class ModeloCalidadAire:
             # Guardar metadata del modelo
             metadata = {
                 'feature_names': self.feature_names,
-                'fecha_entrenamiento': datetime.now().isoformat(),
+                'fecha_entrenamiento': self.fecha_entrenamiento,
                 'train_score': float(train_score),
                 'test_score': float(test_score),
                 'parametros': {
@@ -155,8 +162,10 @@ class ModeloCalidadAire:
                 with open(metadata_path, 'r') as f:
                     metadata = json.load(f)
                     self.feature_names = metadata.get('feature_names', [])
+                    self.fecha_entrenamiento = metadata.get('fecha_entrenamiento')
             else:
                 self.feature_names = ['co2', 'temperatura', 'humedad', 'presion', 'hora_dia', 'dia_semana']
+            self.importancias = dict(zip(self.feature_names, self.modelo.feature_importances_))
             
             print("Modelo cargado exitosamente")
             return True
@@ -192,28 +201,16 @@ class ModeloCalidadAire:
         # Convertir prediccion a categoria de calidad del aire
         categoria = self._clasificar_prediccion(prediccion)
         
-        # Calcular importancia de caracteristicas para esta prediccion
-        importancias = dict(zip(self.feature_names, self.modelo.feature_importances_))
-        
         return {
             'valor_prediccion': float(prediccion),
             'categoria': categoria,
-            'importancia_caracteristicas': importancias,
+            'importancia_caracteristicas': self.importancias,  # globales del modelo, no de la prediccion
             'caracteristicas_utilizadas': self.feature_names
         }
     
     def _clasificar_prediccion(self, valor):
         """Convierte valor numerico a categoria de calidad del aire"""
-        if valor < 0.2:
-            return "Excelente"
-        elif valor < 0.4:
-            return "Buena"
-        elif valor < 0.6:
-            return "Moderada"
-        elif valor < 0.8:
-            return "Deficiente"
-        else:
-            return "Peligrosa"
+        return CATEGORIAS_PREDICCION[codigo_prediccion(valor)]
     
     def probar_prediccion(self):
         """Prueba el modelo con datos de ejemplo"""
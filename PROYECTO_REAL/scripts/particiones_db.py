@@ -0,0 +1,417 @@
+import os
+import re
+import calendar
+from datetime import datetime, timezone
+from conexion_db import obtener_conexion, ruta_db
+from tiempo_utc import epoch_ahora
+from esquema_db import existe_tabla
+from contadores_db import (
+    TABLA_CONTADORES, TABLAS_CON_PARTICIONES, conteos_tablas, leer_contadores,
+    fijar_contadores, restar_contadores
+)
+
+# Directorio de los archivos mensuales (relativo a la BD principal)
+DIRECTORIO_PARTICIONES = 'particiones'
+
+# Tablas que se mueven a las particiones (se parte por sensor_responses.created_at_epoch;
+# cada sensor_requests sigue a su response a traves de request_id)
+TABLAS_PARTICIONADAS = ('sensor_responses', 'sensor_requests')
+
+INDICES_PARTICION = [
+    ('idx_p_responses_created', 'sensor_responses(created_at_epoch)'),
+    ('idx_p_responses_request', 'sensor_responses(request_id)'),
+    ('idx_p_responses_ubicacion_id', 'sensor_responses(ubicacion_id, created_at_epoch)'),
+]
+
+# SQLite permite 10 bases adjuntas por defecto; se deja margen para otros usos
+MAX_ADJUNTAS = 8
+
+
+def directorio_particiones(db_path=None):
+    """Directorio donde viven los archivos mensuales"""
+    return os.path.join(os.path.dirname(ruta_db(db_path)), DIRECTORIO_PARTICIONES)
+
+
+def ruta_particion(mes, db_path=None):
+    """Ruta del archivo de la particion 'YYYY-MM'"""
+    return os.path.join(directorio_particiones(db_path), f"calidad_aire_{mes.replace('-', '_')}.db")
+
+
+def limites_mes(mes):
+    """Epoch UTC [inicio, fin) del mes 'YYYY-MM'"""
+    anio, numero = (int(parte) for parte in mes.split('-'))
+    inicio = calendar.timegm((anio, numero, 1, 0, 0, 0))
+    if numero == 12:
+        fin = calendar.timegm((anio + 1, 1, 1, 0, 0, 0))
+    else:
+        fin = calendar.timegm((anio, numero + 1, 1, 0, 0, 0))
+    return inicio, fin
+
+
+def crear_catalogo(conn):
+    """Tabla de la BD principal que describe cada particion archivada"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS particiones_catalogo (
+            mes TEXT PRIMARY KEY,
+            archivo TEXT NOT NULL,
+            desde_epoch INTEGER NOT NULL,
+            hasta_epoch INTEGER NOT NULL,
+            filas_responses INTEGER DEFAULT 0,
+            filas_requests INTEGER DEFAULT 0,
+            id_request_min INTEGER,
+            id_request_max INTEGER,
+            fecha_archivado TEXT
+        )
+    ''')
+
+
+def _columnas(conn, esquema, tabla):
+    return [fila[1] for fila in conn.execute(f'PRAGMA {esquema}.table_info({tabla})').fetchall()]
+
+
+def _alinear_columnas(conn, alias):
+    """Agrega a la particion las columnas que la BD principal gano despues de crearla"""
+    for tabla in TABLAS_PARTICIONADAS:
+        existentes = set(_columnas(conn, alias, tabla))
+        for _, nombre, tipo, *_ in conn.execute(f'PRAGMA main.table_info({tabla})').fetchall():
+            if nombre not in existentes:
+                conn.execute(f'ALTER TABLE {alias}.{tabla} ADD COLUMN {nombre} {tipo}')
+
+
+def _crear_tablas_particion(conn, alias):
+    """Crea en la particion las tablas con el mismo esquema que la BD principal"""
+    for tabla in TABLAS_PARTICIONADAS:
+        sql = conn.execute(
+            "SELECT sql FROM main.sqlite_master WHERE type='table' AND name=?", (tabla,)
+        ).fetchone()[0]
+        sql = re.sub(r'^\s*CREATE\s+TABLE\s+"?\w+"?', f'CREATE TABLE IF NOT EXISTS {alias}.{tabla}', sql, count=1)
+        conn.execute(sql)
+    _alinear_columnas(conn, alias)
+    for nombre, definicion in INDICES_PARTICION:
+        conn.execute(f'CREATE INDEX IF NOT EXISTS {alias}.{nombre} ON {definicion}')
+
+
+def archivar_mes(conn, mes, db_path=None):
+    """Mueve los requests/responses de un mes cerrado a su archivo mensual
+
+    Copia las filas que aun no estan en la particion (se puede repetir si
+    se interrumpe a mitad de camino), comprueba que cada fila del mes quedo
+    en ella con la misma clave y solo entonces la borra de la BD principal.
+    Si un id ya existe en la particion con otro contenido (p. ej. la BD se
+    recreo y AUTOINCREMENT volvio a 1) lanza RuntimeError sin mover nada.
+    Devuelve el numero de responses movidos.
+    """
+    desde, hasta = limites_mes(mes)
+    ruta = ruta_particion(mes, db_path)
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    alias = 'archivo_' + mes.replace('-', '_')
+
+    conn.commit()  # ATTACH no se permite dentro de una transaccion
+    conn.execute('ATTACH DATABASE ? AS ' + alias, (ruta,))
+    try:
+        # Solo surte efecto en un archivo nuevo (antes de crear tablas): la
+        # retencion vacia payloads de las particiones y el vacuum incremental
+        # devuelve ese espacio (ver retencion.vacuum_incremental_total)
+        conn.execute(f'PRAGMA {alias}.auto_vacuum = INCREMENTAL')
+        _crear_tablas_particion(conn, alias)
+        rango = (desde, hasta)
+        contadores = existe_tabla(conn, TABLA_CONTADORES)
+        # Filas del mes en main y si su copia en la particion coincide
+        en_rango = 'r.created_at_epoch >= ? AND r.created_at_epoch < ?'
+        resp_copiado = (f'EXISTS (SELECT 1 FROM {alias}.sensor_responses p WHERE p.id = r.id '
+                        f'AND p.created_at_epoch = r.created_at_epoch AND p.request_id IS r.request_id)')
+        req_del_mes = f'q.id IN (SELECT r.request_id FROM main.sensor_responses r WHERE {en_rango})'
+        req_copiado = (f'EXISTS (SELECT 1 FROM {alias}.sensor_requests p WHERE p.id = q.id '
+                       f'AND p.timestamp IS q.timestamp AND p.device_id IS q.device_id)')
+        with conn:
+            # Los contadores son totales con particiones: se leen dentro de la
+            # transaccion y se restauran tras los DELETE (sus triggers restan)
+            antes = leer_contadores(conn) if contadores else None
+            # Solo columnas comunes: la particion pudo crearse con un esquema anterior
+            cols_resp = ', '.join(c for c in _columnas(conn, alias, 'sensor_responses')
+                                  if c in _columnas(conn, 'main', 'sensor_responses'))
+            cols_req = ', '.join(c for c in _columnas(conn, alias, 'sensor_requests')
+                                 if c in _columnas(conn, 'main', 'sensor_requests'))
+            conn.execute(f'''
+                INSERT INTO {alias}.sensor_responses ({cols_resp})
+                SELECT {cols_resp} FROM main.sensor_responses r
+                WHERE {en_rango}
+                  AND NOT EXISTS (SELECT 1 FROM {alias}.sensor_responses p WHERE p.id = r.id)
+            ''', rango)
+            conn.execute(f'''
+                INSERT INTO {alias}.sensor_requests ({cols_req})
+                SELECT {cols_req} FROM main.sensor_requests q
+                WHERE {req_del_mes}
+                  AND NOT EXISTS (SELECT 1 FROM {alias}.sensor_requests p WHERE p.id = q.id)
+            ''', rango)
+
+            total_resp, movidos = conn.execute(
+                f'SELECT COUNT(*), COUNT(*) FILTER (WHERE {resp_copiado}) FROM main.sensor_responses r WHERE {en_rango}',
+                rango).fetchone()
+            total_req, copiados_req = conn.execute(
+                f'SELECT COUNT(*), COUNT(*) FILTER (WHERE {req_copiado}) FROM main.sensor_requests q WHERE {req_del_mes}',
+                rango).fetchone()
+            if movidos != total_resp or copiados_req != total_req:
+                # Sale del with: la transaccion se revierte en ambos archivos
+                raise RuntimeError(
+                    f"Particion {mes}: {total_resp - movidos} responses y {total_req - copiados_req} "
+                    f"requests chocan con ids distintos ya guardados en {os.path.basename(ruta)}")
+
+            conn.execute(f'DELETE FROM main.sensor_requests AS q WHERE {req_del_mes} AND {req_copiado}', rango)
+            conn.execute(f'DELETE FROM main.sensor_responses AS r WHERE {en_rango} AND {resp_copiado}', rango)
+            if antes is not None:
+                fijar_contadores(conn, antes)
+
+            filas_resp = conn.execute(f'SELECT COUNT(*) FROM {alias}.sensor_responses').fetchone()[0]
+            filas_req, id_min, id_max = conn.execute(
+                f'SELECT COUNT(*), MIN(id), MAX(id) FROM {alias}.sensor_requests').fetchone()
+            conn.execute('''
+                INSERT OR REPLACE INTO particiones_catalogo
+                (mes, archivo, desde_epoch, hasta_epoch, filas_responses, filas_requests,
+                 id_request_min, id_request_max, fecha_archivado)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (mes, os.path.basename(ruta), desde, hasta, filas_resp, filas_req,
+                  id_min, id_max, datetime.now().isoformat()))
+    finally:
+        conn.execute('DETACH DATABASE ' + alias)
+    return movidos
+
+
+def archivar_meses_cerrados(conn=None, meses_calientes=1, db_path=None):
+    """Archiva en particiones mensuales todos los meses anteriores a los 'calientes'
+
+    meses_calientes=1 deja en la BD principal solo el mes en curso.
+    Devuelve {mes: responses movidos}; un mes que no se pudo mover no aparece.
+    """
+    conn = conn or obtener_conexion(db_path)
+    crear_catalogo(conn)
+
+    ahora = datetime.fromtimestamp(epoch_ahora(), tz=timezone.utc)
+    anio, mes = ahora.year, ahora.month - (meses_calientes - 1)
+    while mes < 1:
+        anio, mes = anio - 1, mes + 12
+    limite, _ = limites_mes(f'{anio:04d}-{mes:02d}')
+
+    meses = [fila[0] for fila in conn.execute('''
+        SELECT DISTINCT strftime('%Y-%m', created_at_epoch, 'unixepoch')
+        FROM sensor_responses
+        WHERE created_at_epoch < ?
+        ORDER BY 1
+    ''', (limite,)).fetchall()]
+
+    movidos = {}
+    for mes in meses:
+        try:
+            movidos[mes] = archivar_mes(conn, mes, db_path)
+        except RuntimeError as e:
+            print(f"  [ERROR] {e}; el mes queda en la BD principal")
+    return movidos
+
+
+def eliminar_particion(conn, mes, db_path=None):
+    """Descarta un mes completo en O(1): borra su archivo y su entrada de catalogo
+
+    Los resumenes horario/diario se conservan en la BD principal.
+    """
+    ruta = ruta_particion(mes, db_path)
+    alias = 'particion_' + mes.replace('-', '_')
+    if alias in [fila[1] for fila in conn.execute('PRAGMA database_list').fetchall()]:
+        conn.execute('DETACH DATABASE ' + alias)
+    # Sus filas salen de los contadores (totales con particiones)
+    conteos = {}
+    if existe_tabla(conn, TABLA_CONTADORES) and os.path.exists(ruta):
+        conn.commit()
+        conn.execute('ATTACH DATABASE ? AS ' + alias, (ruta,))
+        try:
+            conteos = conteos_tablas(conn, TABLAS_CON_PARTICIONES, alias)
+        finally:
+            conn.execute('DETACH DATABASE ' + alias)
+    with conn:
+        conn.execute('DELETE FROM particiones_catalogo WHERE mes = ?', (mes,))
+        restar_contadores(conn, conteos)
+    for sufijo in ('', '-wal', '-shm'):
+        if os.path.exists(ruta + sufijo):
+            os.remove(ruta + sufijo)
+
+
+def archivo_principal(conn):
+    """Ruta del archivo de la BD principal de la conexion (vacia si es una BD en memoria)"""
+    for _, nombre, archivo in conn.execute('PRAGMA database_list').fetchall():
+        if nombre == 'main':
+            return archivo
+    return ''
+
+
+def aplicar_en_particiones(conn, funcion, db_path=None):
+    """Adjunta cada particion del catalogo, aplica funcion(conn, alias) y la suelta
+
+    Devuelve la lista de resultados. No alinea el esquema de la particion
+    (ver actualizar_particiones); no se puede llamar dentro de una transaccion.
+    """
+    if not existe_tabla(conn, 'particiones_catalogo'):
+        return []
+    conn.commit()  # ATTACH no se permite dentro de una transaccion
+    resultados = []
+    for mes, archivo in conn.execute('SELECT mes, archivo FROM particiones_catalogo').fetchall():
+        ruta = os.path.join(directorio_particiones(db_path), archivo)
+        if not os.path.exists(ruta):
+            continue
+        alias = 'mantenimiento_' + mes.replace('-', '_')
+        conn.execute('ATTACH DATABASE ? AS ' + alias, (ruta,))
+        try:
+            resultados.append(funcion(conn, alias))
+        finally:
+            conn.execute('DETACH DATABASE ' + alias)
+    return resultados
+
+
+def actualizar_particiones(conn, funcion, db_path=None):
+    """Alinea el esquema de cada particion con la BD principal y aplica funcion(conn, alias)
+
+    Lo usan las migraciones que agregan columnas a las tablas particionadas.
+    Devuelve el numero de particiones actualizadas.
+    """
+    crear_catalogo(conn)
+
+    def actualizar(conn, alias):
+        _crear_tablas_particion(conn, alias)
+        funcion(conn, alias)
+        conn.commit()
+
+    return len(aplicar_en_particiones(conn, actualizar, db_path))
+
+
+def listar_particiones(conn):
+    """Particiones archivadas, de la mas reciente a la mas antigua"""
+    crear_catalogo(conn)
+    return conn.execute('''
+        SELECT mes, archivo, desde_epoch, hasta_epoch, filas_responses, filas_requests,
+               id_request_min, id_request_max
+        FROM particiones_catalogo
+        ORDER BY mes DESC
+    ''').fetchall()
+
+
+class RouterParticiones:
+    """Dirige las lecturas a la BD principal y a las particiones mensuales necesarias.
+
+    Las consultas se escriben con '{esquema}' delante de cada tabla
+    particionada (p. ej. 'FROM {esquema}.sensor_responses') y se ejecutan
+    una vez por fuente: primero la BD principal (meses recientes) y luego
+    las particiones que solapan el rango pedido, de la mas nueva a la mas
+    vieja. Las particiones se adjuntan bajo demanda y se reutilizan.
+    """
+
+    def __init__(self, conn, db_path=None):
+        self.conn = conn
+        self.db_path = db_path
+        self._adjuntas = {}  # mes -> alias, en orden de uso
+        crear_catalogo(conn)
+
+    def _adjuntar(self, mes, archivo):
+        # La conexion es compartida: otro router pudo adjuntar o soltar la particion
+        adjuntas = [fila[1] for fila in self.conn.execute('PRAGMA database_list').fetchall()
+                    if fila[1].startswith('particion_')]
+        alias = 'particion_' + mes.replace('-', '_')
+        self._adjuntas.pop(mes, None)
+        if alias not in adjuntas:
+            if len(adjuntas) >= MAX_ADJUNTAS:
+                propias = [a for a in self._adjuntas.values() if a in adjuntas]
+                victima = propias[0] if propias else adjuntas[0]
+                self.conn.execute('DETACH DATABASE ' + victima)
+            ruta = os.path.join(directorio_particiones(self.db_path), archivo)
+            self.conn.execute('ATTACH DATABASE ? AS ' + alias, (ruta,))
+        self._adjuntas[mes] = alias
+        return alias
+
+    def particiones(self, desde=None, hasta=None):
+        """Meses archivados que solapan [desde, hasta) (epoch; None = abierto)"""
+        sql = 'SELECT mes, archivo FROM particiones_catalogo WHERE 1 = 1'
+        parametros = []
+        if desde is not None:
+            sql += ' AND hasta_epoch > ?'
+            parametros.append(desde)
+        if hasta is not None:
+            sql += ' AND desde_epoch < ?'
+            parametros.append(hasta)
+        return self.conn.execute(sql + ' ORDER BY mes DESC', parametros).fetchall()
+
+    def _fuentes(self, desde=None, hasta=None):
+        yield 'main'
+        for mes, archivo in self.particiones(desde, hasta):
+            yield self._adjuntar(mes, archivo)
+
+    def consultar(self, sql, parametros=(), desde=None, hasta=None):
+        """Ejecuta la consulta en cada fuente que solapa el rango y concatena
+
+        Devuelve (columnas, filas).
+        """
+        columnas, filas = [], []
+        for esquema in self._fuentes(desde, hasta):
+            cursor = self.conn.execute(sql.format(esquema=esquema), parametros)
+            columnas = [d[0] for d in cursor.description]
+            filas.extend(cursor.fetchall())
+        return columnas, filas
+
+    def consultar_recientes(self, sql, parametros=(), limite=10):
+        """Ultimas N filas: la consulta debe ordenar por tiempo DESC y terminar en 'LIMIT ?'
+
+        Recorre las fuentes de la mas nueva a la mas vieja y se detiene en
+        cuanto junta N filas, sin adjuntar particiones innecesarias.
+        """
+        columnas, filas = [], []
+        for esquema in self._fuentes():
+            cursor = self.conn.execute(sql.format(esquema=esquema),
+                                       tuple(parametros) + (limite - len(filas),))
+            columnas = [d[0] for d in cursor.description]
+            filas.extend(cursor.fetchall())
+            if len(filas) >= limite:
+                break
+        return columnas, filas
+
+    def buscar_request(self, sql, request_id):
+        """Busca un request por id en la BD principal o en la particion que lo contiene"""
+        fila = self.conn.execute(sql.format(esquema='main'), (request_id,)).fetchone()
+        if fila is not None:
+            return fila
+        for mes, archivo in self.conn.execute('''
+            SELECT mes, archivo FROM particiones_catalogo
+            WHERE id_request_min <= ? AND id_request_max >= ?
+        ''', (request_id, request_id)).fetchall():
+            esquema = self._adjuntar(mes, archivo)
+            fila = self.conn.execute(sql.format(esquema=esquema), (request_id,)).fetchone()
+            if fila is not None:
+                return fila
+        return None
+
+    def cerrar(self):
+        """Desadjunta las particiones que siguen adjuntas"""
+        adjuntas = {fila[1] for fila in self.conn.execute('PRAGMA database_list').fetchall()}
+        for alias in self._adjuntas.values():
+            if alias in adjuntas:
+                self.conn.execute('DETACH DATABASE ' + alias)
+        self._adjuntas.clear()
+
+
+def main():
+    """Archiva los meses cerrados y muestra el catalogo de particiones"""
+    conn = obtener_conexion(crear=False)
+    if conn is None:
+        print("Base de datos no encontrada")
+        return
+
+    print("ARCHIVANDO MESES CERRADOS EN PARTICIONES MENSUALES")
+    print("-" * 60)
+    movidos = archivar_meses_cerrados(conn)
+    if not movidos:
+        print("No hay meses cerrados pendientes de archivar")
+    for mes, cantidad in movidos.items():
+        print(f"  [DB] {mes}: {cantidad} responses movidos a {os.path.basename(ruta_particion(mes))}")
+
+    print("\nPARTICIONES:")
+    for mes, archivo, _, _, filas_resp, filas_req, _, _ in listar_particiones(conn):
+        print(f"  {mes}  {archivo}  responses: {filas_resp}  requests: {filas_req}")
+
+
+if __name__ == "__main__":
+    main()
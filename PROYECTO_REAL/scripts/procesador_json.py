@@ -3,9 +3,15 @@ import json
 import pandas as pd
 import numpy as np
 from datetime import datetime
-import sqlite3
 import shutil
 from modelo_mejorado import ModeloCalidadAire
+from validador_payload import ValidadorPayload
+from conexion_db import RUTA_DB_DEFECTO
+from almacenamiento import AlmacenamientoSQLite
+from tiempo_utc import a_epoch
+from clasificacion_calidad import (
+    CATEGORIAS_CALIDAD, NIVELES_CO2, RECOMENDACIONES, codigo_co2, codigo_categoria
+)
 
 # Importar sistema de alertas
 try:
@@ -16,16 +22,23 @@ except ImportError:
     print("Advertencia: Sistema de alertas no disponible. Ejecute sin alertas.")
 
 class ProcesadorCalidadAire:
-    def __init__(self, config_path='../config/config.json'):
-        """Inicializa el procesador de calidad del aire"""
+    def __init__(self, config_path='../config/config.json', almacenamiento=None):
+        """Inicializa el procesador de calidad del aire
+
+        almacenamiento: motor de persistencia (ver almacenamiento.py); por
+        defecto la BD SQLite de la configuracion.
+        """
         self.proyecto_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
         self.config = self._cargar_configuracion(config_path)
         self.modelo_ml = ModeloCalidadAire()  # Usar el nuevo modelo mejorado
         self.modelo_cargado = False
+        self._version_modelo = None  # (importancias del modelo, id en model_versions)
+        self.validador = ValidadorPayload()  # Esquema compilado una sola vez
+        self.almacenamiento = almacenamiento or AlmacenamientoSQLite(self.config['database_path'])
         
-        # Inicializar sistema de alertas si esta disponible
+        # Inicializar sistema de alertas si esta disponible (mismo almacenamiento)
         if SISTEMA_ALERTAS_DISPONIBLE:
-            self.sistema_alertas = SistemaAlertas()
+            self.sistema_alertas = SistemaAlertas(almacenamiento=self.almacenamiento)
             print("Sistema de alertas inicializado")
         else:
             self.sistema_alertas = None
@@ -40,318 +53,62 @@ class ProcesadorCalidadAire:
                 
                 # Convertir estructura a la esperada por el procesador
                 return {
-                    "database_path": config_data.get('paths', {}).get('database', 'data/database/calidad_aire.db'),
+                    "database_path": config_data.get('paths', {}).get('database', RUTA_DB_DEFECTO),
                     "model_path": "models/random_forest_model.pkl",
                     "raw_data_path": config_data.get('paths', {}).get('input_dir', 'data/raw_json'),
                     "processed_path": config_data.get('paths', {}).get('output_dir', 'data/processed'),
                     "archive_path": "data/archive",
+                    "rejected_path": "data/rejected",
                     "umbral_co2_alto": 800,
                     "umbral_co2_critico": 1200
                 }
         else:
             # Configuracion por defecto
             return {
-                "database_path": "data/database/calidad_aire.db",
+                "database_path": RUTA_DB_DEFECTO,
                 "model_path": "models/random_forest_model.pkl",
                 "raw_data_path": "data/raw_json",
                 "processed_path": "data/processed",
                 "archive_path": "data/archive",
+                "rejected_path": "data/rejected",
                 "umbral_co2_alto": 800,
                 "umbral_co2_critico": 1200
             }
     
-    def conectar_db(self):
-        """Conecta a la base de datos SQLite"""
-        db_path = os.path.join(self.proyecto_root, self.config['database_path'])
-        os.makedirs(os.path.dirname(db_path), exist_ok=True)
-        return sqlite3.connect(db_path)
-    
     def crear_tablas(self):
-        """Crea las tablas necesarias en la base de datos - USANDO ESTRUCTURA REAL"""
-        with self.conectar_db() as conn:
-            cursor = conn.cursor()
-            
-            # PRIMERO: Verificar si las tablas existen y tienen la estructura correcta
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-            tablas_existentes = [row[0] for row in cursor.fetchall()]
-            
-            # Tabla sensor_requests (YA EXISTE)
-            if 'sensor_requests' not in tablas_existentes:
-                cursor.execute('''
-                    CREATE TABLE sensor_requests (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        timestamp TEXT,
-                        device_id TEXT,
-                        request_data TEXT,
-                        processed_at TEXT,
-                        archived INTEGER DEFAULT 0
-                    )
-                ''')
-                print("  [DB] Tabla sensor_requests creada")
-            else:
-                # Verificar columnas de sensor_requests
-                cursor.execute("PRAGMA table_info(sensor_requests)")
-                columnas = [col[1] for col in cursor.fetchall()]
-                columnas_requeridas = ['id', 'timestamp', 'device_id', 'request_data', 'processed_at', 'archived']
-                for col in columnas_requeridas:
-                    if col not in columnas:
-                        print(f"  [ADVERTENCIA] Columna {col} no encontrada en sensor_requests")
-            
-            # Tabla sensor_responses (YA EXISTE) - ¡VERIFICAR NOMBRES DE COLUMNAS!
-            if 'sensor_responses' not in tablas_existentes:
-                cursor.execute('''
-                    CREATE TABLE sensor_responses (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        request_id INTEGER,
-                        calidad_aire_pred TEXT,
-                        co2_nivel TEXT,
-                        temperature REAL,
-                        humedad REAL,
-                        presion REAL,
-                        importancia_variables TEXT,
-                        prediccion_detalle TEXT,
-                        created_at TEXT,
-                        FOREIGN KEY (request_id) REFERENCES sensor_requests(id)
-                    )
-                ''')
-                print("  [DB] Tabla sensor_responses creada")
-            else:
-                # Verificar columnas de sensor_responses
-                cursor.execute("PRAGMA table_info(sensor_responses)")
-                columnas = cursor.fetchall()
-                nombres_columnas = [col[1] for col in columnas]
-                print(f"  [DB] Columnas de sensor_responses: {nombres_columnas}")
-                
-                # Verificar si 'temperature' existe (puede estar como 'temperatura')
-                if 'temperature' not in nombres_columnas and 'temperatura' in nombres_columnas:
-                    print("  [INFO] La tabla tiene 'temperatura' en lugar de 'temperature'")
-            
-            # Tabla archivos_procesados (YA EXISTE)
-            if 'archivos_procesados' not in tablas_existentes:
-                cursor.execute('''
-                    CREATE TABLE archivos_procesados (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        nombre_archivo TEXT UNIQUE,
-                        fecha_procesado TEXT,
-                        procesado INTEGER DEFAULT 1,
-                        request_id INTEGER,
-                        FOREIGN KEY (request_id) REFERENCES sensor_requests(id)
-                    )
-                ''')
-                print("  [DB] Tabla archivos_procesados creada")
-            
-            # Tabla alertas_sistema (YA EXISTE)
-            if 'alertas_sistema' not in tablas_existentes:
-                cursor.execute('''
-                    CREATE TABLE alertas_sistema (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        timestamp TEXT NOT NULL,
-                        nivel TEXT NOT NULL,
-                        tipo TEXT NOT NULL,
-                        ubicacion TEXT,
-                        mensaje TEXT NOT NULL,
-                        datos_adicionales TEXT,
-                        procesada INTEGER DEFAULT 0,
-                        fecha_procesada TEXT
-                    )
-                ''')
-                print("  [DB] Tabla alertas_sistema creada")
-            
-            conn.commit()
-    
-    def verificar_estructura_tablas(self):
-        """Verifica que las tablas tengan la estructura correcta"""
-        with self.conectar_db() as conn:
-            cursor = conn.cursor()
-            
-            # Verificar sensor_responses específicamente
-            cursor.execute("PRAGMA table_info(sensor_responses)")
-            columnas = cursor.fetchall()
-            nombres_columnas = [col[1] for col in columnas]
-            
-            print("\n[DB] Verificando estructura de tablas:")
-            print(f"  sensor_responses columns: {nombres_columnas}")
-            
-            # Verificar si necesitamos renombrar columnas
-            columnas_requeridas = ['id', 'request_id', 'calidad_aire_pred', 'co2_nivel', 
-                                  'temperature', 'humedad', 'presion', 'importancia_variables', 
-                                  'prediccion_detalle', 'created_at']
-            
-            # Verificar cada columna requerida
-            for col in columnas_requeridas:
-                if col not in nombres_columnas:
-                    print(f"  [ADVERTENCIA] Columna '{col}' no encontrada en sensor_responses")
-                    
-                    # Si falta 'temperature' pero existe 'temperatura', renombrar
-                    if col == 'temperature' and 'temperatura' in nombres_columnas:
-                        try:
-                            cursor.execute('ALTER TABLE sensor_responses RENAME COLUMN temperatura TO temperature')
-                            print(f"  [DB] Columna renombrada: 'temperatura' -> 'temperature'")
-                            conn.commit()
-                        except:
-                            print(f"  [ERROR] No se pudo renombrar columna")
-            
-            return True
+        """Crea o migra la estructura del almacenamiento y muestra sus advertencias"""
+        for advertencia in self.almacenamiento.preparar():
+            print(f"  [ADVERTENCIA] {advertencia}")
     
     def archivo_ya_procesado(self, nombre_archivo):
         """Verifica si un archivo ya fue procesado usando archivos_procesados"""
-        with self.conectar_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT id, fecha_procesado 
-                FROM archivos_procesados 
-                WHERE nombre_archivo = ? AND procesado = 1
-            ''', (nombre_archivo,))
-            resultado = cursor.fetchone()
-            
-            if resultado:
-                print(f"  [INFO] Archivo {nombre_archivo} ya fue procesado el {resultado[1]}")
-                return resultado[0]  # Devuelve el ID si existe
-            
-            return None  # No ha sido procesado
+        resultado = self.almacenamiento.archivo_procesado(nombre_archivo)
+        
+        if resultado:
+            print(f"  [INFO] Archivo {nombre_archivo} ya fue procesado el {resultado[1]}")
+            return resultado[0]  # Devuelve el ID si existe
+        
+        return None  # No ha sido procesado
     
     def registrar_archivo_procesado(self, nombre_archivo, request_id):
         """Registra que un archivo ha sido procesado - ACTUALIZA 'procesado' y 'fecha_procesado'"""
-        with self.conectar_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT OR REPLACE INTO archivos_procesados 
-                (nombre_archivo, fecha_procesado, procesado, request_id)
-                VALUES (?, ?, ?, ?)
-            ''', (nombre_archivo, datetime.now().isoformat(), 1, request_id))
-            conn.commit()
-            print(f"  [DB] Archivo registrado como procesado en archivos_procesados")
+        self.almacenamiento.registrar_archivos_procesados([(nombre_archivo, request_id)])
+        print(f"  [DB] Archivo registrado como procesado en archivos_procesados")
     
     def actualizar_request_como_procesado(self, request_id):
         """Actualiza el request con fecha de procesamiento - ACTUALIZA 'processed_at'"""
-        with self.conectar_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                UPDATE sensor_requests 
-                SET processed_at = ?, archived = 1
-                WHERE id = ?
-            ''', (datetime.now().isoformat(), request_id))
-            conn.commit()
-            print(f"  [DB] Request {request_id} actualizado con processed_at")
-    
-    def registrar_alerta_en_db(self, alerta_data):
-        """Registra una alerta en la base de datos - VERSION CORREGIDA"""
-        if not self.sistema_alertas:
-            return None
-        
-        with self.conectar_db() as conn:
-            cursor = conn.cursor()
-            
-            # CORRECCION: Guardar con procesada=0 (consistente con sistema_alertas.py)
-            cursor.execute('''
-                INSERT INTO alertas_sistema 
-                (timestamp, nivel, tipo, ubicacion, mensaje, datos_adicionales, procesada, fecha_procesada)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                alerta_data.get('timestamp', datetime.now().isoformat()),
-                alerta_data.get('nivel', 'INFO'),
-                alerta_data.get('tipo', 'GENERAL'),
-                alerta_data.get('ubicacion', 'Desconocida'),
-                alerta_data.get('mensaje', ''),
-                json.dumps(alerta_data.get('datos_adicionales', {})),
-                0,  # procesada = 0 (consistente con sistema_alertas.py)
-                None  # fecha_procesada = NULL inicialmente
-            ))
-            
-            alerta_id = cursor.lastrowid
-            conn.commit()
-            print(f"  [DB] Alerta registrada (ID: {alerta_id}) con procesada=0")
-            
-            # Ahora marcar como procesada
-            self.marcar_alerta_como_procesada(alerta_id)
-            
-            return alerta_id
-    
-    def marcar_alerta_como_procesada(self, alerta_id):
-        """Marca una alerta como procesada - ACTUALIZA 'procesada' y 'fecha_procesada'"""
-        with self.conectar_db() as conn:
-            cursor = conn.cursor()
-            
-            # Obtener datos actuales para actualizar
-            cursor.execute('SELECT datos_adicionales FROM alertas_sistema WHERE id = ?', (alerta_id,))
-            resultado = cursor.fetchone()
-            
-            datos_adicionales = {}
-            if resultado and resultado[0]:
-                try:
-                    datos_adicionales = json.loads(resultado[0])
-                    # Agregar informacion de procesamiento
-                    datos_adicionales['procesado_en'] = datetime.now().isoformat()
-                    datos_adicionales['procesado_por'] = 'procesador_json'
-                except:
-                    datos_adicionales = {'procesado_en': datetime.now().isoformat()}
-            
-            # Actualizar alerta como procesada
-            cursor.execute('''
-                UPDATE alertas_sistema 
-                SET procesada = 1, 
-                    fecha_procesada = ?,
-                    datos_adicionales = ?
-                WHERE id = ?
-            ''', (
-                datetime.now().isoformat(),
-                json.dumps(datos_adicionales, ensure_ascii=False),
-                alerta_id
-            ))
-            
-            conn.commit()
-            print(f"  [DB] Alerta {alerta_id} marcada como procesada")
+        self.almacenamiento.marcar_requests_procesados([request_id])
+        print(f"  [DB] Request {request_id} actualizado con processed_at")
     
     def extraer_caracteristicas(self, json_data):
         """Extrae caracteristicas del JSON para el modelo"""
-        sensor_data = json_data.get('sensor_data', {})
-        readings = sensor_data.get('readings', {})
-        
-        # Extraer valores de los sensores
-        scd30 = readings.get('scd30', {})
-        bme280 = readings.get('bme280', {})
-        mq135 = readings.get('mq135', {})
-        
-        # Crear caracteristicas para el modelo
-        features = {
-            'co2': scd30.get('co2', 0),
-            'temperatura_scd': scd30.get('temperature', 0),
-            'humedad_scd': scd30.get('humidity', 0),
-            'temperatura_bme': bme280.get('temperature', 0),
-            'humedad_bme': bme280.get('humidity', 0),
-            'presion': bme280.get('pressure', 0),
-            'mq135_analog': mq135.get('analog_value', 0),
-            'mq135_digital': mq135.get('digital_value', 0)
-        }
-        
-        # Extraer hora del dia del timestamp
-        try:
-            timestamp = sensor_data.get('metadata', {}).get('timestamp', '')
-            if timestamp:
-                dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-                features['hora_dia'] = dt.hour
-                features['dia_semana'] = dt.weekday()
-        except:
-            features['hora_dia'] = 12
-            features['dia_semana'] = 0
-        
-        return features
+        return self.validador.validar(json_data)['features']
     
     def clasificar_calidad_aire(self, co2, valor_prediccion=None):
         """Clasifica la calidad del aire basado en niveles de CO2"""
-        # PRIORIDAD 1: Usar clasificacion basada en CO2
-        if co2 < 450:
-            return "Excelente", "Muy bueno"
-        elif co2 < 600:
-            return "Buena", "Aceptable"
-        elif co2 < 800:
-            return "Moderada", "Ligeramente elevado"
-        elif co2 < 1000:
-            return "Deficiente", "Elevado"
-        elif co2 < 1200:
-            return "Muy deficiente", "Muy elevado"
-        else:
-            return "Peligrosa", "Critico"
+        # PRIORIDAD 1: Usar clasificacion basada en CO2 (tabla de cortes compartida)
+        codigo = codigo_co2(co2)
+        return CATEGORIAS_CALIDAD[codigo], NIVELES_CO2[codigo]
     
     def analizar_con_modelo(self, features):
         """Analiza los datos con el modelo mejorado"""
@@ -370,7 +127,19 @@ class ProcesadorCalidadAire:
         
         return resultado['valor_prediccion'], resultado['importancia_caracteristicas']
     
-    def verificar_alertas(self, json_data, features, calidad_aire):
+    def id_version_modelo(self, importancias):
+        """Id en model_versions de las importancias del modelo en uso
+        
+        El modelo devuelve el mismo dict hasta que se recarga o reentrena,
+        asi que la version se resuelve una sola vez por modelo.
+        """
+        if self._version_modelo is None or self._version_modelo[0] is not importancias:
+            version_id = self.almacenamiento.id_version_modelo(
+                importancias, list(importancias.keys()), self.modelo_ml.fecha_entrenamiento)
+            self._version_modelo = (importancias, version_id)
+        return self._version_modelo[1]
+    
+    def verificar_alertas(self, json_data, features, calidad_aire, sensores_faltantes=None):
         """Verifica y genera alertas basadas en los datos"""
         if self.sistema_alertas is None:
             return []
@@ -381,120 +150,92 @@ class ProcesadorCalidadAire:
         metadata = json_data.get('sensor_data', {}).get('metadata', {})
         ubicacion = metadata.get('location', 'Ubicacion Desconocida')
         
-        # 1. Verificar calidad del aire
         datos_verificacion = {
             'co2': features['co2'],
             'temperatura': features['temperatura_scd'],
             'humedad': features['humedad_scd']
         }
         
-        # Pasar la ubicacion al sistema de alertas
-        alertas_calidad = self.sistema_alertas.verificar_calidad_aire(datos_verificacion, ubicacion)
-        alertas_generadas.extend(alertas_calidad)
-        
-        # 2. Verificar datos incompletos
-        alertas_incompletos = self.sistema_alertas.verificar_datos_incompletos(json_data)
-        alertas_generadas.extend(alertas_incompletos)
-        
-        # 3. Si la calidad es Peligrosa, generar alerta especifica
-        if calidad_aire == "Peligrosa":
-            alertas_peligrosa = self.sistema_alertas.verificar_calidad_peligrosa(
-                calidad_aire, datos_verificacion, ubicacion
-            )
-            alertas_generadas.extend(alertas_peligrosa)
+        # Las alertas del lote se escriben una sola vez al salir del bloque,
+        # ya procesadas (una escritura en BD; cada alerta queda con su db_id)
+        with self.sistema_alertas.lote(procesada_por='procesador_json'):
+            # 1. Verificar calidad del aire (pasando la ubicacion)
+            alertas_generadas.extend(self.sistema_alertas.verificar_calidad_aire(datos_verificacion, ubicacion))
+            
+            # 2. Verificar datos incompletos
+            alertas_generadas.extend(self.sistema_alertas.verificar_datos_incompletos(
+                json_data, sensores_faltantes=sensores_faltantes
+            ))
+            
+            # 3. Si la calidad es Peligrosa, generar alerta especifica
+            if calidad_aire == "Peligrosa":
+                alertas_generadas.extend(self.sistema_alertas.verificar_calidad_peligrosa(
+                    calidad_aire, datos_verificacion, ubicacion
+                ))
         
-        # 4. Registrar cada alerta en la base de datos
-        for alerta in alertas_generadas:
-            alerta_id = self.registrar_alerta_en_db(alerta)
-            if alerta_id:
-                alerta['db_id'] = alerta_id  # Guardar ID para referencia
+        alerta_ids = [alerta['db_id'] for alerta in alertas_generadas if 'db_id' in alerta]
+        if alerta_ids:
+            print(f"  [DB] {len(alerta_ids)} alerta(s) registrada(s) como procesadas (IDs: {', '.join(map(str, alerta_ids))})")
         
         return alertas_generadas
     
-    def guardar_request(self, json_data, device_id, timestamp):
-        """Guarda el request (JSON original) en la base de datos con processed_at = NULL inicialmente"""
-        with self.conectar_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO sensor_requests 
-                (timestamp, device_id, request_data, processed_at, archived)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (timestamp, device_id, json.dumps(json_data), 
-                  None,  # processed_at = NULL inicialmente
-                  0))    # archived = 0 significa no archivado
-            request_id = cursor.lastrowid
-            conn.commit()
-            print(f"  [DB] Request guardado (ID: {request_id}) con processed_at=NULL")
+    def guardar_request(self, json_data, device_id, timestamp, dispositivo_id=None):
+        """Guarda el request (JSON original comprimido) en la base de datos con processed_at = NULL inicialmente"""
+        request_id, = self.almacenamiento.guardar_requests([{
+            'timestamp': timestamp,
+            'device_id': device_id,
+            'json_data': json_data,
+            'dispositivo_id': dispositivo_id
+        }])
+        print(f"  [DB] Request guardado (ID: {request_id}) con processed_at=NULL")
         return request_id
     
     def guardar_response(self, request_id, response_data):
         """Guarda el response (analisis) en la base de datos - CORREGIDO con manejo de errores"""
         try:
-            with self.conectar_db() as conn:
-                cursor = conn.cursor()
-                
-                # Verificar estructura de la tabla antes de insertar
-                cursor.execute("PRAGMA table_info(sensor_responses)")
-                columnas = cursor.fetchall()
-                nombres_columnas = [col[1] for col in columnas]
-                
-                # IMPORTANTE: La columna se llama 'temperature' en la BD, no 'temperatura'
-                # Mapear nombres de variables a nombres de columnas
-                datos_para_insertar = {
-                    'request_id': request_id,
-                    'calidad_aire_pred': response_data['calidad_aire'],
-                    'co2_nivel': response_data['co2_nivel'],
-                    'temperature': response_data['temperatura'],
-                    'humedad': response_data['humedad'],
-                    'presion': response_data['presion'],
-                    'importancia_variables': json.dumps(response_data['importancia_variables']),
-                    'prediccion_detalle': json.dumps({
-                        'prediccion_valor': response_data['prediccion_valor'],
-                        'co2_ppm': response_data['co2_ppm'],
-                        'recomendaciones': response_data['recomendaciones'],
-                        'ubicacion': response_data.get('ubicacion', 'Desconocida'),
-                        'features_utilizadas': response_data['features_utilizadas'],
-                        'info_alertas': response_data['info_alertas']
-                    }),
-                    'created_at': response_data['timestamp_analisis']
-                }
-                
-                # Construir query dinamica basada en columnas disponibles
-                columnas_disponibles = []
-                valores = []
-                
-                for col, val in datos_para_insertar.items():
-                    if col in nombres_columnas:
-                        columnas_disponibles.append(col)
-                        valores.append(val)
-                    else:
-                        print(f"  [ADVERTENCIA] Columna '{col}' no encontrada en sensor_responses, omitiendo")
-                
-                if not columnas_disponibles:
-                    raise ValueError("No hay columnas validas para insertar en sensor_responses")
-                
-                # Crear query dinamica
-                placeholders = ','.join(['?'] * len(columnas_disponibles))
-                columnas_sql = ','.join(columnas_disponibles)
-                
-                query = f'''
-                    INSERT INTO sensor_responses 
-                    ({columnas_sql})
-                    VALUES ({placeholders})
-                '''
-                
-                cursor.execute(query, valores)
-                conn.commit()
-                print(f"  [DB] Response guardado para request {request_id}")
-                print(f"  [DB] Columnas insertadas: {columnas_disponibles}")
-                
-                return True  # Retornar exito
+            # IMPORTANTE: La columna se llama 'temperature' en la BD, no 'temperatura'
+            # Mapear nombres de variables a nombres de columnas
+            datos_para_insertar = {
+                'request_id': request_id,
+                'calidad_aire_pred': response_data['calidad_aire'],
+                'co2_nivel': response_data['co2_nivel'],
+                'temperature': response_data['temperatura'],
+                'humedad': response_data['humedad'],
+                'presion': response_data['presion'],
+                # Importancias y features se guardan una vez por version en model_versions
+                'model_version_id': response_data.get('model_version_id'),
+                'prediccion_detalle': json.dumps({
+                    'prediccion_valor': response_data['prediccion_valor'],
+                    'co2_ppm': response_data['co2_ppm'],
+                    'recomendaciones': response_data['recomendaciones'],
+                    'ubicacion': response_data.get('ubicacion', 'Desconocida'),
+                    # Solo conteos: las alertas se enlazan en responses_alertas
+                    'info_alertas': {
+                        'total_alertas': response_data['info_alertas']['total_alertas'],
+                        'alertas_criticas': response_data['info_alertas']['alertas_criticas']
+                    }
+                }),
+                'created_at': response_data['timestamp_analisis'],
+                'co2_ppm': response_data['co2_ppm'],
+                'prediccion_valor': response_data['prediccion_valor'],
+                'ubicacion': response_data.get('ubicacion', 'Desconocida'),
+                'device_id': response_data.get('device_id'),
+                'created_at_epoch': a_epoch(response_data['timestamp_analisis']),
+                'ubicacion_id': response_data.get('ubicacion_id'),
+                'dispositivo_id': response_data.get('dispositivo_id'),
+                'alerta_ids': [alerta['db_id'] for alerta in response_data['info_alertas']['alertas_generadas']
+                               if alerta.get('db_id') is not None]
+            }
+            
+            # El almacenamiento guarda enlaces y resumenes en la misma transaccion
+            response_id, = self.almacenamiento.guardar_responses([datos_para_insertar])
+            response_data['response_id'] = response_id
+            print(f"  [DB] Response {response_id} guardado para request {request_id}")
+            
+            return True  # Retornar exito
                 
         except Exception as e:
             print(f"  [ERROR DB] Error guardando response: {e}")
-            # Mostrar informacion de depuracion
-            print(f"  [DEBUG] Columnas disponibles en BD: {nombres_columnas}")
-            print(f"  [DEBUG] Datos a insertar keys: {list(datos_para_insertar.keys())}")
             # Registrar en log
             self._registrar_error_en_log(f"Error en guardar_response para request {request_id}: {e}")
             return False  # Retornar fallo
@@ -520,21 +261,36 @@ class ProcesadorCalidadAire:
             return None  # Saltar este archivo
         
         # Leer JSON
-        with open(json_path, 'r', encoding='utf-8') as f:
-            json_data = json.load(f)
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                json_data = json.load(f)
+        except json.JSONDecodeError as e:
+            self.rechazar_json(json_path, [f"JSON invalido: {e}"])
+            return False
+        
+        # Validar en una sola pasada ANTES de cualquier escritura en BD
+        validacion = self.validador.validar(json_data)
+        if not validacion['valido']:
+            self.rechazar_json(json_path, validacion['errores'])
+            return False
         
         # Extraer metadata
-        metadata = json_data.get('sensor_data', {}).get('metadata', {})
+        metadata = validacion['metadata']
         device_id = metadata.get('device_id', 'DESCONOCIDO')
         timestamp = metadata.get('timestamp', '')
         ubicacion = metadata.get('location', 'Ubicacion Desconocida')
         
+        # Claves enteras de ubicacion y dispositivo (cache en proceso; solo los nuevos van a la BD)
+        ubicacion_id = self.almacenamiento.id_ubicacion(
+            ubicacion, metadata.get('latitude'), metadata.get('longitude'))
+        dispositivo_id = self.almacenamiento.id_dispositivo(device_id, ubicacion_id)
+        
         # 1. Guardar request en BD (con processed_at = NULL)
-        request_id = self.guardar_request(json_data, device_id, timestamp)
+        request_id = self.guardar_request(json_data, device_id, timestamp, dispositivo_id)
         
         try:
-            # Extraer caracteristicas
-            features = self.extraer_caracteristicas(json_data)
+            # Caracteristicas ya extraidas por el validador
+            features = validacion['features']
             
             # Analizar con modelo (para obtener importancia de variables)
             prediccion, importancias = self.analizar_con_modelo(features)
@@ -543,7 +299,9 @@ class ProcesadorCalidadAire:
             calidad_aire, co2_nivel = self.clasificar_calidad_aire(features['co2'])
             
             # Verificar y generar alertas (con ubicacion correcta)
-            alertas_generadas = self.verificar_alertas(json_data, features, calidad_aire)
+            alertas_generadas = self.verificar_alertas(
+                json_data, features, calidad_aire, validacion['sensores_faltantes']
+            )
             
             # Crear response con informacion de alertas
             info_alertas = {
@@ -562,8 +320,12 @@ class ProcesadorCalidadAire:
                 'presion': features['presion'],
                 'prediccion_valor': float(prediccion),
                 'importancia_variables': importancias,
+                'model_version_id': self.id_version_modelo(importancias),
                 'timestamp_analisis': datetime.now().isoformat(),
                 'ubicacion': ubicacion,
+                'device_id': device_id,
+                'ubicacion_id': ubicacion_id,
+                'dispositivo_id': dispositivo_id,
                 'recomendaciones': self.generar_recomendaciones(calidad_aire, features['co2']),
                 'features_utilizadas': list(importancias.keys()),
                 'info_alertas': info_alertas
@@ -601,6 +363,20 @@ class ProcesadorCalidadAire:
             
             raise  # Re-lanzar excepcion para manejo superior
     
+    def rechazar_json(self, json_path, errores):
+        """Mueve un JSON invalido a la carpeta de rechazados sin tocar la BD"""
+        nombre_archivo = os.path.basename(json_path)
+        print(f"  [RECHAZADO] Lectura invalida: {'; '.join(errores)}")
+        self._registrar_error_en_log(f"Lectura rechazada {nombre_archivo}: {'; '.join(errores)}")
+        
+        destino = os.path.join(self.proyecto_root, self.config['rejected_path'], nombre_archivo)
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        try:
+            shutil.move(json_path, destino)
+            print(f"  -> Archivo movido a: {destino}")
+        except Exception as e:
+            print(f"  -> Error moviendo archivo rechazado: {e}")
+    
     def archivar_json(self, json_path):
         """Mueve el JSON procesado a la carpeta de archivo"""
         nombre_archivo = os.path.basename(json_path)
@@ -623,18 +399,7 @@ class ProcesadorCalidadAire:
     
     def generar_recomendaciones(self, calidad_aire, co2):
         """Genera recomendaciones basadas en la calidad del aire"""
-        if calidad_aire == "Excelente":
-            return "Condiciones optimas. Mantener ventilacion normal."
-        elif calidad_aire == "Buena":
-            return "Condiciones aceptables. Verificar fuentes de emision."
-        elif calidad_aire == "Moderada":
-            return "Aumentar ventilacion. Considerar reducir actividades intensas."
-        elif calidad_aire == "Deficiente":
-            return "Ventilacion forzada recomendada. Monitorear continuamente."
-        elif calidad_aire == "Muy deficiente":
-            return "ALERTA: Condiciones peligrosas. Limitar actividades."
-        else:  # Peligrosa
-            return "ALERTA CRITICA: Evitar exposicion. Activar sistemas de emergencia."
+        return RECOMENDACIONES[codigo_categoria(calidad_aire)]
     
     def procesar_uno_por_uno(self):
         """Procesa todos los archivos JSON uno por uno para mayor estabilidad"""
@@ -644,9 +409,8 @@ class ProcesadorCalidadAire:
             print(f"Error: Directorio {raw_dir} no existe")
             return
         
-        # Crear tablas si no existen y verificar estructura
+        # Crear tablas si no existen y aplicar migraciones pendientes
         self.crear_tablas()
-        self.verificar_estructura_tablas()
         
         # Listar archivos JSON
         archivos_json = [f for f in os.listdir(raw_dir) if f.endswith('.json')]
@@ -664,6 +428,7 @@ class ProcesadorCalidadAire:
         procesados_exitosamente = 0
         procesados_con_error = 0
         ya_procesados = 0
+        rechazados = 0
         
         for i, archivo in enumerate(archivos_json, 1):
             json_path = os.path.join(raw_dir, archivo)
@@ -678,6 +443,8 @@ class ProcesadorCalidadAire:
                     
                     if 'info_alertas' in resultado:
                         total_alertas += resultado['info_alertas']['total_alertas']
+                elif resultado is False:
+                    rechazados += 1
                 else:
                     ya_procesados += 1
                     
@@ -693,6 +460,7 @@ class ProcesadorCalidadAire:
         print(f"   Exitosos: {procesados_exitosamente}")
         print(f"   Errores: {procesados_con_error}")
         print(f"   Ya procesados: {ya_procesados}")
+        print(f"   Rechazados (invalidos): {rechazados}")
         print(f"   Total archivos: {len(archivos_json)}")
         
         if total_alertas > 0:
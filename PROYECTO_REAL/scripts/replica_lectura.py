@@ -0,0 +1,160 @@
+import os
+import time
+import sqlite3
+from urllib.request import pathname2url
+from conexion_db import ruta_db
+from particiones_db import crear_catalogo
+
+# Copia de solo lectura de la BD principal para dashboards, exportaciones
+# y reportes. Se toma con la API de backup en un solo paso: con WAL la
+# lectura no bloquea a la ingesta y la copia es consistente (por pasos se
+# reiniciaria con cada escritura). Las lecturas pesadas usan la copia y
+# nunca toman bloqueos del archivo principal.
+MAX_ANTIGUEDAD = 60  # segundos antes de volver a copiar
+SUFIJO_REPLICA = '_replica'
+
+
+def ruta_replica(db_path=None):
+    """Ruta del archivo de la replica, junto a la BD principal"""
+    base, extension = os.path.splitext(ruta_db(db_path))
+    return f"{base}{SUFIJO_REPLICA}{extension}"
+
+
+def _copiar(origen_ruta, destino):
+    """Copia la BD principal en la conexion destino"""
+    origen = sqlite3.connect(origen_ruta, timeout=30)
+    try:
+        origen.backup(destino)
+    finally:
+        origen.close()
+    # La replica no se puede modificar: el catalogo de particiones
+    # (que el router crea si falta) debe existir ya en la copia
+    with destino:
+        crear_catalogo(destino)
+
+
+def _solo_lectura(conn):
+    conn.execute('PRAGMA query_only = 1')
+    return conn
+
+
+class ReplicaLectura:
+    """Instantanea de solo lectura de la BD principal, refrescada por antiguedad
+
+    En archivo (por defecto) la copia se comparte entre procesos: se
+    escribe en un temporal, se renombra y se abre con immutable=1. En
+    memoria cada instancia tiene su propia copia. conexion() vuelve a
+    copiar cuando la instantanea supera max_antiguedad segundos.
+    """
+
+    def __init__(self, db_path=None, en_memoria=False, max_antiguedad=MAX_ANTIGUEDAD):
+        self.db_path = ruta_db(db_path)
+        self.en_memoria = en_memoria
+        self.max_antiguedad = max_antiguedad
+        self.ruta = None if en_memoria else ruta_replica(db_path)
+        self._conn = None
+        self._tomada_en = None   # time.time() de la copia abierta
+        self.refrescos = 0
+
+    def _fecha_archivo(self):
+        try:
+            return os.path.getmtime(self.ruta)
+        except OSError:
+            return None
+
+    def antiguedad(self):
+        """Segundos desde que se tomo la copia mas reciente (None si no hay copia)"""
+        tomada_en = self._tomada_en if self.en_memoria else self._fecha_archivo()
+        if tomada_en is None:
+            return None
+        return max(0.0, time.time() - tomada_en)
+
+    def refrescar(self):
+        """Toma una copia nueva de la BD principal; devuelve los segundos que tardo"""
+        if not os.path.exists(self.db_path):
+            raise FileNotFoundError(f"Base de datos no encontrada: {self.db_path}")
+
+        inicio = time.perf_counter()
+        if self.en_memoria:
+            copia = sqlite3.connect(':memory:', check_same_thread=False)
+            _copiar(self.db_path, copia)
+            self._reemplazar(_solo_lectura(copia), time.time())
+        else:
+            # Temporal por proceso: dos procesos pueden refrescar a la vez
+            temporal = f"{self.ruta}.{os.getpid()}.parcial"
+            copia = sqlite3.connect(temporal)
+            try:
+                _copiar(self.db_path, copia)
+                # Sin WAL: el archivo se abre luego como inmutable, sin -wal ni -shm
+                copia.execute('PRAGMA journal_mode = DELETE')
+            finally:
+                copia.close()
+            self.cerrar()  # En Windows no se puede reemplazar un archivo abierto
+            try:
+                os.replace(temporal, self.ruta)
+            except OSError as e:
+                os.remove(temporal)
+                print(f"  [ADVERTENCIA] No se pudo reemplazar la replica ({e}); se usa la copia anterior")
+            self._abrir()
+        self.refrescos += 1
+        return time.perf_counter() - inicio
+
+    def _abrir(self):
+        """Abre la replica en archivo como inmutable y de solo lectura"""
+        uri = f"file:{pathname2url(self.ruta)}?mode=ro&immutable=1"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        self._reemplazar(_solo_lectura(conn), self._fecha_archivo())
+
+    def _reemplazar(self, conn, tomada_en):
+        if self._conn is not None:
+            self._conn.close()
+        self._conn = conn
+        self._tomada_en = tomada_en
+
+    def conexion(self):
+        """Conexion de solo lectura a una copia con antiguedad <= max_antiguedad
+
+        La conexion cambia despues de cada refresco: no guardarla entre llamadas.
+        """
+        antiguedad = self.antiguedad()
+        if antiguedad is None or antiguedad > self.max_antiguedad:
+            self.refrescar()
+        elif not self.en_memoria and (self._conn is None or self._tomada_en != self._fecha_archivo()):
+            # Otro proceso (p. ej. el servicio de replica) dejo una copia mas nueva
+            self._abrir()
+        return self._conn
+
+    def estado(self):
+        """Dict con la ubicacion, antiguedad y refrescos de la replica"""
+        return {
+            'ubicacion': 'memoria' if self.en_memoria else self.ruta,
+            'antiguedad': self.antiguedad(),
+            'max_antiguedad': self.max_antiguedad,
+            'refrescos': self.refrescos,
+        }
+
+    def cerrar(self):
+        self._reemplazar(None, None)
+
+
+def main():
+    """Servicio de replica: refresca la copia en archivo cada N segundos (por defecto MAX_ANTIGUEDAD / 2)"""
+    import sys
+
+    intervalo = float(sys.argv[1]) if len(sys.argv) > 1 else MAX_ANTIGUEDAD / 2
+    replica = ReplicaLectura()
+    print(f"Replica de lectura: {replica.ruta} (cada {intervalo:.0f} s, Ctrl+C para salir)")
+    try:
+        while True:
+            segundos = replica.refrescar()
+            megas = os.path.getsize(replica.ruta) / (1024 * 1024)
+            print(f"  [REPLICA] Copia actualizada: {megas:.1f} MB en {segundos:.2f} s")
+            time.sleep(intervalo)
+    except KeyboardInterrupt:
+        print("\nServicio de replica detenido")
+    finally:
+        replica.cerrar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import os
+import time
+import sqlite3
+from datetime import datetime
+from conexion_db import ruta_db
+
+# Respaldos rotativos junto a la BD principal
+DIRECTORIO_RESPALDOS = 'respaldos'
+GENERACIONES = 5
+
+# Copia por pasos: la ingesta puede escribir entre un paso y otro
+PAGINAS_POR_PASO = 256
+PAUSA_ENTRE_PASOS = 0.02
+
+
+def directorio_respaldos(db_path=None):
+    """Directorio de los respaldos rotativos"""
+    return os.path.join(os.path.dirname(ruta_db(db_path)), DIRECTORIO_RESPALDOS)
+
+
+def listar_respaldos(db_path=None):
+    """Respaldos existentes, del mas reciente al mas antiguo"""
+    directorio = directorio_respaldos(db_path)
+    if not os.path.exists(directorio):
+        return []
+    base = os.path.splitext(os.path.basename(ruta_db(db_path)))[0]
+    respaldos = [
+        os.path.join(directorio, nombre) for nombre in os.listdir(directorio)
+        if nombre.startswith(base + '_') and nombre.endswith('.db')
+    ]
+    return sorted(respaldos, reverse=True)
+
+
+def rotar_respaldos(generaciones=GENERACIONES, db_path=None):
+    """Elimina los respaldos mas antiguos dejando las ultimas N generaciones"""
+    eliminados = []
+    for ruta in listar_respaldos(db_path)[generaciones:]:
+        os.remove(ruta)
+        eliminados.append(ruta)
+    return eliminados
+
+
+def crear_respaldo(db_path=None, destino=None, paginas_por_paso=PAGINAS_POR_PASO,
+                   pausa=PAUSA_ENTRE_PASOS, generaciones=GENERACIONES, verificar=True):
+    """Copia la BD en caliente con la API de backup de SQLite
+
+    La copia se hace por pasos de N paginas con una pausa entre pasos, asi
+    que los escritores no quedan bloqueados. Se escribe en un archivo
+    temporal, se verifica con PRAGMA integrity_check y solo entonces se
+    renombra al nombre final. Si no se indica destino se crea un respaldo
+    con fecha en el directorio de respaldos y se rotan las generaciones.
+    Devuelve un dict con ruta, bytes, segundos, mb_s e integridad.
+    """
+    origen_ruta = ruta_db(db_path)
+    if not os.path.exists(origen_ruta):
+        raise FileNotFoundError(f"Base de datos no encontrada: {origen_ruta}")
+
+    if destino is None:
+        base = os.path.splitext(os.path.basename(origen_ruta))[0]
+        destino = os.path.join(directorio_respaldos(db_path),
+                               f"{base}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db")
+    else:
+        generaciones = None  # Destino explicito: sin rotacion
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    temporal = destino + '.parcial'
+    if os.path.exists(temporal):
+        os.remove(temporal)
+
+    inicio = time.perf_counter()
+    # Conexiones propias: no se comparte la transaccion de lectura con la ingesta
+    origen = sqlite3.connect(origen_ruta, timeout=30)
+    copia = sqlite3.connect(temporal)
+    try:
+        def progreso(status, restantes, total):
+            if pausa:
+                time.sleep(pausa)
+        origen.backup(copia, pages=paginas_por_paso, progress=progreso)
+
+        integridad = 'no verificada'
+        if verificar:
+            integridad = copia.execute('PRAGMA integrity_check').fetchone()[0]
+        # La copia queda autocontenida (sin -wal) para poder moverla o restaurarla
+        copia.execute('PRAGMA journal_mode = DELETE')
+    finally:
+        copia.close()
+        origen.close()
+
+    if verificar and integridad != 'ok':
+        os.remove(temporal)
+        raise sqlite3.DatabaseError(f"Respaldo corrupto ({integridad}), se descarto {temporal}")
+
+    os.replace(temporal, destino)
+    segundos = time.perf_counter() - inicio
+    tamano = os.path.getsize(destino)
+
+    if generaciones:
+        rotar_respaldos(generaciones, db_path)
+
+    return {
+        'ruta': destino,
+        'bytes': tamano,
+        'segundos': segundos,
+        'mb_s': (tamano / 1048576) / segundos if segundos > 0 else 0.0,
+        'integridad': integridad,
+    }
+
+
+def mostrar_respaldo(resultado):
+    """Imprime el resultado de un respaldo"""
+    print(f"  [DB] Respaldo creado: {resultado['ruta']}")
+    print(f"  Tamano: {resultado['bytes'] / 1048576:.2f} MB en {resultado['segundos']:.2f} s "
+          f"({resultado['mb_s']:.1f} MB/s)")
+    print(f"  Integridad: {resultado['integridad']}")
+
+
+def main():
+    """Crea un respaldo en caliente y muestra las generaciones disponibles"""
+    print("RESPALDO EN CALIENTE DE LA BASE DE DATOS")
+    print("-" * 60)
+    try:
+        mostrar_respaldo(crear_respaldo())
+    except (FileNotFoundError, sqlite3.DatabaseError) as e:
+        print(f"[ERROR] {e}")
+        return
+
+    print(f"\nRespaldos disponibles (ultimas {GENERACIONES} generaciones):")
+    for ruta in listar_respaldos():
+        print(f"  {os.path.basename(ruta)}  {os.path.getsize(ruta) / 1048576:.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
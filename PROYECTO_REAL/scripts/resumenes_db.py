@@ -0,0 +1,179 @@
+from clasificacion_calidad import CATEGORIAS_CALIDAD
+
+# Metricas agregadas: (prefijo en las tablas de resumen, columna de sensor_responses)
+METRICAS_RESUMEN = (
+    ('co2', 'co2_ppm'),
+    ('temperatura', 'temperature'),
+    ('humedad', 'humedad'),
+    ('presion', 'presion'),
+)
+
+# Una columna de conteo por categoria de calidad; lo no reconocido va a n_otra
+COLUMNAS_CATEGORIA = tuple(
+    (categoria, 'n_' + categoria.lower().replace(' ', '_')) for categoria in CATEGORIAS_CALIDAD
+)
+COLUMNA_CATEGORIA_OTRA = 'n_otra'
+
+SEGUNDOS_HORA = 3600
+SEGUNDOS_DIA = 86400
+
+# Tablas de resumen: nombre -> (columnas clave, tamano del periodo en segundos)
+TABLAS_RESUMEN = {
+    'resumen_horario': (('ubicacion', 'device_id', 'hora_epoch'), SEGUNDOS_HORA),
+    'resumen_diario': (('ubicacion', 'dia_epoch'), SEGUNDOS_DIA),
+}
+
+
+def _columnas_valores():
+    """Columnas de valores de las tablas de resumen, en orden"""
+    columnas = ['n']
+    for prefijo, _ in METRICAS_RESUMEN:
+        columnas += [f'{prefijo}_suma', f'{prefijo}_min', f'{prefijo}_max']
+    columnas += [columna for _, columna in COLUMNAS_CATEGORIA]
+    columnas.append(COLUMNA_CATEGORIA_OTRA)
+    return columnas
+
+
+def _sql_crear(tabla, claves):
+    definiciones = [f'{clave} {"INTEGER" if clave.endswith("_epoch") else "TEXT"} NOT NULL' for clave in claves]
+    for columna in _columnas_valores():
+        tipo = 'REAL' if columna.endswith(('_suma', '_min', '_max')) else 'INTEGER NOT NULL DEFAULT 0'
+        definiciones.append(f'{columna} {tipo}')
+    definiciones.append(f'PRIMARY KEY ({", ".join(claves)})')
+    return f'CREATE TABLE IF NOT EXISTS {tabla} ({", ".join(definiciones)}) WITHOUT ROWID'
+
+
+def _sql_upsert(tabla, claves):
+    """INSERT ... ON CONFLICT que suma conteos/sumas y combina minimos y maximos"""
+    columnas = list(claves) + _columnas_valores()
+    actualizaciones = []
+    for columna in _columnas_valores():
+        if columna.endswith('_min'):
+            actualizaciones.append(
+                f'{columna} = MIN(COALESCE({columna}, excluded.{columna}), '
+                f'COALESCE(excluded.{columna}, {columna}))')
+        elif columna.endswith('_max'):
+            actualizaciones.append(
+                f'{columna} = MAX(COALESCE({columna}, excluded.{columna}), '
+                f'COALESCE(excluded.{columna}, {columna}))')
+        elif columna.endswith('_suma'):
+            actualizaciones.append(f'{columna} = COALESCE({columna}, 0) + COALESCE(excluded.{columna}, 0)')
+        else:
+            actualizaciones.append(f'{columna} = {columna} + excluded.{columna}')
+    return (f'INSERT INTO {tabla} ({", ".join(columnas)}) '
+            f'VALUES ({", ".join("?" * len(columnas))}) '
+            f'ON CONFLICT ({", ".join(claves)}) DO UPDATE SET {", ".join(actualizaciones)}')
+
+
+# Sentencias generadas una sola vez
+_SQL_CREAR = {tabla: _sql_crear(tabla, claves) for tabla, (claves, _) in TABLAS_RESUMEN.items()}
+_SQL_UPSERT = {tabla: _sql_upsert(tabla, claves) for tabla, (claves, _) in TABLAS_RESUMEN.items()}
+
+
+def crear_tablas_resumen(conn):
+    """Crea las tablas de resumen; devuelve True si alguna era nueva"""
+    existentes = {fila[0] for fila in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name LIKE 'resumen_%'")}
+    for sql in _SQL_CREAR.values():
+        conn.execute(sql)
+    return any(tabla not in existentes for tabla in TABLAS_RESUMEN)
+
+
+def _valores_lectura(lectura):
+    """Fila de valores (sin claves) para una lectura individual"""
+    valores = [1]
+    for prefijo, _ in METRICAS_RESUMEN:
+        valor = lectura.get(prefijo)
+        valores += [valor, valor, valor]
+    categoria = lectura.get('calidad_aire')
+    conocida = False
+    for nombre, _ in COLUMNAS_CATEGORIA:
+        coincide = nombre == categoria
+        conocida = conocida or coincide
+        valores.append(1 if coincide else 0)
+    valores.append(0 if conocida else 1)
+    return valores
+
+
+def actualizar_resumenes(conn, lecturas):
+    """Acumula un lote de lecturas en los resumenes horario y diario
+
+    Cada lectura es un dict con 'ubicacion', 'device_id', 'epoch',
+    'calidad_aire' y las metricas ('co2', 'temperatura', 'humedad',
+    'presion'). No confirma: se ejecuta dentro de la transaccion de la
+    ingesta para que los resumenes nunca se desincronicen.
+    """
+    filas_horario = []
+    filas_diario = []
+    for lectura in lecturas:
+        epoch = lectura.get('epoch')
+        if epoch is None:
+            continue
+        valores = _valores_lectura(lectura)
+        ubicacion = lectura.get('ubicacion') or 'Desconocida'
+        filas_horario.append([ubicacion, lectura.get('device_id') or '',
+                              epoch - epoch % SEGUNDOS_HORA] + valores)
+        filas_diario.append([ubicacion, epoch - epoch % SEGUNDOS_DIA] + valores)
+
+    if filas_horario:
+        conn.executemany(_SQL_UPSERT['resumen_horario'], filas_horario)
+        conn.executemany(_SQL_UPSERT['resumen_diario'], filas_diario)
+    return len(filas_horario)
+
+
+def reconstruir_resumenes(conn):
+    """Recalcula ambos resumenes desde sensor_responses (backfill inicial o reparacion)"""
+    agregados = ['COUNT(*)']
+    for _, columna in METRICAS_RESUMEN:
+        agregados += [f'SUM({columna})', f'MIN({columna})', f'MAX({columna})']
+    for categoria, _ in COLUMNAS_CATEGORIA:
+        agregados.append(f"SUM(calidad_aire_pred = '{categoria}')")
+    categorias = ', '.join(f"'{categoria}'" for categoria, _ in COLUMNAS_CATEGORIA)
+    agregados.append(f"SUM(COALESCE(calidad_aire_pred, '') NOT IN ({categorias}))")
+
+    expresiones_clave = {
+        'ubicacion': "COALESCE(ubicacion, 'Desconocida')",
+        'device_id': "COALESCE(device_id, '')",
+    }
+    with conn:
+        for tabla, (claves, periodo) in TABLAS_RESUMEN.items():
+            expresiones = [
+                expresiones_clave.get(clave, f'created_at_epoch - created_at_epoch % {periodo}')
+                for clave in claves
+            ]
+            conn.execute(f'DELETE FROM {tabla}')
+            conn.execute(f'''
+                INSERT INTO {tabla} ({", ".join(list(claves) + _columnas_valores())})
+                SELECT {", ".join(expresiones + agregados)}
+                FROM sensor_responses
+                WHERE created_at_epoch IS NOT NULL
+                GROUP BY {", ".join(str(i + 1) for i in range(len(claves)))}
+            ''')
+    return conn.execute('SELECT COALESCE(SUM(n), 0) FROM resumen_diario').fetchone()[0]
+
+
+def estadisticas_generales(conn, ubicacion=None):
+    """Totales y promedios a partir del resumen diario
+
+    Devuelve (total_muestras, {metrica: promedio}, {categoria: cantidad}).
+    """
+    sumas = [f'SUM({prefijo}_suma)' for prefijo, _ in METRICAS_RESUMEN]
+    conteos = [f'SUM({columna})' for _, columna in COLUMNAS_CATEGORIA] + [f'SUM({COLUMNA_CATEGORIA_OTRA})']
+    sql = f'SELECT COALESCE(SUM(n), 0), {", ".join(sumas + conteos)} FROM resumen_diario'
+    parametros = ()
+    if ubicacion:
+        sql += ' WHERE ubicacion = ?'
+        parametros = (ubicacion,)
+    fila = conn.execute(sql, parametros).fetchone()
+
+    total = fila[0]
+    promedios = {
+        prefijo: (fila[1 + i] / total if total and fila[1 + i] is not None else 0)
+        for i, (prefijo, _) in enumerate(METRICAS_RESUMEN)
+    }
+    desplazamiento = 1 + len(METRICAS_RESUMEN)
+    categorias = {
+        categoria: fila[desplazamiento + i] or 0 for i, (categoria, _) in enumerate(COLUMNAS_CATEGORIA)
+    }
+    categorias['Desconocida'] = fila[-1] or 0
+    return total, promedios, categorias
@@ -0,0 +1,284 @@
+import os
+import json
+import time
+import sqlite3
+from contextlib import closing
+from urllib.request import pathname2url
+from conexion_db import obtener_conexion, ruta_db
+from tiempo_utc import epoch_ahora
+from particiones_db import archivo_principal, aplicar_en_particiones
+from compresion_payload import comprimir_payload
+
+# Archivo frio para los payloads crudos (relativo al proyecto)
+RUTA_ARCHIVO_FRIO = 'data/database/archivo_frio.db'
+
+# Politicas por tabla (dias en la BD principal)
+POLITICAS_RETENCION = {
+    'payloads_crudos': 30,      # sensor_requests.request_data -> archivo frio
+    'alertas_procesadas': 90,   # alertas_sistema procesadas -> conteos diarios
+}
+
+TAMANO_LOTE = 500
+PAUSA_ENTRE_LOTES = 0.05  # segundos sin bloqueo de escritura entre lotes
+PAGINAS_POR_PASO_VACUUM = 256
+
+SEGUNDOS_DIA = 86400
+
+
+def conectar_archivo_frio(ruta=None):
+    """Conexion a la BD de archivo frio (crea la tabla si no existe)"""
+    conn = obtener_conexion(ruta or RUTA_ARCHIVO_FRIO)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS payloads_frios (
+            request_id INTEGER PRIMARY KEY,
+            timestamp TEXT,
+            device_id TEXT,
+            request_data BLOB,
+            archivado_epoch INTEGER
+        )
+    ''')
+    return conn
+
+
+def crear_tabla_alertas_compactadas(conn):
+    """Conteos diarios de las alertas procesadas que se eliminan"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS alertas_compactadas (
+            dia_epoch INTEGER NOT NULL,
+            nivel TEXT NOT NULL,
+            tipo TEXT NOT NULL,
+            ubicacion TEXT NOT NULL,
+            cantidad INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (dia_epoch, nivel, tipo, ubicacion)
+        ) WITHOUT ROWID
+    ''')
+
+
+def _payload_frio(valor):
+    """request_data para el archivo frio: el texto heredado se comprime
+
+    Los BLOB ya llevan el byte de formato (ver compresion_payload) y se
+    copian tal cual; un texto que no es JSON tambien.
+    """
+    if isinstance(valor, str):
+        try:
+            return comprimir_payload(json.loads(valor))
+        except ValueError:
+            pass
+    return valor
+
+
+def _archivar_payloads_esquema(conn, conn_frio, esquema, limite, tamano_lote, pausa):
+    """Archiva los payloads de sensor_requests de un esquema (main o una particion adjunta)"""
+    movidos = 0
+    ultimo_id = 0
+
+    while True:
+        lote = conn.execute(f'''
+            SELECT id, timestamp, device_id, request_data FROM {esquema}.sensor_requests
+            WHERE id > ? AND processed_at_epoch < ? AND request_data IS NOT NULL
+            ORDER BY id
+            LIMIT ?
+        ''', (ultimo_id, limite, tamano_lote)).fetchall()
+        if not lote:
+            break
+
+        ahora = epoch_ahora()
+        with conn_frio:
+            conn_frio.executemany('''
+                INSERT OR REPLACE INTO payloads_frios
+                (request_id, timestamp, device_id, request_data, archivado_epoch)
+                VALUES (?, ?, ?, ?, ?)
+            ''', [(request_id, timestamp, device_id, _payload_frio(payload), ahora)
+                  for request_id, timestamp, device_id, payload in lote])
+        with conn:
+            conn.executemany(f'UPDATE {esquema}.sensor_requests SET request_data = NULL WHERE id = ?',
+                             [(fila[0],) for fila in lote])
+
+        movidos += len(lote)
+        ultimo_id = lote[-1][0]
+        if pausa:
+            time.sleep(pausa)
+
+    return movidos
+
+
+def archivar_payloads_frios(conn, dias=POLITICAS_RETENCION['payloads_crudos'],
+                            tamano_lote=TAMANO_LOTE, pausa=PAUSA_ENTRE_LOTES, ruta_frio=None):
+    """Mueve request_data de los requests procesados hace mas de N dias al archivo frio
+
+    El request se conserva (en la BD principal o en su particion mensual)
+    con request_data = NULL. La politica cubre tambien las particiones:
+    archivar_meses_cerrados deja en ellas casi todo lo de mas de un mes.
+    Cada lote se copia primero al archivo frio y luego se limpia en el
+    origen, por lo que repetirlo tras una interrupcion es seguro.
+    Devuelve el numero de payloads movidos.
+    """
+    limite = epoch_ahora() - dias * SEGUNDOS_DIA
+    conn_frio = conectar_archivo_frio(ruta_frio)
+
+    def archivar(conn, esquema):
+        return _archivar_payloads_esquema(conn, conn_frio, esquema, limite, tamano_lote, pausa)
+
+    movidos = archivar(conn, 'main')
+    archivo = archivo_principal(conn)
+    if archivo:
+        movidos += sum(aplicar_en_particiones(conn, archivar, archivo))
+    return movidos
+
+
+def leer_payload_frio(request_id, ruta_frio=None):
+    """request_data archivado de un request (None si no esta en el archivo frio)
+
+    Solo lectura (mode=ro): la consulta no crea la tabla ni deja abierta una
+    conexion de escritura; eso queda para archivar_payloads_frios.
+    """
+    ruta = ruta_db(ruta_frio or RUTA_ARCHIVO_FRIO)
+    if not os.path.exists(ruta):
+        return None
+    with closing(sqlite3.connect(f"file:{pathname2url(ruta)}?mode=ro", uri=True)) as conn:
+        if not conn.execute("SELECT 1 FROM sqlite_master "
+                            "WHERE type = 'table' AND name = 'payloads_frios'").fetchone():
+            return None
+        fila = conn.execute(
+            'SELECT request_data FROM payloads_frios WHERE request_id = ?', (request_id,)
+        ).fetchone()
+    return fila[0] if fila else None
+
+
+def compactar_alertas(conn, dias=POLITICAS_RETENCION['alertas_procesadas'],
+                      tamano_lote=TAMANO_LOTE, pausa=PAUSA_ENTRE_LOTES):
+    """Elimina las alertas procesadas de hace mas de N dias dejando conteos diarios
+
+    Las pendientes nunca se tocan. Devuelve el numero de alertas compactadas.
+    """
+    crear_tabla_alertas_compactadas(conn)
+    limite = epoch_ahora() - dias * SEGUNDOS_DIA
+    compactadas = 0
+    ultimo_id = 0
+
+    while True:
+        lote = conn.execute('''
+            SELECT id, timestamp_epoch, nivel, tipo, COALESCE(ubicacion, '') FROM alertas_sistema
+            WHERE id > ? AND procesada = 1 AND timestamp_epoch < ?
+            ORDER BY id
+            LIMIT ?
+        ''', (ultimo_id, limite, tamano_lote)).fetchall()
+        if not lote:
+            break
+
+        with conn:
+            conn.executemany('''
+                INSERT INTO alertas_compactadas (dia_epoch, nivel, tipo, ubicacion, cantidad)
+                VALUES (?, ?, ?, ?, 1)
+                ON CONFLICT (dia_epoch, nivel, tipo, ubicacion) DO UPDATE SET cantidad = cantidad + 1
+            ''', [(epoch - epoch % SEGUNDOS_DIA, nivel, tipo, ubicacion)
+                  for _, epoch, nivel, tipo, ubicacion in lote])
+            conn.executemany('DELETE FROM alertas_sistema WHERE id = ?', [(fila[0],) for fila in lote])
+
+        compactadas += len(lote)
+        ultimo_id = lote[-1][0]
+        if pausa:
+            time.sleep(pausa)
+
+    return compactadas
+
+
+def vacuum_incremental_activo(conn, esquema='main'):
+    """Indica si la BD (o la particion adjunta) tiene auto_vacuum = INCREMENTAL"""
+    return conn.execute(f'PRAGMA {esquema}.auto_vacuum').fetchone()[0] == 2
+
+
+def activar_vacuum_incremental(conn, esquema='main'):
+    """Cambia la BD a auto_vacuum = INCREMENTAL (requiere un VACUUM completo, una sola vez)
+
+    Con esquema='main' se convierten tambien las particiones mensuales.
+    """
+    conn.execute(f'PRAGMA {esquema}.auto_vacuum = INCREMENTAL')
+    conn.execute(f'VACUUM {esquema}')
+    if esquema == 'main' and archivo_principal(conn):
+        aplicar_en_particiones(conn, _activar_en_particion, archivo_principal(conn))
+
+
+def _activar_en_particion(conn, alias):
+    if not vacuum_incremental_activo(conn, alias):
+        activar_vacuum_incremental(conn, alias)
+
+
+def vacuum_incremental(conn, paginas_por_paso=PAGINAS_POR_PASO_VACUUM, pausa=PAUSA_ENTRE_LOTES,
+                       esquema='main'):
+    """Devuelve al sistema las paginas libres en pasos cortos; devuelve bytes liberados"""
+    if not vacuum_incremental_activo(conn, esquema):
+        return 0
+    tamano_pagina = conn.execute(f'PRAGMA {esquema}.page_size').fetchone()[0]
+    liberadas = 0
+    while True:
+        libres = conn.execute(f'PRAGMA {esquema}.freelist_count').fetchone()[0]
+        if libres == 0:
+            break
+        paso = min(libres, paginas_por_paso)
+        conn.execute(f'PRAGMA {esquema}.incremental_vacuum({paso})').fetchall()
+        liberadas += paso
+        if pausa:
+            time.sleep(pausa)
+    return liberadas * tamano_pagina
+
+
+def vacuum_incremental_total(conn, paginas_por_paso=PAGINAS_POR_PASO_VACUUM, pausa=PAUSA_ENTRE_LOTES):
+    """Vacuum incremental de la BD principal y de cada particion mensual; devuelve bytes liberados
+
+    La mayor parte de los payloads archivados viven en las particiones. Si
+    la BD principal ya es INCREMENTAL, una particion creada antes con
+    auto_vacuum = NONE se convierte aqui (VACUUM de ese archivo, una vez).
+    """
+    liberados = vacuum_incremental(conn, paginas_por_paso, pausa)
+    archivo = archivo_principal(conn)
+    if not archivo or not vacuum_incremental_activo(conn):
+        return liberados
+
+    def vaciar(conn, alias):
+        _activar_en_particion(conn, alias)
+        return vacuum_incremental(conn, paginas_por_paso, pausa, alias)
+
+    return liberados + sum(aplicar_en_particiones(conn, vaciar, archivo))
+
+
+def ejecutar_retencion(conn=None, politicas=POLITICAS_RETENCION):
+    """Aplica todas las politicas y el vacuum incremental; devuelve un resumen"""
+    conn = conn or obtener_conexion()
+    resultado = {
+        'payloads_archivados': archivar_payloads_frios(conn, politicas['payloads_crudos']),
+        'alertas_compactadas': compactar_alertas(conn, politicas['alertas_procesadas']),
+        'vacuum_incremental': vacuum_incremental_activo(conn),
+    }
+    resultado['bytes_liberados'] = vacuum_incremental_total(conn)
+    return resultado
+
+
+def mostrar_resultado(resultado):
+    """Imprime el resumen de una ejecucion de retencion"""
+    print(f"  Payloads movidos al archivo frio: {resultado['payloads_archivados']}")
+    print(f"  Alertas procesadas compactadas: {resultado['alertas_compactadas']}")
+    if resultado['vacuum_incremental']:
+        print(f"  Espacio devuelto al sistema: {resultado['bytes_liberados'] / 1024:.1f} KB")
+    else:
+        print("  [INFO] auto_vacuum incremental no activo: el espacio liberado se reutiliza")
+        print("         pero el archivo no se reduce (activelo una vez desde el mantenimiento)")
+
+
+def main():
+    """Ejecuta el job de retencion sobre la base de datos principal"""
+    conn = obtener_conexion(crear=False)
+    if conn is None:
+        print("Base de datos no encontrada")
+        return
+
+    print("RETENCION DE DATOS")
+    print("-" * 60)
+    for politica, dias in POLITICAS_RETENCION.items():
+        print(f"  {politica}: {dias} dias en la BD principal")
+    mostrar_resultado(ejecutar_retencion(conn))
+
+
+if __name__ == "__main__":
+    main()
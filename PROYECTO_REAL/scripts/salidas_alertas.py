@@ -0,0 +1,149 @@
+from abc import ABC, abstractmethod
+from diario_alertas import DiarioAlertas
+
+# Salidas de las alertas de SistemaAlertas. Cada alerta registrada se
+# entrega una sola vez a cada salida configurada; la BD es la unica que
+# escribe en alertas_sistema. Antes la alerta se guardaba al registrarla
+# (procesada=0) y el procesador la volvia a guardar como procesada, asi
+# que cada alerta de la ingesta quedaba dos veces en la tabla.
+#
+#   'bd'       alertas_sistema (via el almacenamiento); asigna alerta['db_id']
+#   'diario'   diario NDJSON de data/alertas (ver diario_alertas)
+#   'consola'  bloque de color para las alertas CRITICA y ADVERTENCIA
+SALIDAS_DEFECTO = ('bd', 'diario', 'consola')
+
+COLORES = {
+    'red': '\033[91m',
+    'yellow': '\033[93m',
+    'green': '\033[92m',
+    'blue': '\033[94m',
+    'reset': '\033[0m'
+}
+COLOR_NIVEL = {'CRITICA': 'red', 'ADVERTENCIA': 'yellow'}
+
+
+class SalidaAlertas(ABC):
+    """Interfaz de una salida: recibe lotes (listas) de alertas ya armadas"""
+
+    nombre = ''
+
+    @abstractmethod
+    def escribir(self, alertas):
+        """Entrega el lote a la salida"""
+
+    def cerrar(self):
+        pass
+
+
+class SalidaBD(SalidaAlertas):
+    nombre = 'bd'
+
+    def __init__(self, almacenamiento, logger):
+        self.almacenamiento = almacenamiento
+        self.logger = logger
+
+    def escribir(self, alertas):
+        """Un solo guardar_alertas por lote; deja el id en alerta['db_id']"""
+        if not alertas:
+            return
+        if not self.almacenamiento.disponible():
+            self.logger.error(f"Base de datos no encontrada: {self.almacenamiento.descripcion}")
+            return
+        try:
+            alerta_ids = self.almacenamiento.guardar_alertas(alertas)
+        except Exception as e:
+            self.logger.error(f"Error guardando alertas en BD: {e}")
+            return
+        for alerta, alerta_id in zip(alertas, alerta_ids):
+            alerta['db_id'] = alerta_id
+            self.logger.info(f"Alerta guardada en BD (ID: {alerta_id}): {alerta['mensaje'][:50]}...")
+
+
+class SalidaDiario(SalidaAlertas):
+    nombre = 'diario'
+
+    def __init__(self, alertas_dir):
+        self.diario = DiarioAlertas(alertas_dir)
+
+    def escribir(self, alertas):
+        for alerta in alertas:
+            self.diario.escribir(alerta)
+
+    def cerrar(self):
+        self.diario.cerrar()
+
+
+class SalidaConsola(SalidaAlertas):
+    nombre = 'consola'
+
+    def escribir(self, alertas):
+        for alerta in alertas:
+            color = COLOR_NIVEL.get(alerta['nivel'])
+            if color:
+                mostrar_alerta_consola(alerta, color)
+
+
+def mostrar_alerta_consola(alerta, color='white'):
+    """Muestra alerta en consola con colores"""
+    color_code = COLORES.get(color, COLORES['reset'])
+    ubicacion = alerta.get('ubicacion', 'Desconocida')
+
+    print(f"\n{color_code}{'='*60}")
+    print(f"ALERTA: {alerta['nivel']} - {alerta['tipo']}")
+    print(f"Ubicacion: {ubicacion}")
+    print(f"Hora: {alerta['timestamp']}")
+    print(f"Mensaje: {alerta['mensaje']}")
+
+    if alerta['datos_adicionales']:
+        print("Datos adicionales:")
+        for key, value in alerta['datos_adicionales'].items():
+            print(f"  {key}: {value}")
+
+    print(f"{'='*60}{COLORES['reset']}\n")
+
+
+def crear_salidas(nombres, almacenamiento, alertas_dir, logger):
+    """Salidas configuradas por nombre ('bd', 'diario', 'consola'), en ese orden"""
+    fabricas = {
+        'bd': lambda: SalidaBD(almacenamiento, logger),
+        'diario': lambda: SalidaDiario(alertas_dir),
+        'consola': SalidaConsola,
+    }
+    desconocidas = [nombre for nombre in nombres if nombre not in fabricas]
+    if desconocidas:
+        raise ValueError(f"Salidas de alertas desconocidas: {', '.join(desconocidas)}")
+    return [fabricas[nombre]() for nombre in nombres]
+
+
+def colapsar_alertas_duplicadas(conn):
+    """Borra las copias de alertas guardadas dos veces; devuelve las borradas
+
+    Copias = mismo timestamp, nivel, tipo, ubicacion y mensaje. Se conserva
+    la enlazada a un response, si no la procesada, si no la mas nueva; los
+    enlaces de las copias pasan a la conservada. No confirma.
+    """
+    conn.execute('DROP TABLE IF EXISTS temp.alertas_duplicadas')
+    conn.execute('''
+        CREATE TEMP TABLE alertas_duplicadas AS
+        SELECT id, conservada FROM (
+            SELECT id,
+                   FIRST_VALUE(id) OVER grupo AS conservada,
+                   ROW_NUMBER() OVER grupo AS orden
+            FROM alertas_sistema a
+            WINDOW grupo AS (
+                PARTITION BY timestamp, nivel, tipo, ubicacion, mensaje
+                ORDER BY EXISTS (SELECT 1 FROM responses_alertas e WHERE e.alerta_id = a.id) DESC,
+                         procesada DESC, id DESC
+            )
+        )
+        WHERE orden > 1
+    ''')
+    conn.execute('''
+        INSERT OR IGNORE INTO responses_alertas (response_id, alerta_id)
+        SELECT e.response_id, d.conservada
+        FROM responses_alertas e JOIN temp.alertas_duplicadas d ON d.id = e.alerta_id
+    ''')
+    # Los triggers quitan enlaces, entradas FTS y descuentan los contadores
+    borradas = conn.execute('DELETE FROM alertas_sistema WHERE id IN (SELECT id FROM temp.alertas_duplicadas)').rowcount
+    conn.execute('DROP TABLE temp.alertas_duplicadas')
+    return borradas
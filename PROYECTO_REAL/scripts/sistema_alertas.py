@@ -1,9 +1,14 @@
 import os
 import json
 import logging
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from enum import Enum
-import sqlite3
+from validador_payload import validar_lectura
+from almacenamiento import AlmacenamientoSQLite
+from tiempo_utc import epoch_hace
+from salidas_alertas import SALIDAS_DEFECTO, crear_salidas
+from enfriamiento_alertas import CacheEnfriamiento, CacheEnfriamientoCompartida
 
 class NivelAlerta(Enum):
     """Niveles de alerta"""
@@ -20,10 +25,14 @@ class TipoAlerta(Enum):
     SISTEMA = "SISTEMA"
 
 class SistemaAlertas:
-    def __init__(self):
+    def __init__(self, almacenamiento=None, salidas=SALIDAS_DEFECTO):
+        """almacenamiento: motor de persistencia; por defecto la BD SQLite (sin crearla)
+        salidas: nombres de las salidas de cada alerta (ver salidas_alertas)
+        """
         self.proyecto_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
         self.logs_dir = os.path.join(self.proyecto_root, 'logs')
         self.alertas_dir = os.path.join(self.proyecto_root, 'data', 'alertas')
+        self.almacenamiento = almacenamiento or AlmacenamientoSQLite(crear=False)
         
         # Crear directorios si no existen
         os.makedirs(self.logs_dir, exist_ok=True)
@@ -32,8 +41,13 @@ class SistemaAlertas:
         # Configurar logging
         self.configurar_logging()
         
-        # Actualizar tabla de alertas si es necesario
-        self.actualizar_tabla_alertas()
+        # Cada alerta se escribe una vez en cada salida; dentro de lote() se acumulan
+        self.salidas = crear_salidas(salidas, self.almacenamiento, self.alertas_dir, self.logger)
+        self._lote = None
+        
+        # Las migraciones pendientes las aplica el almacenamiento al abrir la BD
+        if not self.almacenamiento.disponible():
+            print(f"Base de datos no encontrada en {self.almacenamiento.descripcion}")
         
         # Umbrales para alertas
         self.umbrales = {
@@ -46,7 +60,11 @@ class SistemaAlertas:
         }
         
         # Cache para evitar alertas duplicadas en corto tiempo
-        self.ultimas_alertas = {}  # formato: {clave_alerta: timestamp}
+        # Compartida entre procesos y ejecuciones si hay BD; si no, solo en memoria
+        if self.almacenamiento.disponible():
+            self.ultimas_alertas = CacheEnfriamientoCompartida(self.almacenamiento)
+        else:
+            self.ultimas_alertas = CacheEnfriamiento()
         self.tiempo_minimo_entre_alertas = {
             'CALIDAD_AIRE': 300,      # 5 minutos para alertas de calidad
             'SENSOR_FALLIDO': 600,    # 10 minutos para fallos de sensor
@@ -55,86 +73,6 @@ class SistemaAlertas:
             'SISTEMA': 60             # 1 minuto
         }
     
-    def actualizar_tabla_alertas(self):
-        """Actualiza la tabla de alertas con estructura completa"""
-        db_path = os.path.join(self.proyecto_root, 'data/database/calidad_aire.db')
-        
-        if not os.path.exists(db_path):
-            print(f"Base de datos no encontrada en {db_path}")
-            return False
-        
-        try:
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            
-            # 1. Eliminar tabla antigua corrupta si existe
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='alertas'")
-            if cursor.fetchone():
-                cursor.execute("DROP TABLE IF EXISTS alertas")
-                self.logger.info("Tabla 'alertas' antigua eliminada")
-            
-            # 2. Crear tabla alertas_sistema si no existe
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='alertas_sistema'")
-            if not cursor.fetchone():
-                cursor.execute('''
-                    CREATE TABLE alertas_sistema (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        timestamp TEXT NOT NULL,
-                        nivel TEXT NOT NULL,
-                        tipo TEXT NOT NULL,
-                        ubicacion TEXT,
-                        mensaje TEXT NOT NULL,
-                        datos_adicionales TEXT,
-                        procesada INTEGER DEFAULT 0,
-                        fecha_procesada TEXT
-                    )
-                ''')
-                self.logger.info("Tabla 'alertas_sistema' creada")
-            
-            # 3. Verificar y agregar columnas faltantes
-            cursor.execute("PRAGMA table_info(alertas_sistema)")
-            columnas_existentes = {col[1] for col in cursor.fetchall()}
-            
-            # Lista completa de columnas requeridas
-            columnas_requeridas = [
-                ('timestamp', 'TEXT NOT NULL'),
-                ('nivel', 'TEXT NOT NULL'),
-                ('tipo', 'TEXT NOT NULL'),
-                ('ubicacion', 'TEXT'),
-                ('mensaje', 'TEXT NOT NULL'),
-                ('datos_adicionales', 'TEXT'),
-                ('procesada', 'INTEGER DEFAULT 0'),
-                ('fecha_procesada', 'TEXT')
-            ]
-            
-            for columna, tipo in columnas_requeridas:
-                if columna not in columnas_existentes:
-                    cursor.execute(f'ALTER TABLE alertas_sistema ADD COLUMN {columna} {tipo}')
-                    self.logger.info(f"Columna '{columna}' agregada")
-            
-            # 4. Crear índices si no existen
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='index' AND name='idx_alertas_timestamp'")
-            if not cursor.fetchone():
-                cursor.execute('CREATE INDEX idx_alertas_timestamp ON alertas_sistema(timestamp)')
-            
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='index' AND name='idx_alertas_procesada'")
-            if not cursor.fetchone():
-                cursor.execute('CREATE INDEX idx_alertas_procesada ON alertas_sistema(procesada)')
-            
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='index' AND name='idx_alertas_nivel'")
-            if not cursor.fetchone():
-                cursor.execute('CREATE INDEX idx_alertas_nivel ON alertas_sistema(nivel)')
-            
-            conn.commit()
-            conn.close()
-            
-            self.logger.info("Estructura de tabla alertas_sistema verificada y actualizada")
-            return True
-            
-        except Exception as e:
-            self.logger.error(f"Error actualizando tabla de alertas: {e}")
-            return False
-    
     def configurar_logging(self):
         """Configura el sistema de logging"""
         log_file = os.path.join(self.logs_dir, 'alertas.log')
@@ -165,35 +103,19 @@ class SistemaAlertas:
     
     def deberia_generar_alerta(self, tipo, datos_clave=None, ubicacion="general"):
         """Verifica si se debe generar una alerta (evita duplicados)"""
-        ahora = datetime.now()
-        
         # Crear clave unica para esta alerta
         if datos_clave:
             clave = f"{tipo.value}_{ubicacion}_{datos_clave}"
         else:
             clave = f"{tipo.value}_{ubicacion}"
         
-        # Verificar si ya hubo una alerta similar recientemente
-        if clave in self.ultimas_alertas:
-            tiempo_desde_ultima = (ahora - self.ultimas_alertas[clave]).total_seconds()
-            tiempo_minimo = self.tiempo_minimo_entre_alertas.get(tipo.value, 300)
-            
-            if tiempo_desde_ultima < tiempo_minimo:
-                # No generar alerta, aun esta en el periodo de espera
-                self.logger.debug(f"Alerta suprimida (duplicada reciente): {clave}")
-                return False
-        
-        # Actualizar timestamp
-        self.ultimas_alertas[clave] = ahora
-        
-        # Limpiar cache viejo (mas de 1 hora)
-        claves_a_eliminar = []
-        for key, timestamp in self.ultimas_alertas.items():
-            if (ahora - timestamp).total_seconds() > 3600:
-                claves_a_eliminar.append(key)
-        
-        for key in claves_a_eliminar:
-            del self.ultimas_alertas[key]
+        # Verificar si ya hubo una alerta similar recientemente (la cache olvida
+        # sola las claves de mas de 1 hora, sin recorrerse completa)
+        tiempo_minimo = self.tiempo_minimo_entre_alertas.get(tipo.value, 300)
+        if not self.ultimas_alertas.permitir(clave, tiempo_minimo):
+            # No generar alerta, aun esta en el periodo de espera
+            self.logger.debug(f"Alerta suprimida (duplicada reciente): {clave}")
+            return False
         
         return True
     
@@ -214,106 +136,53 @@ class SistemaAlertas:
         # Registrar en log
         if nivel == NivelAlerta.CRITICA:
             self.logger.critical(f"{tipo.value} [{ubicacion}]: {mensaje}")
-            self.mostrar_alerta_consola(alerta, color='red')
         elif nivel == NivelAlerta.ADVERTENCIA:
             self.logger.warning(f"{tipo.value} [{ubicacion}]: {mensaje}")
-            self.mostrar_alerta_consola(alerta, color='yellow')
         else:
             self.logger.info(f"{tipo.value} [{ubicacion}]: {mensaje}")
         
-        # Guardar en archivo JSON
-        self.guardar_alerta_json(alerta)
-        
-        # Guardar en base de datos
-        self.guardar_alerta_db(alerta)
+        # Entregar a las salidas (BD, diario, consola) o acumular en el lote abierto
+        if self._lote is not None:
+            self._lote.append(alerta)
+        else:
+            self.emitir([alerta])
         
         return alerta
     
-    def mostrar_alerta_consola(self, alerta, color='white'):
-        """Muestra alerta en consola con colores"""
-        colores = {
-            'red': '\033[91m',
-            'yellow': '\033[93m',
-            'green': '\033[92m',
-            'blue': '\033[94m',
-            'reset': '\033[0m'
-        }
-        
-        color_code = colores.get(color, colores['reset'])
-        ubicacion = alerta.get('ubicacion', 'Desconocida')
-        
-        print(f"\n{color_code}{'='*60}")
-        print(f"ALERTA: {alerta['nivel']} - {alerta['tipo']}")
-        print(f"Ubicacion: {ubicacion}")
-        print(f"Hora: {alerta['timestamp']}")
-        print(f"Mensaje: {alerta['mensaje']}")
-        
-        if alerta['datos_adicionales']:
-            print("Datos adicionales:")
-            for key, value in alerta['datos_adicionales'].items():
-                print(f"  {key}: {value}")
-        
-        print(f"{'='*60}{colores['reset']}\n")
-    
-    def guardar_alerta_json(self, alerta):
-        """Guarda la alerta en un archivo JSON"""
-        fecha = datetime.now().strftime("%Y%m%d")
-        archivo_alertas = os.path.join(self.alertas_dir, f'alertas_{fecha}.json')
-        
-        # Cargar alertas existentes o crear lista nueva
-        if os.path.exists(archivo_alertas):
-            with open(archivo_alertas, 'r', encoding='utf-8') as f:
-                try:
-                    alertas_existentes = json.load(f)
-                except:
-                    alertas_existentes = []
-        else:
-            alertas_existentes = []
-        
-        # Agregar nueva alerta
-        alertas_existentes.append(alerta)
-        
-        # Guardar
-        with open(archivo_alertas, 'w', encoding='utf-8') as f:
-            json.dump(alertas_existentes, f, indent=2, ensure_ascii=False)
+    def emitir(self, alertas):
+        """Escribe un lote de alertas en cada salida configurada (una sola vez)"""
+        for salida in self.salidas:
+            salida.escribir(alertas)
     
-    def guardar_alerta_db(self, alerta):
-        """Guarda la alerta en la base de datos - VERSION CORREGIDA"""
-        db_path = os.path.join(self.proyecto_root, 'data/database/calidad_aire.db')
-        
-        if not os.path.exists(db_path):
-            self.logger.error(f"Base de datos no encontrada: {db_path}")
-            return
-        
+    @contextmanager
+    def lote(self, procesada_por=None):
+        """Acumula las alertas registradas dentro del bloque y las emite juntas al salir
+
+        procesada_por: si se indica, las alertas se guardan ya procesadas
+        (procesada=1), como las que genera el procesador durante la ingesta.
+        Al salir cada alerta guardada tiene su 'db_id'.
+        """
+        anterior, self._lote = self._lote, []
         try:
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            
-            # CORRECCION: Guardar con procesada=0 y fecha_procesada=NULL
-            # El procesador se encargara de marcarla como procesada
-            cursor.execute('''
-                INSERT INTO alertas_sistema 
-                (timestamp, nivel, tipo, ubicacion, mensaje, datos_adicionales, procesada, fecha_procesada)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                alerta['timestamp'],
-                alerta['nivel'],
-                alerta['tipo'],
-                alerta.get('ubicacion', 'general'),
-                alerta['mensaje'],
-                json.dumps(alerta['datos_adicionales']),
-                0,      # procesada = 0 (no procesada aun)
-                None    # fecha_procesada = NULL (se actualizara cuando se procese)
-            ))
-            
-            alerta_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
-            
-            self.logger.info(f"Alerta guardada en BD (ID: {alerta_id}): {alerta['mensaje'][:50]}...")
-            
-        except Exception as e:
-            self.logger.error(f"Error guardando alerta en BD: {e}")
+            yield self._lote
+        finally:
+            alertas, self._lote = self._lote, anterior
+            if procesada_por and alertas:
+                ahora = datetime.now().isoformat()
+                for alerta in alertas:
+                    alerta['datos_adicionales'] = {
+                        **alerta['datos_adicionales'],
+                        'procesado_en': ahora,
+                        'procesado_por': procesada_por
+                    }
+                    alerta['procesada'], alerta['fecha_procesada'] = 1, ahora
+            if alertas:
+                self.emitir(alertas)
+    
+    def cerrar(self):
+        """Cierra las salidas (vacia el diario)"""
+        for salida in self.salidas:
+            salida.cerrar()
     
     def verificar_calidad_aire(self, datos_sensor, ubicacion="Desconocida"):
         """Verifica la calidad del aire con deduplicacion"""
@@ -458,37 +327,24 @@ class SistemaAlertas:
         
         return [alerta]
     
-    def verificar_datos_incompletos(self, json_data):
-        """Verifica si los datos del sensor estan incompletos"""
+    def verificar_datos_incompletos(self, json_data, sensores_faltantes=None):
+        """Verifica si los datos del sensor estan incompletos
+        
+        Si el llamador ya valido la lectura puede pasar sensores_faltantes
+        para no recorrer el JSON otra vez.
+        """
         alertas = []
         
-        sensor_data = json_data.get('sensor_data', {})
-        readings = sensor_data.get('readings', {})
-        metadata = sensor_data.get('metadata', {})
+        metadata = json_data.get('sensor_data', {}).get('metadata', {})
         ubicacion = metadata.get('location', 'Desconocida')
         
         # Verificar sensores individuales
-        sensores_faltantes = []
-        
-        if 'scd30' not in readings:
-            sensores_faltantes.append('SCD30 (CO2)')
-        else:
-            scd30 = readings['scd30']
-            if not all(key in scd30 for key in ['co2', 'temperature', 'humidity']):
-                sensores_faltantes.append('SCD30 datos incompletos')
-        
-        if 'bme280' not in readings:
-            sensores_faltantes.append('BME280 (meteorologico)')
-        else:
-            bme280 = readings['bme280']
-            if not all(key in bme280 for key in ['temperature', 'humidity', 'pressure']):
-                sensores_faltantes.append('BME280 datos incompletos')
-        
-        if 'mq135' not in readings:
-            sensores_faltantes.append('MQ135 (calidad aire)')
+        if sensores_faltantes is None:
+            sensores_faltantes = validar_lectura(json_data)['sensores_faltantes']
         
         if sensores_faltantes:
-            clave = f"datos_incompletos_{hash(str(sensores_faltantes))}"
+            # Clave estable entre procesos (hash() de str cambia en cada ejecucion)
+            clave = f"datos_incompletos_{'|'.join(sorted(sensores_faltantes))}"
             if self.deberia_generar_alerta(TipoAlerta.DATOS_INCOMPLETOS, clave, ubicacion):
                 alerta = self.registrar_alerta(
                     nivel=NivelAlerta.ADVERTENCIA,
@@ -507,32 +363,16 @@ class SistemaAlertas:
     
     def verificar_alertas_pendientes(self):
         """Verifica si hay alertas no procesadas en la BD"""
-        db_path = os.path.join(self.proyecto_root, 'data/database/calidad_aire.db')
-        
-        if not os.path.exists(db_path):
+        if not self.almacenamiento.disponible():
             return {}
         
         try:
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            
             # Verificar alertas criticas pendientes (mas de 1 hora)
-            cursor.execute('''
-                SELECT COUNT(*) FROM alertas_sistema 
-                WHERE procesada = 0 AND nivel = 'CRITICA'
-                AND datetime(timestamp) <= datetime('now', '-1 hours')
-            ''')
-            alertas_criticas_pendientes = cursor.fetchone()[0]
+            alertas_criticas_pendientes = self.almacenamiento.contar_alertas_pendientes('CRITICA', epoch_hace(1))
             
             # Verificar alertas de advertencia pendientes (mas de 4 horas)
-            cursor.execute('''
-                SELECT COUNT(*) FROM alertas_sistema 
-                WHERE procesada = 0 AND nivel = 'ADVERTENCIA'
-                AND datetime(timestamp) <= datetime('now', '-4 hours')
-            ''')
-            alertas_advertencia_pendientes = cursor.fetchone()[0]
-            
-            conn.close()
+            alertas_advertencia_pendientes = self.almacenamiento.contar_alertas_pendientes(
+                'ADVERTENCIA', epoch_hace(4))
             
             # Generar alerta del sistema si hay alertas viejas pendientes
             if alertas_criticas_pendientes > 0:
@@ -572,117 +412,32 @@ class SistemaAlertas:
     
     def obtener_alertas_pendientes(self, nivel=None, ubicacion=None, limite=20):
         """Obtiene alertas pendientes de la base de datos"""
-        db_path = os.path.join(self.proyecto_root, 'data/database/calidad_aire.db')
-        
-        if not os.path.exists(db_path):
+        if not self.almacenamiento.disponible():
             return []
         
         try:
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            
-            # Construir query basada en filtros
-            query = '''
-                SELECT id, timestamp, nivel, tipo, ubicacion, mensaje, datos_adicionales, 
-                       procesada, fecha_procesada 
-                FROM alertas_sistema 
-                WHERE procesada = 0
-            '''
-            params = []
-            
-            if nivel:
-                query += ' AND nivel = ?'
-                params.append(nivel)
-            
-            if ubicacion:
-                query += ' AND ubicacion LIKE ?'
-                params.append(f'%{ubicacion}%')
-            
-            query += ' ORDER BY timestamp DESC LIMIT ?'
-            params.append(limite)
-            
-            cursor.execute(query, params)
-            resultados = cursor.fetchall()
-            
-            alertas = []
-            for row in resultados:
-                alerta = {
-                    'id': row[0],
-                    'timestamp': row[1],
-                    'nivel': row[2],
-                    'tipo': row[3],
-                    'ubicacion': row[4],
-                    'mensaje': row[5],
-                    'datos_adicionales': json.loads(row[6]) if row[6] else {},
-                    'procesada': row[7],
-                    'fecha_procesada': row[8]
-                }
-                alertas.append(alerta)
-            
-            conn.close()
-            return alertas
-            
+            return self.almacenamiento.alertas_pendientes(nivel, ubicacion, limite)
         except Exception as e:
             self.logger.error(f"Error obteniendo alertas pendientes: {e}")
             return []
     
     def marcar_alerta_procesada(self, alerta_id, comentario=""):
         """Marca una alerta como procesada CORRECTAMENTE"""
-        db_path = os.path.join(self.proyecto_root, 'data/database/calidad_aire.db')
-        
-        if not os.path.exists(db_path):
-            self.logger.error(f"Base de datos no encontrada: {db_path}")
+        if not self.almacenamiento.disponible():
+            self.logger.error(f"Base de datos no encontrada: {self.almacenamiento.descripcion}")
             return False
         
         try:
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            
-            fecha_procesada = datetime.now().isoformat()
-            
-            # Obtener datos actuales de la alerta
-            cursor.execute('''
-                SELECT datos_adicionales FROM alertas_sistema WHERE id = ?
-            ''', (alerta_id,))
-            
-            resultado = cursor.fetchone()
-            if not resultado:
-                self.logger.error(f"Alerta con ID {alerta_id} no encontrada")
-                conn.close()
-                return False
-            
             # Actualizar datos adicionales con comentario
-            if resultado[0]:
-                datos_adicionales = json.loads(resultado[0])
-                datos_adicionales['comentario_procesado'] = comentario
-                datos_adicionales['fecha_procesado'] = fecha_procesada
-            else:
-                datos_adicionales = {
-                    'comentario_procesado': comentario,
-                    'fecha_procesado': fecha_procesada
-                }
-            
-            # Actualizar alerta como procesada
-            cursor.execute('''
-                UPDATE alertas_sistema 
-                SET procesada = 1, 
-                    fecha_procesada = ?,
-                    datos_adicionales = ?
-                WHERE id = ?
-            ''', (
-                fecha_procesada, 
-                json.dumps(datos_adicionales, ensure_ascii=False), 
-                alerta_id
-            ))
+            actualizadas = self.almacenamiento.marcar_alertas_procesadas([(alerta_id, {
+                'comentario_procesado': comentario,
+                'fecha_procesado': datetime.now().isoformat()
+            })])
             
-            if cursor.rowcount == 0:
-                self.logger.error(f"No se pudo actualizar alerta {alerta_id}")
-                conn.close()
+            if actualizadas == 0:
+                self.logger.error(f"Alerta con ID {alerta_id} no encontrada")
                 return False
             
-            conn.commit()
-            conn.close()
-            
             self.logger.info(f"Alerta {alerta_id} marcada como procesada: {comentario}")
             return True
             
@@ -690,55 +445,26 @@ class SistemaAlertas:
             self.logger.error(f"Error marcando alerta como procesada: {e}")
             return False
     
+    def buscar_alertas(self, texto, limite=20, solo_pendientes=False):
+        """Busca alertas por fragmentos del mensaje, ubicacion o condicion (indice FTS5)"""
+        if not self.almacenamiento.disponible():
+            return []
+        return self.almacenamiento.buscar_alertas(texto, limite, solo_pendientes)
+    
     def generar_reporte_alertas(self, horas=24):
         """Genera un reporte de alertas de las ultimas N horas"""
         fecha_inicio = datetime.now().isoformat()
         
-        db_path = os.path.join(self.proyecto_root, 'data/database/calidad_aire.db')
-        
-        if not os.path.exists(db_path):
-            self.logger.error(f"Base de datos no encontrada: {db_path}")
+        if not self.almacenamiento.disponible():
+            self.logger.error(f"Base de datos no encontrada: {self.almacenamiento.descripcion}")
             return None
         
         try:
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            
             # Obtener estadisticas
-            cursor.execute('''
-                SELECT 
-                    nivel,
-                    tipo,
-                    ubicacion,
-                    COUNT(*) as cantidad,
-                    SUM(CASE WHEN procesada = 1 THEN 1 ELSE 0 END) as procesadas
-                FROM alertas_sistema
-                WHERE datetime(timestamp) >= datetime('now', ?)
-                GROUP BY nivel, tipo, ubicacion
-                ORDER BY 
-                    CASE nivel
-                        WHEN 'CRITICA' THEN 1
-                        WHEN 'ADVERTENCIA' THEN 2
-                        WHEN 'INFO' THEN 3
-                        ELSE 4
-                    END,
-                    cantidad DESC
-            ''', (f'-{horas} hours',))
-            
-            resultados = cursor.fetchall()
+            resultados = self.almacenamiento.resumen_alertas(epoch_hace(horas))
             
             # Obtener alertas mas recientes
-            cursor.execute('''
-                SELECT timestamp, nivel, tipo, ubicacion, mensaje, procesada, fecha_procesada
-                FROM alertas_sistema
-                WHERE datetime(timestamp) >= datetime('now', ?)
-                ORDER BY timestamp DESC
-                LIMIT 10
-            ''', (f'-{horas} hours',))
-            
-            alertas_recientes = cursor.fetchall()
-            
-            conn.close()
+            alertas_recientes = self.almacenamiento.alertas_recientes(epoch_hace(horas), limite=10)
             
             # Construir reporte
             reporte = {
@@ -762,15 +488,12 @@ class SistemaAlertas:
                 reporte['total_alertas'] += cantidad
                 reporte['total_procesadas'] += procesadas
             
-            for timestamp, nivel, tipo, ubicacion, mensaje, procesada, fecha_procesada in alertas_recientes:
+            for alerta in alertas_recientes:
+                mensaje = alerta['mensaje']
                 reporte['alertas_recientes'].append({
-                    'timestamp': timestamp,
-                    'nivel': nivel,
-                    'tipo': tipo,
-                    'ubicacion': ubicacion,
+                    **alerta,
                     'mensaje': mensaje[:100] + '...' if len(mensaje) > 100 else mensaje,
-                    'procesada': bool(procesada),
-                    'fecha_procesada': fecha_procesada
+                    'procesada': bool(alerta['procesada'])
                 })
             
             # Guardar reporte
@@ -0,0 +1,35 @@
+import time
+from datetime import datetime
+
+
+def a_epoch(valor):
+    """Convierte un timestamp ISO (naive local o con 'Z'/offset) a epoch UTC en segundos
+
+    Devuelve None si el valor esta vacio o no se puede interpretar.
+    """
+    if valor is None or valor == '':
+        return None
+    if isinstance(valor, (int, float)):
+        return int(valor)
+    if isinstance(valor, datetime):
+        dt = valor
+    else:
+        try:
+            dt = datetime.fromisoformat(str(valor).strip().replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    # Los timestamps naive provienen de datetime.now(): hora local del equipo
+    if dt.tzinfo is None:
+        dt = dt.astimezone()
+    return int(dt.timestamp())
+
+
+def epoch_ahora():
+    """Epoch UTC actual en segundos"""
+    return int(time.time())
+
+
+def epoch_hace(horas):
+    """Epoch UTC de hace N horas (limite inferior para filtros por rango)"""
+    return epoch_ahora() - int(horas * 3600)
+
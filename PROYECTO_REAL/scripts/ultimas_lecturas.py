@@ -0,0 +1,181 @@
+from esquema_db import existe_tabla
+
+# Ultima lectura de cada (ubicacion, dispositivo). La tabla latest_readings
+# se actualiza en la misma transaccion que cada lote de responses y el
+# motor de almacenamiento guarda una copia en un dict del proceso. El
+# "valor actual" de cada sala se lee de unas pocas filas, sin ordenar
+# sensor_responses.
+TABLA_ULTIMAS = 'latest_readings'
+SIN_DISPOSITIVO = 0  # dispositivo_id de las lecturas sin codigo de dispositivo
+
+COLUMNAS_ULTIMAS = (
+    'ubicacion_id', 'dispositivo_id', 'ubicacion', 'device_id', 'request_id',
+    'created_at', 'created_at_epoch', 'calidad_aire_pred', 'co2_ppm', 'co2_nivel',
+    'temperature', 'humedad', 'presion', 'prediccion_valor'
+)
+_CLAVES = ('ubicacion_id', 'dispositivo_id')
+
+# Una lectura mas antigua que la guardada (p. ej. un JSON atrasado) no la reemplaza
+_SQL_UPSERT = (
+    f"INSERT INTO {TABLA_ULTIMAS} ({', '.join(COLUMNAS_ULTIMAS)}) "
+    f"VALUES ({', '.join('?' * len(COLUMNAS_ULTIMAS))}) "
+    f"ON CONFLICT ({', '.join(_CLAVES)}) DO UPDATE SET "
+    + ', '.join(f'{columna} = excluded.{columna}' for columna in COLUMNAS_ULTIMAS if columna not in _CLAVES)
+    + f" WHERE excluded.created_at_epoch >= {TABLA_ULTIMAS}.created_at_epoch"
+)
+
+
+def crear_tabla_ultimas(conn):
+    """Crea latest_readings; devuelve True si era nueva"""
+    nueva = not existe_tabla(conn, TABLA_ULTIMAS)
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {TABLA_ULTIMAS} (
+            ubicacion_id INTEGER NOT NULL,
+            dispositivo_id INTEGER NOT NULL,
+            ubicacion TEXT,
+            device_id TEXT,
+            request_id INTEGER,
+            created_at TEXT,
+            created_at_epoch INTEGER NOT NULL,
+            calidad_aire_pred TEXT,
+            co2_ppm REAL,
+            co2_nivel TEXT,
+            temperature REAL,
+            humedad REAL,
+            presion REAL,
+            prediccion_valor REAL,
+            PRIMARY KEY (ubicacion_id, dispositivo_id)
+        ) WITHOUT ROWID
+    ''')
+    return nueva
+
+
+def lecturas_de_responses(responses):
+    """Responses (dicts de sensor_responses) -> lecturas para latest_readings
+
+    Se omiten las que no tienen fecha o ubicacion resuelta.
+    """
+    lecturas = []
+    for response in responses:
+        if response.get('created_at_epoch') is None or response.get('ubicacion_id') is None:
+            continue
+        lectura = {columna: response.get(columna) for columna in COLUMNAS_ULTIMAS}
+        if lectura['dispositivo_id'] is None:
+            lectura['dispositivo_id'] = SIN_DISPOSITIVO
+        lecturas.append(lectura)
+    return lecturas
+
+
+def actualizar_ultimas(conn, lecturas):
+    """Upsert de un lote de lecturas; no confirma (va en la transaccion de la ingesta)"""
+    if lecturas:
+        conn.executemany(_SQL_UPSERT, [[lectura[columna] for columna in COLUMNAS_ULTIMAS]
+                                       for lectura in lecturas])
+
+
+def reconstruir_ultimas(conn):
+    """Recalcula latest_readings desde sensor_responses (no confirma)"""
+    # Con la misma fecha (epoch en segundos) gana la ultima insertada, como en el upsert
+    columnas = [f'COALESCE(dispositivo_id, {SIN_DISPOSITIVO}) AS dispositivo_id' if columna == 'dispositivo_id' else columna
+                for columna in COLUMNAS_ULTIMAS]
+    conn.execute(f'DELETE FROM {TABLA_ULTIMAS}')
+    conn.execute(f'''
+        INSERT INTO {TABLA_ULTIMAS} ({', '.join(COLUMNAS_ULTIMAS)})
+        SELECT {', '.join(COLUMNAS_ULTIMAS)}
+        FROM (
+            SELECT {', '.join(columnas)},
+                   ROW_NUMBER() OVER (PARTITION BY ubicacion_id, COALESCE(dispositivo_id, {SIN_DISPOSITIVO})
+                                      ORDER BY created_at_epoch DESC, id DESC) AS orden
+            FROM sensor_responses
+            WHERE created_at_epoch IS NOT NULL AND ubicacion_id IS NOT NULL
+        )
+        WHERE orden = 1
+    ''')
+
+
+def leer_ultimas(conn, ubicacion=None):
+    """Lecturas de latest_readings (dicts), de la mas reciente a la mas antigua"""
+    query = f"SELECT {', '.join(COLUMNAS_ULTIMAS)} FROM {TABLA_ULTIMAS}"
+    params = ()
+    if ubicacion is not None:
+        query += ' WHERE ubicacion = ?'
+        params = (ubicacion,)
+    query += ' ORDER BY created_at_epoch DESC, created_at DESC'
+    return [dict(zip(COLUMNAS_ULTIMAS, fila)) for fila in conn.execute(query, params)]
+
+
+def actuales_por_ubicacion(lecturas):
+    """{ubicacion: lectura mas reciente} a partir de lecturas de latest_readings"""
+    actuales = {}
+    for lectura in lecturas:
+        actual = actuales.get(lectura['ubicacion'])
+        if actual is None or lectura['created_at_epoch'] > actual['created_at_epoch']:
+            actuales[lectura['ubicacion']] = lectura
+    return actuales
+
+
+class CacheUltimasLecturas:
+    """Copia en proceso de latest_readings: (ubicacion_id, dispositivo_id) -> lectura
+
+    Se carga una vez (de la tabla o vacia) y despues se actualiza con cada
+    lote ya confirmado, con la misma regla que el upsert: una lectura mas
+    antigua no reemplaza a la guardada. Solo ve las escrituras de este
+    proceso posteriores a la carga.
+    """
+
+    def __init__(self):
+        self._lecturas = None
+
+    def cargada(self):
+        return self._lecturas is not None
+
+    def cargar(self, lecturas):
+        self._lecturas = {}
+        self.actualizar(lecturas)
+
+    def actualizar(self, lecturas):
+        if self._lecturas is None:
+            return
+        for lectura in lecturas:
+            clave = (lectura['ubicacion_id'], lectura['dispositivo_id'])
+            actual = self._lecturas.get(clave)
+            if actual is None or lectura['created_at_epoch'] >= actual['created_at_epoch']:
+                self._lecturas[clave] = dict(lectura)
+
+    def lecturas(self, ubicacion=None):
+        """Lecturas de la mas reciente a la mas antigua (opcionalmente de una ubicacion)"""
+        lecturas = [dict(lectura) for lectura in (self._lecturas or {}).values()
+                    if ubicacion is None or lectura['ubicacion'] == ubicacion]
+        lecturas.sort(key=lambda lectura: (lectura['created_at_epoch'], lectura['created_at'] or ''), reverse=True)
+        return lecturas
+
+
+def mostrar_lecturas_actuales(lecturas):
+    """Imprime la lectura actual de cada ubicacion"""
+    print("LECTURAS ACTUALES POR UBICACION:")
+    print("-" * 60)
+    actuales = actuales_por_ubicacion(lecturas)
+    if not actuales:
+        print("Sin lecturas registradas")
+    for ubicacion, lectura in sorted(actuales.items()):
+        print(f"{ubicacion}: CO2 {lectura['co2_ppm']} ppm  {lectura['calidad_aire_pred']}  "
+              f"Temp: {lectura['temperature']}°C  Hum: {lectura['humedad']}%  "
+              f"[{lectura['device_id']}, {lectura['created_at']}]")
+    print()
+
+
+def main():
+    """Muestra la lectura actual de cada ubicacion"""
+    from conexion_db import obtener_conexion
+    from migraciones import migrar
+
+    conn = obtener_conexion(crear=False)
+    if conn is None:
+        print("Base de datos no encontrada")
+        return
+    migrar(conn)
+    mostrar_lecturas_actuales(leer_ultimas(conn))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import math
+from datetime import datetime
+
+# Esquema de sensores: campos esperados, rango plausible y nombre de la caracteristica
+# (sensor, campo, caracteristica, minimo, maximo)
+ESQUEMA_LECTURAS = (
+    ('scd30', 'co2', 'co2', 0, 10000),
+    ('scd30', 'temperature', 'temperatura_scd', -40, 85),
+    ('scd30', 'humidity', 'humedad_scd', 0, 100),
+    ('bme280', 'temperature', 'temperatura_bme', -40, 85),
+    ('bme280', 'humidity', 'humedad_bme', 0, 100),
+    ('bme280', 'pressure', 'presion', 300, 1100),
+    ('mq135', 'analog_value', 'mq135_analog', 0, 4095),
+    ('mq135', 'digital_value', 'mq135_digital', 0, 1),
+)
+
+# Campos sin los cuales la lectura se rechaza: sin CO2 quedaria en 0 y se
+# clasificaria como "Excelente". Los demas son opcionales (alerta de datos
+# incompletos y valor por defecto 0).
+CAMPOS_REQUERIDOS = frozenset({('scd30', 'co2')})
+
+# Etiquetas usadas en las alertas de datos incompletos (sensor ausente, campos ausentes)
+ETIQUETAS_SENSORES = {
+    'scd30': ('SCD30 (CO2)', 'SCD30 datos incompletos'),
+    'bme280': ('BME280 (meteorologico)', 'BME280 datos incompletos'),
+    'mq135': ('MQ135 (calidad aire)', None),
+}
+
+
+class ValidadorPayload:
+    """Valida una lectura de sensores en una sola pasada.
+
+    El esquema se compila una vez al crear el validador. Cada llamada a
+    validar() recorre el JSON una sola vez y devuelve el vector de
+    caracteristicas, la lista de sensores opcionales faltantes y los
+    errores que impiden guardar la lectura (incluida la falta de un campo
+    requerido).
+    """
+
+    def __init__(self, esquema=ESQUEMA_LECTURAS, etiquetas=ETIQUETAS_SENSORES, requeridos=CAMPOS_REQUERIDOS):
+        # Compilar: agrupar los chequeos por sensor conservando el orden
+        sensores = {}
+        for sensor, campo, caracteristica, minimo, maximo in esquema:
+            sensores.setdefault(sensor, []).append(
+                (campo, caracteristica, float(minimo), float(maximo), (sensor, campo) in requeridos))
+
+        self._sensores = tuple(
+            (sensor, tuple(campos), etiquetas.get(sensor, (sensor, None)))
+            for sensor, campos in sensores.items()
+        )
+        self._caracteristicas_default = {caracteristica: 0 for _, _, caracteristica, _, _ in esquema}
+
+    def validar(self, json_data):
+        """Valida la lectura y extrae caracteristicas
+
+        Devuelve un dict con 'valido', 'errores', 'features',
+        'sensores_faltantes' y 'metadata'.
+        """
+        errores = []
+        features = dict(self._caracteristicas_default)
+        sensores_faltantes = []
+
+        sensor_data = json_data.get('sensor_data') if isinstance(json_data, dict) else None
+        if not isinstance(sensor_data, dict):
+            return self._resultado(['Falta el objeto sensor_data'], features, sensores_faltantes, {})
+
+        metadata = sensor_data.get('metadata', {})
+        readings = sensor_data.get('readings', {})
+        if not isinstance(metadata, dict):
+            errores.append('metadata no es un objeto')
+            metadata = {}
+        if not isinstance(readings, dict):
+            errores.append('readings no es un objeto')
+            readings = {}
+
+        for sensor, campos, (etiqueta_faltante, etiqueta_incompleto) in self._sensores:
+            lectura = readings.get(sensor)
+            if lectura is None:
+                faltan = [campo for campo, _, _, _, requerido in campos if requerido]
+                if faltan:
+                    errores.extend(f"Falta {sensor}.{campo} (requerido)" for campo in faltan)
+                else:
+                    sensores_faltantes.append(etiqueta_faltante)
+                continue
+            if not isinstance(lectura, dict):
+                errores.append(f"{sensor} no es un objeto")
+                continue
+
+            incompleto = False
+            for campo, caracteristica, minimo, maximo, requerido in campos:
+                if campo not in lectura:
+                    if requerido:
+                        errores.append(f"Falta {sensor}.{campo} (requerido)")
+                    else:
+                        incompleto = True
+                    continue
+                valor = lectura[campo]
+                if isinstance(valor, bool) or not isinstance(valor, (int, float)) or math.isnan(valor):
+                    errores.append(f"{sensor}.{campo} no es numerico: {valor!r}")
+                    continue
+                if valor < minimo or valor > maximo:
+                    errores.append(f"{sensor}.{campo} fuera de rango ({minimo:g}-{maximo:g}): {valor}")
+                    continue
+                features[caracteristica] = valor
+
+            if incompleto and etiqueta_incompleto:
+                sensores_faltantes.append(etiqueta_incompleto)
+
+        # Hora del dia y dia de la semana a partir del timestamp (por defecto mediodia del lunes)
+        features['hora_dia'] = 12
+        features['dia_semana'] = 0
+        timestamp = metadata.get('timestamp', '')
+        if timestamp:
+            try:
+                dt = datetime.fromisoformat(str(timestamp).replace('Z', '+00:00'))
+                features['hora_dia'] = dt.hour
+                features['dia_semana'] = dt.weekday()
+            except ValueError:
+                pass
+
+        return self._resultado(errores, features, sensores_faltantes, metadata)
+
+    @staticmethod
+    def _resultado(errores, features, sensores_faltantes, metadata):
+        return {
+            'valido': not errores,
+            'errores': errores,
+            'features': features,
+            'sensores_faltantes': sensores_faltantes,
+            'metadata': metadata
+        }
+
+
+# Validador compartido (el esquema se compila una sola vez por proceso)
+_validador = ValidadorPayload()
+
+
+def validar_lectura(json_data):
+    """Valida una lectura con el validador compartido"""
+    return _validador.validar(json_data)
@@ -0,0 +1,147 @@
+import json
+import time
+import hashlib
+from datetime import datetime
+
+# Importancias de variables y features del modelo, guardadas una vez por
+# version en model_versions. Cada response guarda solo model_version_id
+# en lugar de repetir el mismo JSON global (feature_importances_ es del
+# modelo, no de la prediccion). La version se identifica por su huella:
+# el mismo contenido, aunque se reentrene, es la misma version.
+
+
+def crear_tabla_versiones(conn):
+    """Tabla model_versions"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS model_versions (
+            id INTEGER PRIMARY KEY,
+            huella TEXT NOT NULL UNIQUE,
+            importancia_variables TEXT NOT NULL,
+            features_utilizadas TEXT NOT NULL,
+            fecha_entrenamiento TEXT,
+            registrada_en TEXT
+        )
+    ''')
+
+
+def huella_version(importancias, features):
+    """Huella (sha1) del contenido de una version del modelo"""
+    contenido = json.dumps({'importancia_variables': importancias, 'features_utilizadas': list(features)},
+                           sort_keys=True)
+    return hashlib.sha1(contenido.encode('utf-8')).hexdigest()
+
+
+def registrar_version(conn, importancias, features, fecha_entrenamiento=None):
+    """Id de la version (la da de alta si no existe); confirma el alta de inmediato
+
+    Las versiones dadas de alta desde filas antiguas no tienen fecha de
+    entrenamiento: se completa cuando el modelo en uso la informa.
+    """
+    huella = huella_version(importancias, features)
+    with conn:
+        conn.execute('''
+            INSERT INTO model_versions
+            (huella, importancia_variables, features_utilizadas, fecha_entrenamiento, registrada_en)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (huella) DO UPDATE SET
+                fecha_entrenamiento = COALESCE(fecha_entrenamiento, excluded.fecha_entrenamiento)
+        ''', (huella, json.dumps(importancias), json.dumps(list(features)),
+              fecha_entrenamiento, datetime.now().isoformat()))
+        return conn.execute('SELECT id FROM model_versions WHERE huella = ?', (huella,)).fetchone()[0]
+
+
+class CacheVersiones:
+    """Cache en proceso huella -> id de model_versions (solo las nuevas van a la BD)"""
+
+    def __init__(self):
+        self._ids = {}
+
+    def id_version(self, conn, importancias, features, fecha_entrenamiento=None):
+        huella = huella_version(importancias, features)
+        version_id = self._ids.get(huella)
+        if version_id is None:
+            version_id = self._ids[huella] = registrar_version(conn, importancias, features, fecha_entrenamiento)
+        return version_id
+
+
+def leer_versiones(conn):
+    """Versiones registradas (dicts con importancias y features ya decodificadas)"""
+    filas = conn.execute('''
+        SELECT id, importancia_variables, features_utilizadas, fecha_entrenamiento, registrada_en
+        FROM model_versions ORDER BY id
+    ''').fetchall()
+    return [{
+        'id': version_id,
+        'importancia_variables': json.loads(importancias),
+        'features_utilizadas': json.loads(features),
+        'fecha_entrenamiento': fecha_entrenamiento,
+        'registrada_en': registrada_en,
+    } for version_id, importancias, features, fecha_entrenamiento, registrada_en in filas]
+
+
+def backfill_versiones(conn, esquema='main', tamano_lote=1000, pausa=0.0):
+    """Pasa las importancias repetidas de sensor_responses a model_versions
+
+    Cada JSON distinto de importancia_variables se registra como version;
+    las filas quedan con model_version_id, importancia_variables en NULL y
+    sin features_utilizadas en prediccion_detalle. Sirve tambien para una
+    particion mensual adjunta (esquema). Devuelve las filas actualizadas.
+    """
+    distintos = [fila[0] for fila in conn.execute(f'''
+        SELECT DISTINCT importancia_variables FROM {esquema}.sensor_responses
+        WHERE importancia_variables IS NOT NULL AND model_version_id IS NULL
+    ''')]
+    versiones = {}
+    for texto in distintos:
+        try:
+            importancias = json.loads(texto)
+        except ValueError:
+            continue
+        if isinstance(importancias, dict):
+            # El procesador guardaba como features las claves de las importancias
+            versiones[texto] = registrar_version(conn, importancias, list(importancias.keys()))
+
+    actualizadas = 0
+    id_maximo = conn.execute(f'SELECT COALESCE(MAX(id), 0) FROM {esquema}.sensor_responses').fetchone()[0]
+    desde = 0
+    while desde < id_maximo:
+        hasta = desde + tamano_lote
+        with conn:
+            for texto, version_id in versiones.items():
+                actualizadas += conn.execute(f'''
+                    UPDATE {esquema}.sensor_responses
+                    SET model_version_id = ?,
+                        importancia_variables = NULL,
+                        prediccion_detalle = CASE WHEN json_valid(prediccion_detalle)
+                            THEN json_remove(prediccion_detalle, '$.features_utilizadas')
+                            ELSE prediccion_detalle END
+                    WHERE id > ? AND id <= ? AND importancia_variables = ?
+                ''', (version_id, desde, hasta, texto)).rowcount
+        desde = hasta
+        if pausa:
+            time.sleep(pausa)
+    return actualizadas
+
+
+def main():
+    """Lista las versiones del modelo registradas"""
+    from conexion_db import obtener_conexion
+    from migraciones import migrar
+
+    conn = obtener_conexion(crear=False)
+    if conn is None:
+        print("Base de datos no encontrada")
+        return
+    migrar(conn)
+    versiones = leer_versiones(conn)
+    print(f"Versiones del modelo registradas: {len(versiones)}")
+    for version in versiones:
+        print(f"\n  Version {version['id']} (entrenada: {version['fecha_entrenamiento'] or 'desconocido'}, "
+              f"registrada: {version['registrada_en']})")
+        for feature, importancia in sorted(version['importancia_variables'].items(),
+                                           key=lambda par: par[1], reverse=True):
+            print(f"    {feature}: {importancia:.4f}")
+
+
+if __name__ == "__main__":
+    main()